@@ -0,0 +1,183 @@
+"""Admission control under a rush of job requests, vs. LiveKit's default load.
+
+Offers the worker --rate job requests per second for --seconds, the way
+LiveKit does: only while the load the worker reports is under its threshold.
+Every accepted job starts a job process whose session does --session-cpu
+cores' worth of work, in one burst per 10ms audio frame on its event loop
+(as noise cancellation and VAD do), and writes its load heartbeat (see
+admission.py). Run twice:
+
+- default: the load is LiveKit's moving average of the host CPU, and every
+  offered job is accepted
+- admission: the load and admission decisions of AdmissionController
+
+Reports, per policy, the sessions the worker took on and the p99 and max
+event-loop lag of its job processes over the last --settle seconds. Exits with
+status 1 if, with admission control, the p99 loop lag of any job exceeded
+ADMISSION_MAX_LAG_MS.
+
+Run with:
+
+    uv run python benchmarks/bench_admission.py --session-cpu 0.1 --rate 4 --seconds 20
+"""
+
+import argparse
+import asyncio
+import multiprocessing
+import sys
+import tempfile
+import time
+from collections import deque
+from pathlib import Path
+from types import SimpleNamespace
+
+import psutil
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))
+
+from admission import AdmissionController, JobLoad, read_heartbeats
+
+FRAME = 0.01
+DEFAULT_THRESHOLD = 0.7
+
+
+def fake_job(load_dir, session_cpu, stop_event):
+    async def run():
+        job_load = JobLoad(load_dir)
+        end_session = job_load.track_session()
+        loop = asyncio.get_running_loop()
+        next_frame = loop.time()
+        while not stop_event.is_set():
+            # The frame's audio processing, on the event loop
+            start = time.process_time()
+            while time.process_time() - start < session_cpu * FRAME:
+                pass
+            next_frame += FRAME
+            await asyncio.sleep(max(next_frame - loop.time(), 0))
+        await end_session()
+
+    asyncio.run(run())
+
+
+class FakeJobRequest:
+    def __init__(self, job_id, worker):
+        self.job = SimpleNamespace(id=job_id)
+        self.worker = worker
+        self.accepted = False
+
+    async def accept(self):
+        self.accepted = True
+        self.worker.launch(self.job)
+
+    async def reject(self):
+        pass
+
+
+class FakeWorker:
+    """Launches a job process per accepted job, like the worker's process pool"""
+
+    def __init__(self, load_dir, session_cpu):
+        self.load_dir = load_dir
+        self.session_cpu = session_cpu
+        self.active_jobs = []
+        self.processes = []
+        self.stop_event = multiprocessing.Event()
+
+    def launch(self, job):
+        process = multiprocessing.Process(target=fake_job, args=(self.load_dir, self.session_cpu, self.stop_event))
+        process.start()
+        self.processes.append(process)
+        self.active_jobs.append(SimpleNamespace(job=job))
+
+    def close(self):
+        self.stop_event.set()
+        for process in self.processes:
+            process.join()
+
+
+class DefaultLoad:
+    """LiveKit's default load: host CPU averaged over the last 5 half-second samples"""
+
+    def __init__(self):
+        self.samples = deque(maxlen=5)
+        psutil.cpu_percent()
+
+    def load_fnc(self, worker):
+        self.samples.append(psutil.cpu_percent() / 100)
+        return sum(self.samples) / len(self.samples)
+
+    async def request_fnc(self, job_request):
+        await job_request.accept()
+
+
+async def run_policy(policy, args):
+    with tempfile.TemporaryDirectory() as load_dir:
+        load_dir = Path(load_dir)
+        worker = FakeWorker(load_dir, args.session_cpu)
+        if policy == "admission":
+            controller = AdmissionController(load_dir)
+            threshold = controller.threshold
+        else:
+            controller, threshold = DefaultLoad(), DEFAULT_THRESHOLD
+        lag_p99, lag_max = [], []
+        offered = rejected = 0
+        start = time.monotonic()
+        next_load = next_request = start
+        try:
+            while time.monotonic() - start < args.seconds:
+                now = time.monotonic()
+                if now >= next_load:
+                    load = await asyncio.to_thread(controller.load_fnc, worker)
+                    next_load += 0.5
+                    heartbeats = read_heartbeats(load_dir, [p.pid for p in worker.processes])
+                    if now - start >= args.seconds - args.settle and heartbeats:
+                        lag_p99.append(max(h["loop_lag_p99"] for h in heartbeats))
+                        lag_max.append(max(h["loop_lag_max"] for h in heartbeats))
+                if now >= next_request:
+                    next_request += 1 / args.rate
+                    # LiveKit only offers jobs to a worker under its load threshold
+                    if load < threshold:
+                        offered += 1
+                        request = FakeJobRequest(f"job-{offered}", worker)
+                        await controller.request_fnc(request)
+                        rejected += not request.accepted
+                await asyncio.sleep(min(next_load, next_request) - time.monotonic())
+        finally:
+            worker.close()
+    return {
+        "sessions": len(worker.processes),
+        "offered": offered,
+        "rejected": rejected,
+        "load": load,
+        "lag_p99": max(lag_p99, default=0.0),
+        "lag_max": max(lag_max, default=0.0),
+    }
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--session-cpu", type=float, default=0.1, help="cores of work per session")
+    parser.add_argument("--rate", type=float, default=4.0, help="job requests per second")
+    parser.add_argument("--seconds", type=float, default=20.0)
+    parser.add_argument("--settle", type=float, default=5.0, help="seconds at the end over which the loop lag is measured")
+    args = parser.parse_args()
+
+    cores = psutil.cpu_count()
+    print(f"{cores} cores, sessions of {args.session_cpu} cores: {cores / args.session_cpu:.0f} sessions saturate the host")
+    print(f"{'policy':<11}{'offered':>8}{'rejected':>9}{'sessions':>9}{'load':>7}{'lag p99 ms':>12}{'lag max ms':>12}")
+    results = {}
+    for policy in ("default", "admission"):
+        results[policy] = result = await run_policy(policy, args)
+        print(
+            f"{policy:<11}{result['offered']:>8}{result['rejected']:>9}{result['sessions']:>9}{result['load']:>7.2f}"
+            f"{result['lag_p99'] * 1000:>12.1f}{result['lag_max'] * 1000:>12.1f}"
+        )
+    max_lag = AdmissionController().max_lag
+    if results["admission"]["lag_p99"] > max_lag:
+        print(f"FAIL p99 loop lag {results['admission']['lag_p99'] * 1000:.1f}ms > {max_lag * 1000:.0f}ms with admission control")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
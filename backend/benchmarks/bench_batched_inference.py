@@ -0,0 +1,193 @@
+"""Sessions per core for VAD inference: one call per stream vs. batched across sessions.
+
+Runs N Silero VAD streams side by side in one process, each fed 10ms frames
+of 16kHz audio in real time the way a session's microphone track is, for
+every N in --sessions, first with the plugin's VAD (one ONNX call per stream
+and 32ms window, on the default executor) and then with BatchedVAD (the
+windows of all streams batched, see batched_inference.py). Reports the CPU
+used per session, the sessions one core could carry at that rate, the mean
+batch size, and whether the streams kept up with real time. The speech
+probabilities of both runs are compared and must be identical.
+
+With --eou, also compares the multilingual turn detector run one chat context
+at a time (as the worker's inference process does) with batched predictions,
+if the model has been downloaded (uv run python src/agent.py download-files).
+
+Run with:
+
+    uv run python benchmarks/bench_batched_inference.py --sessions 1 8 32 --seconds 10
+"""
+
+import argparse
+import asyncio
+import json
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))
+
+from livekit import rtc
+from livekit.agents import llm, vad
+from livekit.plugins import silero
+
+import batched_inference
+from batched_inference import EOU_BATCHER, VAD_BATCHER, BatchedTurnDetector, BatchedVAD
+
+SAMPLE_RATE = 16000
+FRAME_SAMPLES = SAMPLE_RATE // 100
+
+
+def synthetic_audio(seconds, seed):
+    """Bursts of a voiced tone with noise, separated by silence"""
+    rng = np.random.default_rng(seed)
+    t = np.arange(int(seconds * SAMPLE_RATE)) / SAMPLE_RATE
+    voiced = np.sin(2 * np.pi * rng.uniform(120, 240) * t) + 0.3 * rng.standard_normal(t.size)
+    bursts = (np.sin(2 * np.pi * rng.uniform(0.2, 0.5) * t + rng.uniform(0, 6)) > 0).astype(np.float64)
+    return (voiced * bursts * 6000).astype(np.int16)
+
+
+async def run_stream(vad_model, audio, start_at):
+    stream = vad_model.stream()
+    probabilities = []
+
+    async def consume():
+        async for event in stream:
+            if event.type == vad.VADEventType.INFERENCE_DONE:
+                probabilities.append(event.probability)
+
+    consumer = asyncio.create_task(consume())
+    loop = asyncio.get_running_loop()
+    for index, offset in enumerate(range(0, len(audio) - FRAME_SAMPLES + 1, FRAME_SAMPLES)):
+        # Frames arrive on a fixed real-time schedule, like a live track
+        delay = start_at + index * 0.01 - loop.time()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        stream.push_frame(rtc.AudioFrame(
+            data=audio[offset:offset + FRAME_SAMPLES].tobytes(),
+            sample_rate=SAMPLE_RATE,
+            num_channels=1,
+            samples_per_channel=FRAME_SAMPLES,
+        ))
+    stream.end_input()
+    await consumer
+    await stream.aclose()
+    return probabilities, loop.time() - start_at
+
+
+async def run_level(vad_model, sessions, seconds):
+    audios = [synthetic_audio(seconds, seed) for seed in range(sessions)]
+    loop = asyncio.get_running_loop()
+    # Sessions start spread over one window, as independent tracks would
+    start = loop.time() + 0.1
+    cpu_start, wall_start = time.process_time(), time.perf_counter()
+    results = await asyncio.gather(*(
+        run_stream(vad_model, audio, start + 0.032 * index / sessions) for index, audio in enumerate(audios)
+    ))
+    cpu, wall = time.process_time() - cpu_start, time.perf_counter() - wall_start
+    finished_late = max(elapsed for _, elapsed in results) - seconds
+    return [probabilities for probabilities, _ in results], cpu, wall, finished_late
+
+
+def print_row(mode, sessions, probabilities, cpu, wall, late, mean_batch):
+    windows = sum(map(len, probabilities))
+    cpu_per_session = cpu / wall / sessions
+    print(
+        f"{mode:<10}{sessions:>9}{windows:>9}{cpu_per_session * 100:>12.2f}{1 / cpu_per_session:>14.0f}"
+        f"{mean_batch:>11.1f}{late * 1000:>10.0f}"
+    )
+
+
+async def bench_vad(levels, seconds):
+    plain = silero.VAD.load()
+    VAD_BATCHER.start()
+    batched = BatchedVAD.load()
+    print(f"{'mode':<10}{'sessions':>9}{'windows':>9}{'cpu %/sess':>12}{'sessions/core':>14}{'mean batch':>11}{'late ms':>10}")
+    mismatches = 0
+    for sessions in levels:
+        plain_probabilities, cpu, wall, late = await run_level(plain, sessions, seconds)
+        print_row("per-call", sessions, plain_probabilities, cpu, wall, late, 1.0)
+
+        before = VAD_BATCHER.stats.summary()
+        batched_probabilities, cpu, wall, late = await run_level(batched, sessions, seconds)
+        after = VAD_BATCHER.stats.summary()
+        batches = after["batches"] - before["batches"]
+        mean_batch = (after["requests"] - before["requests"]) / batches if batches else 0.0
+        print_row("batched", sessions, batched_probabilities, cpu, wall, late, mean_batch)
+
+        for a, b in zip(plain_probabilities, batched_probabilities):
+            if len(a) != len(b) or max((abs(x - y) for x, y in zip(a, b)), default=0.0) > 1e-6:
+                mismatches += 1
+    return mismatches
+
+
+CONVERSATIONS = [
+    [("assistant", "Hi, welcome to AgentX Coffee! What can I get you?"), ("user", "can I get a large oat milk latte")],
+    [("assistant", "What size would you like?"), ("user", "um I think maybe a")],
+    [("assistant", "And what name should I put on the order?"), ("user", "it's for Sam")],
+    [("assistant", "Any extras?"), ("user", "yes add an extra shot and")],
+]
+
+
+def chat_context(index):
+    chat_ctx = llm.ChatContext()
+    for role, text in CONVERSATIONS[index % len(CONVERSATIONS)]:
+        chat_ctx.add_message(role=role, content=text)
+    return chat_ctx
+
+
+async def bench_eou(concurrent_requests, rounds):
+    try:
+        EOU_BATCHER.start()
+    except RuntimeError as e:
+        print(f"Skipping the turn detector: {e}")
+        return 0
+    runner = batched_inference._eou_batch
+    detector = BatchedTurnDetector.__new__(BatchedTurnDetector)
+
+    contexts = [chat_context(index) for index in range(concurrent_requests)]
+    payloads = [
+        json.dumps({"chat_ctx": [{"role": m.role, "content": m.text_content} for m in ctx.items]}).encode()
+        for ctx in contexts
+    ]
+    cpu_start, wall_start = time.process_time(), time.perf_counter()
+    sequential = [json.loads(runner.run(payload))["eou_probability"] for _ in range(rounds) for payload in payloads]
+    sequential_cpu, sequential_wall = time.process_time() - cpu_start, time.perf_counter() - wall_start
+
+    cpu_start, wall_start = time.process_time(), time.perf_counter()
+    batched = []
+    for _ in range(rounds):
+        batched += await asyncio.gather(*(detector.predict_end_of_turn(ctx) for ctx in contexts))
+    batched_cpu, batched_wall = time.process_time() - cpu_start, time.perf_counter() - wall_start
+
+    predictions = rounds * concurrent_requests
+    print(f"turn detector, {concurrent_requests} sessions predicting at once:")
+    print(f"  one at a time: {sequential_cpu / predictions * 1000:.2f}ms CPU, {sequential_wall / rounds * 1000:.1f}ms per round")
+    print(f"  batched:       {batched_cpu / predictions * 1000:.2f}ms CPU, {batched_wall / rounds * 1000:.1f}ms per round")
+    difference = max(abs(a - b) for a, b in zip(sequential, batched))
+    print(f"  largest probability difference: {difference:.2e}")
+    return int(difference > 1e-4)
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sessions", type=int, nargs="+", default=[1, 8, 32], help="numbers of concurrent streams")
+    parser.add_argument("--seconds", type=float, default=10.0, help="audio per stream")
+    parser.add_argument("--eou", action="store_true", help="also benchmark the turn detector")
+    parser.add_argument("--eou-sessions", type=int, default=8)
+    parser.add_argument("--eou-rounds", type=int, default=20)
+    args = parser.parse_args()
+
+    failures = await bench_vad(args.sessions, args.seconds)
+    if failures:
+        print(f"FAIL {failures} streams got different speech probabilities when batched")
+    if args.eou and await bench_eou(args.eou_sessions, args.eou_rounds):
+        failures += 1
+        print("FAIL batched turn detector predictions differ")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
@@ -0,0 +1,108 @@
+"""Prompt size per order over a long kiosk session, with and without compaction.
+
+Replays the chat context a session builds while taking ORDERS orders in a
+row (each order: a few customer turns answered with update_order calls,
+then save_order and a confirmation) and estimates the prompt tokens of every
+LLM request. Without compaction the prompt grows with every order; with it,
+each saved order is replaced by the session summary and the prompt stays
+flat. Tokens are estimated from characters, as the agent's budget is.
+
+Run with:
+
+    uv run python benchmarks/bench_context_compaction.py --orders 50
+"""
+
+import argparse
+import json
+import statistics
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))
+
+from livekit.agents import llm, utils
+
+from agent import Assistant
+from context_compaction import (
+    INSTRUCTIONS_MESSAGE_ID,
+    ContextCompactor,
+    estimate_tokens,
+    order_state_message,
+)
+from order_state import OrderState
+
+TURNS = [
+    ("Hi, can I get a large oat milk latte please?", {"drink_type": "latte", "size": "large", "milk_type": "oat milk"},
+     "Updated. Still need: name.", "A large oat milk latte, lovely. Would you like any extras, and what name is it for?"),
+    ("Add an extra shot and some vanilla syrup", {"extras": ["extra shot", "vanilla syrup"]},
+     "Updated. Still need: name.", "Extra shot and vanilla syrup added. What name should I put on the order?"),
+    ("It's for Sam", {"customer_name": "Sam"},
+     "Updated. The order is complete and ready to save.", "Thanks Sam! Shall I place the order?"),
+]
+SAVE = ("Yes please, that's all", "Order saved successfully! Your order will be ready soon.",
+        "Your large oat milk latte with an extra shot and vanilla syrup is on its way, Sam. Thank you!")
+ORDER = {"drinkType": "latte", "size": "large", "milk": "oat milk", "extras": ["extra shot", "vanilla syrup"], "name": "Sam"}
+EMPTY_ORDER = OrderState()
+
+
+def add_tool_call(chat_ctx, name, arguments, output):
+    call_id = utils.shortuuid()
+    chat_ctx.insert(llm.FunctionCall(call_id=call_id, name=name, arguments=json.dumps(arguments)))
+    chat_ctx.insert(llm.FunctionCallOutput(call_id=call_id, name=name, output=output, is_error=False))
+
+
+def prompt_tokens(chat_ctx, order_state, compactor):
+    if compactor is None:
+        return estimate_tokens(chat_ctx)
+    request = chat_ctx.copy()
+    request.items.append(order_state_message(order_state))
+    return estimate_tokens(request)
+
+
+def run(orders, compactor):
+    chat_ctx = llm.ChatContext()
+    chat_ctx.add_message(role="system", content=Assistant(order_store=object()).instructions, id=INSTRUCTIONS_MESSAGE_ID)
+    per_order = []
+    for _ in range(orders):
+        requests = []
+        turns = [(user, "update_order", arguments, output, reply) for user, arguments, output, reply in TURNS]
+        turns.append((SAVE[0], "save_order", {}, SAVE[1], SAVE[2]))
+        for user, tool, arguments, output, reply in turns:
+            if compactor is not None and compactor.over_budget(chat_ctx):
+                chat_ctx, _ = compactor.compact(chat_ctx, keep=compactor.keep_recent)
+            chat_ctx.add_message(role="user", content=user)
+            # One request decides on the tool call, one speaks the reply
+            requests.append(prompt_tokens(chat_ctx, EMPTY_ORDER, compactor))
+            add_tool_call(chat_ctx, tool, arguments, output)
+            requests.append(prompt_tokens(chat_ctx, OrderState.from_dict(ORDER), compactor))
+            chat_ctx.add_message(role="assistant", content=reply)
+        per_order.append(requests)
+
+        if compactor is not None:
+            compactor.record_order(ORDER)
+            chat_ctx, _ = compactor.compact(chat_ctx, keep=1)
+    return per_order
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--orders", type=int, default=50)
+    parser.add_argument("--budget", type=int, default=3000, help="token budget of the compactor")
+    args = parser.parse_args()
+
+    plain = run(args.orders, None)
+    compacted = run(args.orders, ContextCompactor(token_budget=args.budget))
+
+    print(f"{'order':>6}{'tokens/request':>16}{'compacted':>12}")
+    shown = sorted({1, 2, 5, 10, 20, 50, 100, args.orders} & set(range(1, args.orders + 1)))
+    for order in shown:
+        plain_mean = statistics.mean(plain[order - 1])
+        compacted_mean = statistics.mean(compacted[order - 1])
+        print(f"{order:>6}{plain_mean:>16.0f}{compacted_mean:>12.0f}")
+    plain_total = sum(map(sum, plain))
+    compacted_total = sum(map(sum, compacted))
+    print(f"total estimated prompt tokens: {plain_total} without, {compacted_total} with compaction")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,203 @@
+"""Micro-benchmark for the precompiled drink visualization renderer.
+
+Compares ``drink_renderer.render_drink_html`` with the original f-string
+implementation of ``Assistant.generate_drink_html`` (copied verbatim below) and
+checks that both produce byte-identical output for every order state in the
+benchmark matrix (the legacy one rendering the state's dict form).
+
+Run with:
+
+    uv run python benchmarks/bench_drink_renderer.py
+"""
+
+import itertools
+import sys
+import timeit
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))
+
+import drink_renderer
+from order_state import OrderState
+
+
+class _LegacyAssistant:
+    def __init__(self, order_state):
+        self.order_state = order_state
+
+    def generate_drink_html(self):
+        """Verbatim copy of the original Assistant.generate_drink_html"""
+
+        # Determine cup size - smaller to prevent overlap
+        size_config = {
+            "small": {"height": "80px", "width": "60px"},
+            "medium": {"height": "95px", "width": "70px"},
+            "large": {"height": "110px", "width": "80px"}
+        }
+        cup_size = size_config.get(self.order_state["size"], size_config["medium"])
+
+        # Determine drink color based on type
+        drink_colors = {
+            "latte": "#D4A574",
+            "cappuccino": "#A67C52",
+            "espresso": "#4A2C2A",
+            "americano": "#5D4037",
+            "mocha": "#7B4B3A",
+            "cold brew": "#6D4C41"
+        }
+        drink_color = drink_colors.get(self.order_state["drinkType"], "#A67C52")
+
+        # Check for whipped cream
+        has_whipped_cream = any("whipped cream" in extra.lower() for extra in self.order_state["extras"])
+
+        # Build extras list
+        extras_html = ""
+        if self.order_state["extras"]:
+            extras_items = "".join([f"<div style='margin: 2px 0; font-size: 12px;'>• {extra}</div>" for extra in self.order_state["extras"]])
+            extras_html = f'<div style="margin: 0;">{extras_items}</div>'
+
+        html = f"""
+        <div style="font-family: 'Segoe UI', Arial, sans-serif; padding: 12px; background: linear-gradient(135deg, #667eea 0%, #764ba2 100%); border-radius: 12px; max-width: 260px; margin: 0 auto; color: white; box-shadow: 0 6px 20px rgba(0,0,0,0.3);">
+            <div style="text-align: center; margin-bottom: 10px;">
+                <h2 style="margin: 0; font-size: 17px; font-weight: 600; display: inline-flex; align-items: center; gap: 5px;">
+                    <span style="font-size: 20px;">☕</span>
+                    <span>AgentX Coffee</span>
+                </h2>
+            </div>
+            
+            <div style="background: white; border-radius: 10px; padding: 12px; color: #333; box-shadow: 0 2px 6px rgba(0,0,0,0.1);">
+                <h3 style="margin: 0 0 10px 0; color: #667eea; text-align: center; font-size: 14px; font-weight: 600; border-bottom: 2px solid #e8eaf6; padding-bottom: 6px;">Your Order</h3>
+                
+                <!-- Drink Visualization -->
+                <div style="display: flex; justify-content: center; align-items: center; margin: 10px 0; padding: 14px; background: linear-gradient(to bottom, #f8f9fa 0%, #e9ecef 100%); border-radius: 10px;">
+                    <div style="position: relative; display: inline-block;">
+                        <!-- Simple Modern Cup -->
+                        <div style="position: relative; width: {cup_size['width']}; height: {cup_size['height']}; background: linear-gradient(to bottom, {drink_color} 0%, {drink_color} 85%, #3e2723 100%); border-radius: 0 0 15px 15px; box-shadow: 0 6px 12px rgba(0,0,0,0.2), inset -5px 0 10px rgba(0,0,0,0.1), inset 5px 0 10px rgba(255,255,255,0.1); border: 3px solid #3e2723; border-top: none;">
+                            <!-- Cup Top/Rim -->
+                            <div style="position: absolute; top: -8px; left: -3px; right: -3px; height: 12px; background: {drink_color}; border: 3px solid #3e2723; border-radius: 50%; box-shadow: inset 0 -2px 4px rgba(0,0,0,0.3);"></div>
+                            
+                            <!-- Whipped Cream -->
+                            {'''<div style="position: absolute; top: -25px; left: 50%; transform: translateX(-50%); width: calc(100% - 10px); height: 35px; background: radial-gradient(ellipse at center, #FFFEF7 0%, #FFF8E7 50%, #F5E6D3 100%); border-radius: 50% 50% 40% 40%; box-shadow: 0 2px 6px rgba(0,0,0,0.15); border: 2px solid #F0E5D8;"></div>
+                            <div style="position: absolute; top: -30px; left: 50%; transform: translateX(-50%); width: 60%; height: 20px; background: radial-gradient(circle, #FFFFFF 0%, #FFFEF7 100%); border-radius: 50%; opacity: 0.9;"></div>''' if has_whipped_cream else ''}
+                            
+                            <!-- Cup Handle -->
+                            <div style="position: absolute; right: -22px; top: 25%; width: 28px; height: 40%; border: 4px solid #3e2723; border-left: none; border-radius: 0 50% 50% 0; background: linear-gradient(to right, transparent 0%, {drink_color} 50%); opacity: 0.8;"></div>
+                        </div>
+                        
+                        <!-- Size Badge -->
+                        <div style="text-align: center; margin-top: 12px;">
+                            <span style="display: inline-block; background: linear-gradient(135deg, #667eea 0%, #764ba2 100%); color: white; padding: 5px 14px; border-radius: 14px; font-weight: 700; font-size: 11px; letter-spacing: 1.2px; box-shadow: 0 2px 6px rg
+                                  fill="url(#cupGradient)" 
+                                  opacity="0.3"/>
+                            
+                            <!-- Cup Handle -->
+                            <path d="M 150 80 Q 180 80 180 120 Q 180 160 150 160" 
+                                  fill="none" 
+                                  stroke="#2c1810" 
+                                  stroke-width="8" 
+                                  stroke-linecap="round"/>
+                            <path d="M 150 85 Q 175 85 175 120 Q 175 155 150 155" 
+                                  fill="none" 
+                                  stroke="{drink_color}" 
+                                  stroke-width="5" 
+                                  stroke-linecap="round" 
+                                  opacity="0.6"/>
+                            
+                            <!-- Whipped Cream -->
+                            {'''
+                            <ellipse cx="90" cy="15" rx="55" ry="25" fill="#FFFAF0" stroke="#F5DEB3" stroke-width="2"/>
+                            <ellipse cx="70" cy="10" rx="20" ry="15" fill="#FFFFFF" opacity="0.8"/>
+                            <ellipse cx="110" cy="10" rx="20" ry="15" fill="#FFFFFF" opacity="0.8"/>
+                            <ellipse cx="90" cy="5" rx="18" ry="12" fill="#FFFFFF" opacity="0.9"/>
+                            ''' if has_whipped_cream else ''}
+                            
+                            <!-- Gradient Definition -->
+                            <defs>
+                                <linearGradient id="cupGradient" x1="0%" y1="0%" x2="100%" y2="0%">
+                                    <stop offset="0%" style="stop-color:black;stop-opacity:0.3" />
+                                    <stop offset="50%" style="stop-color:white;stop-opacity:0.1" />
+                                    <stop offset="100%" style="stop-color:black;stop-opacity:0.2" />
+                                </linearGradient>
+                            </defs>
+                        </svg>
+                        
+                        <!-- Size Label -->
+                        <div style="text-align: center; margin-top: 10px;">
+                            <span style="display: inline-block; background: #667eea; color: white; padding: 4px 12px; border-radius: 12px; font-weight: 700; font-size: 12px; letter-spacing: 1px;">
+                                {self.order_state["size"].upper() if self.order_state["size"] else "SELECT SIZE"}
+                            </span>
+                        </div>
+                    </div>
+                </div>
+                
+                <!-- Order Details -->
+                <div style="margin-top: 10px; background: #f8f9fa; border-radius: 8px; padding: 8px; font-size: 12px;">
+                    <div style="display: grid; grid-template-columns: auto 1fr; gap: 5px 10px; align-items: start;">
+                        <strong style="color: #667eea;">Drink:</strong>
+                        <span>{self.order_state["drinkType"] or "Not selected"}</span>
+                        
+                        <strong style="color: #667eea;">Size:</strong>
+                        <span>{self.order_state["size"] or "Not selected"}</span>
+                        
+                        <strong style="color: #667eea;">Milk:</strong>
+                        <span>{self.order_state["milk"] or "Not selected"}</span>
+                        
+                        <strong style="color: #667eea;">Extras:</strong>
+                        <div>{extras_html if self.order_state["extras"] else '<span style="color: #999; font-size: 11px;">None</span>'}</div>
+                        
+                        <strong style="color: #667eea;">Name:</strong>
+                        <span>{self.order_state["name"] or "Not provided"}</span>
+                    </div>
+                </div>
+            </div>
+        </div>
+        """
+
+        return html
+
+
+def legacy_generate_drink_html(order_state):
+    return _LegacyAssistant(order_state).generate_drink_html()
+
+
+def order_states():
+    """Every combination of the fields the renderer branches on"""
+    sizes = [None, "small", "medium", "large"]
+    drinks = [None, "latte", "cappuccino", "espresso", "americano", "mocha", "cold brew"]
+    milks = [None, "oat milk", "no milk"]
+    extras = [[], ["extra shot"], ["whipped cream", "caramel drizzle"]]
+    names = [None, "Sam"]
+    for size, drink, milk, extra, name in itertools.product(sizes, drinks, milks, extras, names):
+        yield OrderState.from_dict({"drinkType": drink, "size": size, "milk": milk, "extras": extra, "name": name})
+
+
+def check_identical(states):
+    mismatches = 0
+    for state in states:
+        if drink_renderer.render_drink_html(state) != legacy_generate_drink_html(state.to_dict()):
+            mismatches += 1
+            print(f"MISMATCH: {state}")
+    return mismatches
+
+
+def main():
+    states = list(order_states())
+    mismatches = check_identical(states)
+    print(f"Checked {len(states)} order states, {mismatches} mismatches")
+    if mismatches:
+        sys.exit(1)
+
+    drink_renderer.prewarm()
+    typical = {"drinkType": "latte", "size": "large", "milk": "oat milk", "extras": ["extra shot"], "name": "Sam"}
+    number = 20000
+    for label, fn, state in (
+        ("legacy f-string", legacy_generate_drink_html, typical),
+        ("precompiled", drink_renderer.render_drink_html, OrderState.from_dict(typical)),
+    ):
+        best = min(timeit.repeat(lambda fn=fn, state=state: fn(state), number=number, repeat=5))
+        print(f"{label:>16}: {best / number * 1e6:7.2f} us/render")
+    print(f"cup fragment cache: {drink_renderer.render_cup_fragment.cache_info()}")
+
+
+if __name__ == "__main__":
+    main()
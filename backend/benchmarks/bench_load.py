@@ -0,0 +1,311 @@
+"""How many concurrent sessions one worker process carries before audio jitter.
+
+Runs 1, 2, 4, ... up to --max-sessions complete AgentSessions with the real
+Assistant side by side on one event loop, the way a worker would if every
+room landed in the same process, and reports for each level:
+
+- tool calls per second across all sessions
+- response latency: end of the customer's utterance to the agent speaking
+- event-loop lag: how late a 10ms timer fires, which is what turns into
+  choppy audio once frames are no longer pushed on time
+- CPU per session (percent of one core) and RSS growth per session
+
+Everything runs locally with no network or credentials (see fakes.py): a
+silent microphone track paced in real time feeds a scripted STT, a scripted
+LLM issues the tool calls a real model would, and a synthetic TTS speaks
+through the phrase cache into an audio sink that plays out in real time. The
+customer turns go through the real turn handling, so the slot fast path
+answers some of them and the LLM the rest. Orders are saved to a temporary
+store and the visualizations are published to a stand-in room. Neither the
+Silero VAD nor the turn detector model runs; turns end on the STT's end of
+speech.
+
+Exits with status 1 if any level's p99 loop lag exceeds --max-lag-ms or any
+session fails to complete its orders, so it can gate regressions in CI.
+
+Run with:
+
+    uv run python benchmarks/bench_load.py --max-sessions 32
+"""
+
+import argparse
+import asyncio
+import gc
+import json
+import logging
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import psutil
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))
+
+from fakes import (
+    FakeAudioOutput,
+    FakeRoom,
+    ScriptedLLM,
+    ScriptedSTT,
+    SilentAudioInput,
+    SyntheticTTS,
+)
+from livekit.agents import AgentSession
+
+from agent import Assistant
+from instrumentation import LatencyHistogram
+from order_dispatch import open_order_dispatcher
+from order_store import open_order_store
+from speculation import preemptive_generation_enabled
+from tts_cache import CachedTTS, PhraseCache
+
+LOOP_TICK = 0.01
+TURN_TIMEOUT = 30.0
+
+
+def update_order(**details):
+    """An update_order call as a strict-schema model makes it, every detail present"""
+    arguments = dict.fromkeys(("drink_type", "size", "milk_type", "extras", "customer_name"))
+    arguments.update(details)
+    return "update_order", arguments
+
+
+def conversation(index):
+    """Customer utterances of one order, with what the LLM answers to each
+
+    The first utterance is plain menu phrases the slot fast path fills; the
+    rest need the LLM and its tools.
+    """
+    name = f"Guest {index}"
+    return [
+        (
+            "Can I get a large oat milk latte?",
+            [update_order(drink_type="latte", size="large", milk_type="oat milk")],
+            "A large oat milk latte. Any extras?",
+        ),
+        (
+            "Add an extra shot please",
+            [update_order(extras=["extra shot"])],
+            "Sure, one extra shot. What name should I put on the order?",
+        ),
+        (
+            f"It's for {name}",
+            [update_order(customer_name=name)],
+            f"Thanks {name}, that's everything. Shall I place the order?",
+        ),
+        (
+            "Yes, that's all",
+            [("save_order", {})],
+            "Your order is placed. It will be ready soon!",
+        ),
+    ]
+
+
+class SessionResult:
+    def __init__(self):
+        self.tool_calls = 0
+        self.orders_saved = 0
+        self.timeouts = 0
+        self.error = None
+
+
+class LevelStats:
+    """Measurements of one concurrency level"""
+
+    def __init__(self, sessions):
+        self.sessions = sessions
+        self.loop_lag = LatencyHistogram()
+        self.response = LatencyHistogram()
+        self.results = []
+        self.peak_rss = 0
+        self.wall = 0.0
+        self.cpu = 0.0
+        self.rss_before = 0
+        self.published_bytes = 0
+
+    def summary(self, orders):
+        tool_calls = sum(result.tool_calls for result in self.results)
+        return {
+            "sessions": self.sessions,
+            "tool_calls_per_s": round(tool_calls / self.wall, 1) if self.wall else 0.0,
+            "response_p50_ms": round(self.response.percentile(0.5) * 1000, 1),
+            "response_p95_ms": round(self.response.percentile(0.95) * 1000, 1),
+            "loop_lag_p50_ms": round(self.loop_lag.percentile(0.5) * 1000, 2),
+            "loop_lag_p99_ms": round(self.loop_lag.percentile(0.99) * 1000, 2),
+            "loop_lag_max_ms": round(self.loop_lag.max * 1000, 2),
+            "cpu_pct_per_session": round(self.cpu / self.wall * 100 / self.sessions, 2) if self.wall else 0.0,
+            "rss_mb_per_session": round((self.peak_rss - self.rss_before) / self.sessions / 2**20, 2),
+            "orders_saved": sum(result.orders_saved for result in self.results),
+            "orders_expected": self.sessions * orders,
+            "timeouts": sum(result.timeouts for result in self.results),
+            "errors": [result.error for result in self.results if result.error],
+            "published_kb": round(self.published_bytes / 1024, 1),
+        }
+
+
+async def monitor(stats, stop):
+    """Record how late a LOOP_TICK timer fires, and the peak RSS"""
+    process = psutil.Process()
+    ticks = 0
+    while not stop.is_set():
+        start = time.perf_counter()
+        await asyncio.sleep(LOOP_TICK)
+        stats.loop_lag.record(time.perf_counter() - start - LOOP_TICK)
+        ticks += 1
+        if ticks % 50 == 0:
+            stats.peak_rss = max(stats.peak_rss, process.memory_info().rss)
+
+
+async def run_session(index, args, store, dispatcher, cache, stats, room):
+    result = SessionResult()
+    rng = random.Random(args.seed + index)
+    turns = conversation(index)
+    script = {text: (tool_calls, reply) for text, tool_calls, reply in turns}
+
+    stt = ScriptedSTT()
+    session = AgentSession(
+        stt=stt,
+        llm=ScriptedLLM(script, ttft=args.llm_ttft_ms / 1000),
+        tts=CachedTTS(SyntheticTTS(ttfb=args.tts_ttfb_ms / 1000), voice="synthetic", cache=cache),
+        turn_detection="stt",
+        min_endpointing_delay=args.endpointing_ms / 1000,
+        preemptive_generation=preemptive_generation_enabled(),
+        # The stand-in speaker cannot pause
+        resume_false_interruption=False,
+    )
+    session.input.audio = SilentAudioInput()
+    session.output.audio = FakeAudioOutput(realtime=not args.instant_playout)
+
+    listening = asyncio.Event()
+    spoke_at = []
+
+    @session.on("agent_state_changed")
+    def _on_agent_state_changed(ev):
+        if ev.new_state == "speaking":
+            spoke_at.append(time.perf_counter())
+        elif ev.new_state == "listening" and ev.old_state == "speaking":
+            listening.set()
+
+    @session.on("function_tools_executed")
+    def _on_function_tools_executed(ev):
+        result.tool_calls += len(ev.function_calls)
+        for call, output in ev.zipped():
+            if call.name == "save_order" and output and "saved successfully" in output.output:
+                result.orders_saved += 1
+
+    assistant = Assistant(order_store=store, dispatcher=dispatcher)
+    assistant.room = room
+    try:
+        await session.start(agent=assistant)
+        # Sessions start staggered, as customers would join
+        await asyncio.sleep(rng.uniform(0, args.think_ms / 1000))
+        for _ in range(args.orders):
+            for text, _, _ in turns:
+                listening.clear()
+                spoke_at.clear()
+                said_at = time.perf_counter()
+                stt.say(text)
+                try:
+                    await asyncio.wait_for(listening.wait(), TURN_TIMEOUT)
+                except asyncio.TimeoutError:
+                    result.timeouts += 1
+                    continue
+                stats.response.record(spoke_at[0] - said_at)
+                await asyncio.sleep(rng.uniform(0.5, 1.5) * args.think_ms / 1000)
+    except Exception as e:
+        result.error = f"session {index}: {e!r}"
+    finally:
+        await session.aclose()
+        await assistant.publisher.aclose()
+    return result
+
+
+async def run_level(sessions, args, store, dispatcher, cache):
+    stats = LevelStats(sessions)
+    gc.collect()
+    stats.rss_before = stats.peak_rss = psutil.Process().memory_info().rss
+    room = FakeRoom(publish_latency=args.publish_ms / 1000)
+
+    stop = asyncio.Event()
+    monitor_task = asyncio.create_task(monitor(stats, stop))
+    start, cpu_start = time.perf_counter(), time.process_time()
+    stats.results = await asyncio.gather(
+        *(run_session(index, args, store, dispatcher, cache, stats, room) for index in range(sessions))
+    )
+    stats.wall = time.perf_counter() - start
+    stats.cpu = time.process_time() - cpu_start
+    stop.set()
+    await monitor_task
+    stats.published_bytes = room.local_participant.bytes
+    return stats
+
+
+def levels(max_sessions):
+    level = 1
+    while level < max_sessions:
+        yield level
+        level *= 2
+    yield max_sessions
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--max-sessions", type=int, default=16, help="largest concurrency level of the sweep")
+    parser.add_argument("--orders", type=int, default=2, help="orders placed by each session")
+    parser.add_argument("--think-ms", type=float, default=300, help="average pause of the customer between turns")
+    parser.add_argument("--llm-ttft-ms", type=float, default=300, help="simulated LLM time to first token")
+    parser.add_argument("--tts-ttfb-ms", type=float, default=150, help="simulated TTS time to first byte on cache misses")
+    parser.add_argument("--endpointing-ms", type=float, default=500, help="the session's min_endpointing_delay")
+    parser.add_argument("--publish-ms", type=float, default=0, help="simulated data channel publish latency")
+    parser.add_argument("--instant-playout", action="store_true", help="finish playback at once instead of in real time")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--max-lag-ms", type=float, help="fail if the p99 event-loop lag of any level exceeds this")
+    parser.add_argument("--json", help="also write the results to this file")
+    args = parser.parse_args()
+
+    # The agent logs every turn at INFO; keep the table readable
+    logging.basicConfig(level=logging.WARNING)
+
+    failures = []
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        store = open_order_store("jsonl", Path(tmp) / "orders.jsonl")
+        dispatcher = open_order_dispatcher(Path(tmp) / "dispatch.db")
+        cache = PhraseCache(Path(tmp) / "tts_cache", 64 * 2**20)
+
+        # One unreported session first, so imports, lazy setup and the phrase cache are warm
+        await run_level(1, args, store, dispatcher, cache)
+
+        print(
+            f"{'sessions':>8}{'tools/s':>9}{'resp p50':>10}{'resp p95':>10}{'lag p50':>9}{'lag p99':>9}"
+            f"{'lag max':>9}{'cpu %/s':>9}{'rss MB/s':>10}{'orders':>9}"
+        )
+        for sessions in levels(args.max_sessions):
+            summary = (await run_level(sessions, args, store, dispatcher, cache)).summary(args.orders)
+            results.append(summary)
+            print(
+                f"{summary['sessions']:>8}{summary['tool_calls_per_s']:>9.1f}{summary['response_p50_ms']:>10.0f}"
+                f"{summary['response_p95_ms']:>10.0f}{summary['loop_lag_p50_ms']:>9.2f}{summary['loop_lag_p99_ms']:>9.2f}"
+                f"{summary['loop_lag_max_ms']:>9.1f}{summary['cpu_pct_per_session']:>9.2f}"
+                f"{summary['rss_mb_per_session']:>10.2f}{summary['orders_saved']:>5}/{summary['orders_expected']:<3}"
+            )
+            if summary["orders_saved"] < summary["orders_expected"] or summary["timeouts"] or summary["errors"]:
+                failures.append(
+                    f"{sessions} sessions: {summary['orders_saved']}/{summary['orders_expected']} orders saved, "
+                    f"{summary['timeouts']} turns timed out, errors: {summary['errors']}"
+                )
+            if args.max_lag_ms is not None and summary["loop_lag_p99_ms"] > args.max_lag_ms:
+                failures.append(f"{sessions} sessions: p99 loop lag {summary['loop_lag_p99_ms']}ms > {args.max_lag_ms}ms")
+        store.close()
+        dispatcher.close()
+
+    if args.json:
+        Path(args.json).write_text(json.dumps({"args": vars(args), "levels": results}, indent=2))
+    for failure in failures:
+        print(f"FAIL {failure}")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
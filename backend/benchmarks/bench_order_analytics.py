@@ -0,0 +1,143 @@
+"""Benchmark the columnar order index on a synthetic history of one million orders.
+
+Builds an index of synthetic orders spread over 90 days and times typical
+questions against it, next to the same question answered by a per-order
+Python loop over the decoded records (the approach of parsing every saved
+order, minus the file I/O). It also times an incremental ingest of new orders
+from a JSONL order store.
+
+Run with:
+
+    uv sync --extra analytics
+    uv run python benchmarks/bench_order_analytics.py --orders 1000000
+"""
+
+import argparse
+import sys
+import tempfile
+import time
+from collections import Counter
+from datetime import datetime, timedelta
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))
+
+from order_analytics import OrderIndex, from_epoch_seconds, to_epoch_seconds
+from order_store import open_order_store
+
+DRINKS = ["latte", "cappuccino", "espresso", "americano", "mocha", "cold brew"]
+SIZES = ["small", "medium", "large"]
+MILKS = ["whole milk", "skim milk", "oat milk", "almond milk", "soy milk", "no milk"]
+EXTRAS = ["extra shot", "whipped cream", "caramel drizzle", "vanilla syrup", "hazelnut syrup"]
+DAYS = 90
+
+
+def synthetic_columns(index, n, rng):
+    """Encoded columns for n random orders, registering the dictionaries on the index"""
+    start = to_epoch_seconds((datetime.now() - timedelta(days=DAYS)).replace(microsecond=0).isoformat())
+    columns = {"timestamp": np.sort(rng.integers(start, start + DAYS * 86400, n, dtype=np.int64))}
+    for column, values in (("drinkType", DRINKS), ("size", SIZES), ("milk", MILKS)):
+        codes = np.array([index.encode_value(column, value) for value in values], dtype=np.uint16)
+        columns[column] = codes[rng.integers(0, len(values), n)]
+    bits = np.array([index.encode_extras([extra]) for extra in EXTRAS], dtype=np.uint64)
+    extras = np.zeros(n, dtype=np.uint64)
+    for bit in bits:
+        extras |= np.where(rng.random(n) < 0.2, bit, np.uint64(0))
+    columns["extras"] = extras
+    return columns
+
+
+def decode_records(index):
+    """The index as a list of per-order tuples, for the Python-loop baseline"""
+    columns = index.columns()
+    dictionaries = index.meta["dictionaries"]
+    return [
+        (int(ts), dictionaries["drinkType"][d], dictionaries["size"][s], dictionaries["milk"][m], int(e))
+        for ts, d, s, m, e in zip(
+            columns["timestamp"].tolist(), columns["drinkType"].tolist(), columns["size"].tolist(),
+            columns["milk"].tolist(), columns["extras"].tolist(),
+        )
+    ]
+
+
+def python_loop_per_hour(records, drink, size, milk, since, until):
+    counts = Counter()
+    for ts, d, s, m, _ in records:
+        if since <= ts < until and d == drink and s == size and m == milk:
+            counts[ts // 3600] += 1
+    return sorted((from_epoch_seconds(h * 3600), c) for h, c in counts.items())
+
+
+def python_loop_group_by(records):
+    return Counter((s, m) for _, _, s, m, _ in records)
+
+
+def timed(fn, repeat=3):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--orders", type=int, default=1_000_000)
+    parser.add_argument("--new-orders", type=int, default=10_000, help="orders appended to the store for the incremental ingest")
+    args = parser.parse_args()
+    rng = np.random.default_rng(0)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        index = OrderIndex(Path(tmp) / "analytics")
+        start = time.perf_counter()
+        index.append_columns(synthetic_columns(index, args.orders, rng))
+        index.save()
+        print(f"built index of {index.count:,} orders in {time.perf_counter() - start:.2f}s")
+
+        index = OrderIndex(Path(tmp) / "analytics")
+        yesterday = to_epoch_seconds((datetime.now() - timedelta(days=1)).date().isoformat())
+        today = yesterday + 86400
+        records = decode_records(index)
+
+        def query():
+            return index.query(
+                bucket="hour",
+                where={"drinkType": "latte", "size": "large", "milk": "oat milk"},
+                since=yesterday, until=today,
+            )
+
+        def loop():
+            return python_loop_per_hour(records, "latte", "large", "oat milk", yesterday, today)
+
+        t_index, result = timed(query)
+        t_loop, expected = timed(loop)
+        assert [(key[0], count) for key, count in result] == expected
+        print(f"large oat lattes per hour yesterday: index {t_index * 1000:8.2f} ms   python loop {t_loop * 1000:8.2f} ms")
+
+        t_index, result = timed(lambda: index.query(group_by=["size", "milk"]))
+        t_loop, expected = timed(lambda: python_loop_group_by(records))
+        assert dict(result) == dict(expected)
+        print(f"orders by size and milk:             index {t_index * 1000:8.2f} ms   python loop {t_loop * 1000:8.2f} ms")
+
+        t_index, _ = timed(lambda: index.query(group_by=["extras"], bucket="day"))
+        print(f"extras per day:                      index {t_index * 1000:8.2f} ms")
+
+        store = open_order_store("jsonl", Path(tmp) / "orders.jsonl")
+        now = datetime.now().isoformat()
+        for i in range(args.new_orders):
+            store.submit({"id": str(i), "drinkType": DRINKS[i % 6], "size": SIZES[i % 3], "milk": MILKS[i % 6],
+                          "extras": [EXTRAS[i % 5]], "name": f"Customer {i}", "timestamp": now, "status": "completed"})
+        store.close()
+        start = time.perf_counter()
+        added = index.ingest(store, Path(tmp))
+        print(f"incremental ingest of {added:,} new orders: {(time.perf_counter() - start) * 1000:.1f} ms")
+        start = time.perf_counter()
+        added = index.ingest(store, Path(tmp))
+        print(f"re-ingest with nothing new ({added} orders): {(time.perf_counter() - start) * 1000:.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
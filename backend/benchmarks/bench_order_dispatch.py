@@ -0,0 +1,200 @@
+"""Order numbering and kitchen display fan-out across worker processes.
+
+Starts --workers producer processes, each running --sessions concurrent
+sessions on its own event loop that number, save and publish --orders orders
+apiece the way the agent does (allocate, then publish), and --displays
+consumer processes in each of --groups consumer groups reading the dispatch
+stream. Some displays "crash" on a fraction of their orders (--drop-rate):
+they never acknowledge them, so those orders are redelivered once their lease
+runs out.
+
+Reports orders per minute, allocation and publish latency, delivery latency
+from publish to display, and redeliveries, and checks that:
+
+- no order number was handed out twice, and every worker saw its numbers
+  increase
+- every group received every order, despite the dropped acknowledgements
+
+Run with:
+
+    uv run python benchmarks/bench_order_dispatch.py --workers 4 --sessions 50 --orders 20
+"""
+
+import argparse
+import asyncio
+import multiprocessing
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))
+
+from instrumentation import LatencyHistogram
+from order_dispatch import DispatchConsumer, dispatch_status, open_order_dispatcher
+
+DRINKS = ["latte", "cappuccino", "mocha", "cold brew"]
+
+
+async def session(dispatcher, worker, index, args, rng, allocate_latency, publish_latency, numbers):
+    for n in range(args.orders):
+        await asyncio.sleep(rng.uniform(0.5, 1.5) * args.think_ms / 1000)
+        start = time.perf_counter()
+        number = await dispatcher.allocate()
+        allocate_latency.record(time.perf_counter() - start)
+        numbers.append(number)
+        order = {
+            "orderNumber": number,
+            "drinkType": rng.choice(DRINKS),
+            "size": rng.choice(["small", "medium", "large"]),
+            "milk": "oat milk",
+            "extras": [],
+            "name": f"Customer {worker}-{index}-{n}",
+        }
+        start = time.perf_counter()
+        # Stamped so the displays can measure the delivery latency
+        await dispatcher.publish({**order, "publishedAt": time.time()})
+        publish_latency.record(time.perf_counter() - start)
+
+
+async def produce(path, worker, args):
+    rng = random.Random(args.seed + worker)
+    dispatcher = open_order_dispatcher(path, max_pending=args.max_pending)
+    allocate_latency, publish_latency = LatencyHistogram(), LatencyHistogram()
+    numbers = []
+    start = time.perf_counter()
+    await asyncio.gather(*(
+        session(dispatcher, worker, index, args, rng, allocate_latency, publish_latency, numbers)
+        for index in range(args.sessions)
+    ))
+    elapsed = time.perf_counter() - start
+    dispatcher.close()
+    return {
+        "numbers": numbers,
+        "elapsed": elapsed,
+        "allocate": allocate_latency.to_dict(),
+        "publish": publish_latency.to_dict(),
+        "batches": dispatcher.batches_committed,
+    }
+
+
+def producer(path, worker, args, results, start_event):
+    start_event.wait()
+    results.put(("producer", worker, asyncio.run(produce(path, worker, args))))
+
+
+def consumer(path, group, name, args, results, stop_event):
+    rng = random.Random(f"{args.seed}-{group}-{name}")
+    display = DispatchConsumer(path, group, name, lease=args.lease, start="earliest")
+    delivered, latency, redelivered = [], LatencyHistogram(), 0
+    while not stop_event.is_set():
+        batch = display.fetch(limit=32)
+        if not batch:
+            time.sleep(0.01)
+            continue
+        now = time.time()
+        acked = []
+        for delivery in batch:
+            if delivery.deliveries > 1:
+                redelivered += 1
+            else:
+                latency.record(now - delivery.order["publishedAt"])
+            if rng.random() < args.drop_rate:
+                continue
+            delivered.append(delivery.order["orderNumber"])
+            acked.append(delivery)
+        display.ack(acked)
+    display.close()
+    results.put(("consumer", group, {"delivered": delivered, "latency": latency.to_dict(), "redelivered": redelivered}))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, default=4, help="producer processes")
+    parser.add_argument("--sessions", type=int, default=50, help="concurrent sessions per worker")
+    parser.add_argument("--orders", type=int, default=20, help="orders per session")
+    parser.add_argument("--think-ms", type=float, default=50, help="average pause of a session between orders")
+    parser.add_argument("--groups", type=int, default=2, help="consumer groups, each receiving every order")
+    parser.add_argument("--displays", type=int, default=2, help="consumer processes per group")
+    parser.add_argument("--drop-rate", type=float, default=0.01, help="fraction of deliveries a display never acknowledges")
+    parser.add_argument("--lease", type=float, default=1.0, help="seconds before an unacknowledged order is redelivered")
+    parser.add_argument("--max-pending", type=int, default=1024, help="publishes a worker may have queued")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / "dispatch.db"
+        results = multiprocessing.Queue()
+        start_event, stop_event = multiprocessing.Event(), multiprocessing.Event()
+        producers = [
+            multiprocessing.Process(target=producer, args=(path, worker, args, results, start_event))
+            for worker in range(args.workers)
+        ]
+        consumers = [
+            multiprocessing.Process(target=consumer, args=(path, f"group-{group}", f"display-{display}", args, results, stop_event))
+            for group in range(args.groups)
+            for display in range(args.displays)
+        ]
+        for process in producers + consumers:
+            process.start()
+        start_event.set()
+
+        produced = [results.get() for _ in producers]
+        expected = args.workers * args.sessions * args.orders
+        # Wait until every group has acknowledged every order, redeliveries included
+        deadline = time.time() + 60 + args.lease * 10
+        while time.time() < deadline:
+            groups = dispatch_status(path)["groups"]
+            if len(groups) == args.groups and all(not g["backlog"] and not g["in_flight"] for g in groups.values()):
+                break
+            time.sleep(0.1)
+        stop_event.set()
+        consumed = [results.get() for _ in consumers]
+        for process in producers + consumers:
+            process.join()
+        status = dispatch_status(path)
+
+    failures = []
+    numbers = [number for _, _, result in produced for number in result["numbers"]]
+    if len(set(numbers)) != len(numbers):
+        failures.append(f"{len(numbers) - len(set(numbers))} order numbers were handed out twice")
+    for _, worker, result in produced:
+        if result["numbers"] != sorted(result["numbers"]):
+            failures.append(f"worker {worker} saw its order numbers go down")
+    if sorted(numbers) != list(range(1, expected + 1)):
+        failures.append("order numbers are not the consecutive range 1..N")
+
+    elapsed = max(result["elapsed"] for _, _, result in produced)
+    allocate, publish = LatencyHistogram(), LatencyHistogram()
+    for _, _, result in produced:
+        allocate.merge(LatencyHistogram.from_dict(result["allocate"]))
+        publish.merge(LatencyHistogram.from_dict(result["publish"]))
+    batches = sum(result["batches"] for _, _, result in produced)
+
+    print(f"{args.workers} workers x {args.sessions} sessions x {args.orders} orders = {expected} orders in {elapsed:.2f}s")
+    print(f"throughput:       {expected / elapsed * 60:,.0f} orders/min ({batches} commits, {expected * 2 / batches:.1f} requests/commit)")
+    print(f"allocate latency: {allocate.summary()}")
+    print(f"publish latency:  {publish.summary()}")
+
+    for group in sorted({group for _, group, _ in consumed}):
+        results_of_group = [result for _, g, result in consumed if g == group]
+        delivered = [number for result in results_of_group for number in result["delivered"]]
+        latency = LatencyHistogram()
+        for result in results_of_group:
+            latency.merge(LatencyHistogram.from_dict(result["latency"]))
+        redelivered = sum(result["redelivered"] for result in results_of_group)
+        missing = set(numbers) - set(delivered)
+        duplicates = len(delivered) - len(set(delivered))
+        print(f"{group}: {len(set(delivered))}/{expected} orders, {redelivered} redelivered, {duplicates} duplicates, delivery {latency.summary()}")
+        if missing:
+            failures.append(f"{group} never acknowledged {len(missing)} orders")
+    print(f"status: {status}")
+
+    for failure in failures:
+        print(f"FAIL {failure}")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,55 @@
+"""Bytes on the wire per order update: state deltas vs. server-rendered HTML.
+
+Replays a scripted order one field at a time and compares the payload the
+agent publishes with the order-state protocol against the HTML panel it used
+to publish on every update.
+
+Run with:
+
+    uv run python benchmarks/bench_order_protocol.py
+"""
+
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))
+
+import drink_renderer
+import order_protocol
+from order_state import OrderState
+
+SCRIPT = [
+    ("drinkType", "latte"),
+    ("size", "large"),
+    ("milk", "oat milk"),
+    ("extras", "extra shot"),
+    ("extras", "whipped cream"),
+    ("name", "Sam"),
+]
+
+
+def main():
+    state = OrderState()
+    encoder = order_protocol.OrderStateEncoder()
+    snapshot = encoder.snapshot(state)
+    print(f"{'update':<28}{'html bytes':>12}{'delta bytes':>13}{'saved':>8}")
+    print(f"{'(snapshot on connect)':<28}{len(drink_renderer.render_drink_html(state).encode('utf-8')):>12}{len(snapshot):>13}")
+
+    html_total = delta_total = 0
+    for field, value in SCRIPT:
+        if field == "extras":
+            state.add_extra(value)
+        else:
+            state.update({field: value})
+        html_bytes = len(drink_renderer.render_drink_html(state).encode("utf-8"))
+        delta_bytes = len(encoder.delta(state))
+        html_total += html_bytes
+        delta_total += delta_bytes
+        label = f"{field}={value}"
+        print(f"{label[:27]:<28}{html_bytes:>12}{delta_bytes:>13}{1 - delta_bytes / html_bytes:>8.1%}")
+
+    print(f"{'total':<28}{html_total:>12}{delta_total:>13}{1 - delta_total / html_total:>8.1%}")
+
+
+if __name__ == "__main__":
+    main()
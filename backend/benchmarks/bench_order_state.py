@@ -0,0 +1,219 @@
+"""Memory per session and operations per second of OrderState vs. the order dict.
+
+The dict version is the one the tools used to edit, reproduced below with the
+code that worked on it: the missing-field check, the extras list search, the
+copy per speculative turn, the protocol delta and the indented JSON
+check_order_status returned. Reports:
+
+- the memory one session's order state takes mid-order (drink, size, milk,
+  two extras and a name), measured over --sessions states, plus the shadow
+  copy a speculative turn holds
+- the time of each operation the tools do on the state, and of a whole order
+  as the tools take it (the field updates, an extra, a missing-field check
+  after each, a turn copy and a delta per update, a status check and the save)
+
+Exits with status 1 if the two versions do not end up with the same order, or
+if OrderState is larger or slower per order than the dict.
+
+Run with:
+
+    uv run python benchmarks/bench_order_state.py --sessions 10000
+"""
+
+import argparse
+import gc
+import json
+import sys
+import timeit
+import tracemalloc
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))
+
+from order_state import OrderState
+
+ORDER_FIELDS = ("drinkType", "size", "milk", "extras", "name")
+UPDATES = ({"drinkType": "latte", "size": "large", "milk": "oat milk"}, {"name": "Sam"})
+EXTRAS = ("extra shot", "vanilla syrup")
+
+
+def dict_new():
+    return {"drinkType": None, "size": None, "milk": None, "extras": [], "name": None}
+
+
+def dict_missing_fields(state):
+    missing = []
+    if not state["drinkType"]:
+        missing.append("drink type")
+    if not state["size"]:
+        missing.append("size")
+    if state["milk"] is None:
+        missing.append("milk preference")
+    if not state["name"]:
+        missing.append("name")
+    return missing
+
+
+def dict_add_extra(state, extra):
+    if extra not in state["extras"]:
+        state["extras"].append(extra)
+
+
+def dict_copy(state):
+    return {field: list(state[field]) if field == "extras" else state[field] for field in ORDER_FIELDS}
+
+
+def dict_changes(state, last):
+    return {
+        field: list(state[field]) if field == "extras" else state[field]
+        for field in ORDER_FIELDS
+        if state[field] != last[field]
+    }
+
+
+def dict_status(state):
+    missing = dict_missing_fields(state)
+    if missing:
+        return f"Still need: {', '.join(missing)}"
+    return f"Order complete: {json.dumps(state, indent=2)}"
+
+
+def dict_save(state):
+    return {**state, "extras": list(state["extras"]), "status": "completed"}
+
+
+def dict_order():
+    """One order as the tools took it with the dict"""
+    state = dict_new()
+    last = dict_copy(state)
+    for updates in UPDATES:
+        turn = dict_copy(state)
+        turn.update(updates)
+        dict_missing_fields(turn)
+        state = turn
+        dict_changes(state, last)
+        last = dict_copy(state)
+    for extra in EXTRAS:
+        turn = dict_copy(state)
+        dict_add_extra(turn, extra)
+        dict_missing_fields(turn)
+        state = turn
+        dict_changes(state, last)
+        last = dict_copy(state)
+    dict_status(state)
+    if not dict_missing_fields(state):
+        return dict_save(state)
+
+
+def state_status(state):
+    missing = state.missing_fields()
+    if missing:
+        return f"Still need: {', '.join(missing)}"
+    return f"Order complete: {state.describe()}"
+
+
+def state_order():
+    """The same order with OrderState"""
+    state = OrderState()
+    last = state.copy()
+    for updates in UPDATES:
+        turn = state.copy()
+        turn.update(updates)
+        turn.missing_fields()
+        state = turn
+        state.changes(last)
+        last = state.copy()
+    for extra in EXTRAS:
+        turn = state.copy()
+        turn.add_extra(extra)
+        turn.missing_fields()
+        state = turn
+        state.changes(last)
+        last = state.copy()
+    state_status(state)
+    if state.complete:
+        return {**state.to_dict(), "status": "completed"}
+
+
+def memory_per_state(build, sessions):
+    """Bytes per state of sessions mid-order states, each with a turn's copy"""
+    names = [f"Customer {i}" for i in range(sessions)]
+    gc.collect()
+    tracemalloc.start()
+    states = [build(name) for name in names]
+    gc.collect()
+    memory, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del states
+    return memory / sessions
+
+
+def dict_session(name):
+    state = dict_new()
+    state.update({"drinkType": "latte", "size": "large", "milk": "oat milk", "name": name})
+    for extra in EXTRAS:
+        dict_add_extra(state, extra)
+    return state, dict_copy(state)
+
+
+def state_session(name):
+    state = OrderState()
+    state.update({"drinkType": "latte", "size": "large", "milk": "oat milk", "name": name})
+    for extra in EXTRAS:
+        state.add_extra(extra)
+    return state, state.copy()
+
+
+def best_ns(fn, number):
+    return min(timeit.repeat(fn, number=number, repeat=5)) / number * 1e9
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sessions", type=int, default=10_000)
+    parser.add_argument("--number", type=int, default=20_000, help="timed repetitions of each operation")
+    args = parser.parse_args()
+
+    failures = []
+    saved_dict, saved_state = dict_order(), state_order()
+    if saved_dict != saved_state:
+        failures.append(f"the saved orders differ: {saved_dict} vs {saved_state}")
+
+    dict_bytes = memory_per_state(dict_session, args.sessions)
+    state_bytes = memory_per_state(state_session, args.sessions)
+    print(f"memory per session (state and a turn's copy, over {args.sessions:,} sessions):")
+    print(f"  dict {dict_bytes:.0f} B, OrderState {state_bytes:.0f} B ({1 - state_bytes / dict_bytes:.0%} less)")
+    if state_bytes > dict_bytes:
+        failures.append("OrderState takes more memory than the dict")
+
+    full_dict, _ = dict_session("Sam")
+    last_dict = dict_new()
+    full_state, _ = state_session("Sam")
+    last_state = OrderState()
+    operations = (
+        ("set a field", lambda: full_dict.update({"size": "large"}), lambda: full_state.update({"size": "large"})),
+        ("add an extra", lambda: dict_add_extra(full_dict, "vanilla syrup"), lambda: full_state.add_extra("vanilla syrup")),
+        ("missing fields", lambda: dict_missing_fields(full_dict), full_state.missing_fields),
+        ("turn copy", lambda: dict_copy(full_dict), full_state.copy),
+        ("protocol delta", lambda: dict_changes(full_dict, last_dict), lambda: full_state.changes(last_state)),
+        ("check_order_status", lambda: dict_status(full_dict), lambda: state_status(full_state)),
+        ("save", lambda: dict_save(full_dict), lambda: {**full_state.to_dict(), "status": "completed"}),
+    )
+    print(f"{'operation':<20}{'dict ns':>10}{'OrderState ns':>15}")
+    for label, dict_op, state_op in operations:
+        print(f"{label:<20}{best_ns(dict_op, args.number):>10.0f}{best_ns(state_op, args.number):>15.0f}")
+
+    dict_ns = best_ns(dict_order, args.number // 10)
+    state_ns = best_ns(state_order, args.number // 10)
+    print(f"{'whole order':<20}{dict_ns:>10.0f}{state_ns:>15.0f}")
+    print(f"orders/s: dict {1e9 / dict_ns:,.0f}, OrderState {1e9 / state_ns:,.0f} ({dict_ns / state_ns:.1f}x)")
+    if state_ns > dict_ns:
+        failures.append("OrderState is slower per order than the dict")
+
+    for failure in failures:
+        print(f"FAIL {failure}")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,118 @@
+"""Throughput benchmark for the order stores under many concurrent sessions.
+
+Simulates SESSIONS concurrent agent sessions on one event loop, each saving
+ORDERS orders with a little think time in between, and reports throughput,
+save latency and the worst event-loop stall for:
+
+- legacy: the original synchronous json.dump into one file per order
+- jsonl / sqlite: the group-committed background-writer stores
+
+Run with:
+
+    uv run python benchmarks/bench_order_store.py --sessions 200 --orders 20
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))
+
+from order_store import open_order_store
+
+
+class LegacyStore:
+    """The original save path: mkdir + synchronous open/json.dump on the event loop"""
+
+    def __init__(self, path):
+        self.orders_dir = Path(path)
+
+    async def save(self, order):
+        self.orders_dir.mkdir(exist_ok=True)
+        filename = f"order_{datetime.now().strftime('%Y%m%d_%H%M%S')}_{order['name'].replace(' ', '_')}.json"
+        with open(self.orders_dir / filename, "w") as f:
+            json.dump(order, f, indent=2)
+            f.flush()
+        json.dumps(order, indent=2)
+        return order
+
+    def close(self):
+        pass
+
+
+def make_order(session, n):
+    return {
+        "drinkType": random.choice(["latte", "cappuccino", "mocha", "cold brew"]),
+        "size": random.choice(["small", "medium", "large"]),
+        "milk": random.choice(["oat milk", "whole milk", "no milk"]),
+        "extras": random.sample(["extra shot", "whipped cream", "vanilla syrup"], k=random.randint(0, 2)),
+        "name": f"Customer {session}-{n}",
+        "timestamp": datetime.now().isoformat(),
+        "status": "completed",
+    }
+
+
+async def monitor_loop_lag(stop, interval=0.005):
+    """Worst observed delay of a timer on the event loop"""
+    worst = 0.0
+    while not stop.is_set():
+        start = time.perf_counter()
+        await asyncio.sleep(interval)
+        worst = max(worst, time.perf_counter() - start - interval)
+    return worst
+
+
+async def run(store, sessions, orders):
+    latencies = []
+
+    async def session(i):
+        for n in range(orders):
+            await asyncio.sleep(random.uniform(0, 0.002))
+            start = time.perf_counter()
+            await store.save(make_order(i, n))
+            latencies.append(time.perf_counter() - start)
+
+    stop = asyncio.Event()
+    lag_task = asyncio.create_task(monitor_loop_lag(stop))
+    start = time.perf_counter()
+    await asyncio.gather(*(session(i) for i in range(sessions)))
+    elapsed = time.perf_counter() - start
+    stop.set()
+    worst_lag = await lag_task
+    return elapsed, latencies, worst_lag
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sessions", type=int, default=200)
+    parser.add_argument("--orders", type=int, default=20)
+    parser.add_argument("--backends", default="legacy,jsonl,sqlite")
+    args = parser.parse_args()
+
+    total = args.sessions * args.orders
+    print(f"{args.sessions} sessions x {args.orders} orders = {total} orders")
+    print(f"{'backend':<8}{'orders/s':>10}{'p50 ms':>9}{'p99 ms':>9}{'max loop stall ms':>19}{'fsyncs':>8}")
+    for backend in args.backends.split(","):
+        with tempfile.TemporaryDirectory() as tmp:
+            if backend == "legacy":
+                store = LegacyStore(Path(tmp) / "orders")
+            else:
+                store = open_order_store(backend, Path(tmp) / f"orders.{backend}")
+            elapsed, latencies, worst_lag = asyncio.run(run(store, args.sessions, args.orders))
+            store.close()
+            latencies.sort()
+            p50 = statistics.median(latencies)
+            p99 = latencies[int(len(latencies) * 0.99) - 1]
+            fsyncs = getattr(store, "batches_committed", "-")
+            print(f"{backend:<8}{total / elapsed:>10.0f}{p50 * 1000:>9.2f}{p99 * 1000:>9.2f}{worst_lag * 1000:>19.2f}{fsyncs:>8}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+"""Job setup time in a fresh job process: cold vs. prewarmed.
+
+Each run spawns new Python processes that import the agent the way a job
+process does. In the cold process the models and provider clients are
+created when the job arrives, as the entrypoint used to do; in the warm
+process prewarm() has already run, so the job only picks them up. The table
+shows the median import time, prewarm time and time from job assignment to a
+ready pipeline.
+
+Provider clients are only constructed, not connected, so no credentials are
+needed (placeholder API keys are used when none are set). Pass --connect with
+real credentials to also open the provider connections on the job path.
+
+Run with:
+
+    uv run python benchmarks/bench_prewarm.py
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+from types import SimpleNamespace
+
+SRC = Path(__file__).resolve().parent.parent / "src"
+
+PLACEHOLDER_KEYS = ("ASSEMBLYAI_API_KEY", "GOOGLE_API_KEY", "MURF_API_KEY")
+
+
+def cold_job(agent, userdata):
+    """What the job path did before prewarm covered the session components"""
+    userdata["noise_cancellation"] = agent.noise_cancellation.BVC()
+    userdata["stt"] = agent.create_stt()
+    userdata["llm"] = agent.create_llm()
+    userdata["tts"] = agent.create_tts(userdata["tts_cache"])
+    agent.drink_renderer.prewarm()
+
+
+async def job_path(agent, proc, mode, connect):
+    from livekit.agents.utils import http_context
+
+    http_context._new_session_ctx()
+    start = time.perf_counter()
+    if mode == "cold":
+        cold_job(agent, proc.userdata)
+    if connect:
+        agent.warm_connections(proc.userdata["stt"], proc.userdata["llm"], proc.userdata["tts"])
+    agent.Assistant(
+        order_store=proc.userdata["order_store"],
+        dispatcher=proc.userdata["order_dispatcher"],
+        usual_orders=proc.userdata["usual_orders"],
+    )
+    elapsed = time.perf_counter() - start
+    await http_context._close_http_ctx()
+    return elapsed
+
+
+def child(mode, connect):
+    for key in PLACEHOLDER_KEYS:
+        os.environ.setdefault(key, "benchmark-placeholder")
+    sys.path.insert(0, str(SRC))
+
+    import_start = time.perf_counter()
+    import agent
+
+    import_s = time.perf_counter() - import_start
+
+    proc = SimpleNamespace(userdata={})
+    prewarm_start = time.perf_counter()
+    if mode == "warm":
+        agent.prewarm(proc)
+    else:
+        # The cold process still loaded the VAD and opened the stores in prewarm
+        proc.userdata["vad"] = agent.load_vad()
+        proc.userdata["order_store"] = agent.open_order_store()
+        proc.userdata["order_dispatcher"] = agent.open_order_dispatcher()
+        proc.userdata["usual_orders"] = agent.load_usual_orders(proc.userdata["order_store"])
+        proc.userdata["tts_cache"] = agent.open_phrase_cache()
+    prewarm_s = time.perf_counter() - prewarm_start
+
+    job_s = asyncio.run(job_path(agent, proc, mode, connect))
+    print(json.dumps({"import": import_s, "prewarm": prewarm_s, "job": job_s}))
+
+
+def run_child(mode, connect):
+    args = [sys.executable, __file__, "--child", mode] + (["--connect"] if connect else [])
+    out = subprocess.run(args, check=True, capture_output=True, text=True).stdout
+    return json.loads(out.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--connect", action="store_true", help="also open provider connections on the job path")
+    parser.add_argument("--child", choices=("cold", "warm"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        child(args.child, args.connect)
+        return
+
+    print(f"{'process':<8}{'import ms':>11}{'prewarm ms':>12}{'job setup ms':>14}")
+    for mode in ("cold", "warm"):
+        runs = [run_child(mode, args.connect) for _ in range(args.runs)]
+        median = {key: statistics.median(run[key] for run in runs) * 1000 for key in runs[0]}
+        print(f"{mode:<8}{median['import']:>11.0f}{median['prewarm']:>12.0f}{median['job']:>14.1f}")
+
+
+if __name__ == "__main__":
+    main()
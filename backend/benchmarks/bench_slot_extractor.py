@@ -0,0 +1,56 @@
+"""Hit rate and extraction time of the slot fast path on sample transcripts.
+
+Run with:
+
+    uv run python benchmarks/bench_slot_extractor.py
+"""
+
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))
+
+from slot_extractor import SlotExtractor
+
+# Transcripts as they come out of STT; the LLM should keep the ones that need judgement
+TRANSCRIPTS = [
+    "Medium cappuccino.",
+    "Almond milk.",
+    "No milk, please.",
+    "I'd like a large oat milk latte with an extra shot.",
+    "Can I get a small mocha?",
+    "Whipped cream and caramel drizzle.",
+    "Large.",
+    "Make it soy milk instead.",
+    "A cold brew, please.",
+    "Hi, what do you recommend?",
+    "It's for Sam.",
+    "Yes, that's right.",
+    "No whipped cream actually.",
+    "Something sweet but not too strong.",
+    "What's the difference between a latte and a cappuccino?",
+    "Sorry, a small large latte.",
+]
+
+ROUNDS = 20000
+
+
+def main():
+    extractor = SlotExtractor()
+    hits = 0
+    for text in TRANSCRIPTS:
+        slots = extractor.extract(text)
+        hits += slots is not None
+        print(f"{text!r:<62} {'fast path' if slots else 'LLM':<10} {slots or ''}")
+
+    start = time.perf_counter()
+    for _ in range(ROUNDS):
+        for text in TRANSCRIPTS:
+            extractor.extract(text)
+    per_call = (time.perf_counter() - start) / (ROUNDS * len(TRANSCRIPTS))
+    print(f"\nhit rate {hits}/{len(TRANSCRIPTS)} ({hits / len(TRANSCRIPTS):.0%}), {per_call * 1e6:.1f}us per transcript")
+
+
+if __name__ == "__main__":
+    main()
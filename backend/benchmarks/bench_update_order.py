@@ -0,0 +1,116 @@
+"""LLM round trips per order: one update_order call vs. one tool per field.
+
+Replays scripted conversations against the agent's tools with a fake room.
+In the per-field flow every detail the customer gives is its own tool call,
+followed by check_order_status, and each call costs one LLM round trip before
+the tool runs. In the batched flow each customer utterance costs a single
+update_order call, whose result already lists the missing fields. Both flows
+end every utterance with one more round trip for the spoken reply.
+
+The LLM round trip is simulated with a sleep (--llm-rtt-ms), so the numbers
+show how turn count turns into latency without calling a real model.
+
+Run with:
+
+    uv run python benchmarks/bench_update_order.py
+"""
+
+import argparse
+import asyncio
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))
+
+from fakes import FakeRoom
+
+from agent import Assistant
+
+# Each conversation is a list of customer utterances, each giving some order details
+CONVERSATIONS = {
+    "all at once": [
+        {"drink_type": "latte", "size": "large", "milk_type": "oat milk", "extras": ["extra shot"], "customer_name": "Sam"},
+    ],
+    "two utterances": [
+        {"drink_type": "cappuccino", "size": "medium", "milk_type": "whole milk"},
+        {"extras": ["vanilla syrup", "whipped cream"], "customer_name": "Priya"},
+    ],
+    "one per turn": [
+        {"drink_type": "mocha"},
+        {"size": "small"},
+        {"milk_type": "almond milk"},
+        {"customer_name": "Alex"},
+    ],
+}
+
+SINGLE_FIELD_TOOLS = {
+    "drink_type": "update_drink_type",
+    "size": "update_size",
+    "milk_type": "update_milk",
+    "customer_name": "update_name",
+}
+
+
+def new_assistant():
+    assistant = Assistant()
+    assistant.room = FakeRoom()
+    return assistant
+
+
+async def llm_round_trip(rtt):
+    await asyncio.sleep(rtt)
+
+
+async def per_field(assistant, utterance, rtt):
+    calls = 0
+    for arg, value in utterance.items():
+        if arg == "extras":
+            for extra in value:
+                await llm_round_trip(rtt)
+                await assistant.add_extra(None, extra)
+                calls += 1
+        else:
+            await llm_round_trip(rtt)
+            await getattr(assistant, SINGLE_FIELD_TOOLS[arg])(None, value)
+            calls += 1
+    await llm_round_trip(rtt)
+    await assistant.check_order_status(None)
+    return calls + 1
+
+
+async def batched(assistant, utterance, rtt):
+    await llm_round_trip(rtt)
+    await assistant.update_order(None, **utterance)
+    return 1
+
+
+async def run(flow, conversation, rtt):
+    assistant = new_assistant()
+    tool_calls = 0
+    start = time.perf_counter()
+    for utterance in conversation:
+        tool_calls += await flow(assistant, utterance, rtt)
+        # Final round trip for the spoken reply
+        await llm_round_trip(rtt)
+    elapsed = time.perf_counter() - start
+    await assistant.publisher.aclose()
+    assert assistant.order_state.complete, assistant.order_state
+    return tool_calls, tool_calls + len(conversation), elapsed, assistant.publisher.stats.submitted
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--llm-rtt-ms", type=float, default=400, help="simulated LLM round trip (default: 400)")
+    args = parser.parse_args()
+    rtt = args.llm_rtt_ms / 1000
+
+    print(f"{'conversation':<16}{'flow':<11}{'tool calls':>11}{'LLM calls':>11}{'renders':>9}{'latency ms':>12}")
+    for name, conversation in CONVERSATIONS.items():
+        for flow_name, flow in (("per-field", per_field), ("batched", batched)):
+            tool_calls, llm_calls, elapsed, renders = await run(flow, conversation, rtt)
+            print(f"{name:<16}{flow_name:<11}{tool_calls:>11}{llm_calls:>11}{renders:>9}{elapsed * 1000:>12.0f}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
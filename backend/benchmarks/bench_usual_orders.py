@@ -0,0 +1,157 @@
+"""Build time, memory and lookup time of the usual-order index.
+
+Writes --orders synthetic orders from --customers customers to a temporary
+order store. Visits follow a long-tailed distribution, so a few regulars
+come daily and most customers come rarely, and each customer orders their
+favourite drink most of the time. Then:
+
+- builds the index from the store, as prewarm does, with the customer cap
+  at --max-customers, and reports the build time and the memory it holds
+- times lookups in indexes of growing size, to show they do not depend on it,
+  next to one lookup by scanning the store
+- checks that the usual found for the regulars is their favourite drink
+
+Run with:
+
+    uv run python benchmarks/bench_usual_orders.py --orders 1000000 --customers 300000
+"""
+
+import argparse
+import gc
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))
+
+import menu
+from order_store import JsonlOrderStore
+from usual_orders import UsualOrderIndex, normalize_name
+
+DRINK_FIELDS = ("drinkType", "size", "milk", "extras")
+
+
+def random_drink(rng):
+    return {
+        "drinkType": rng.choice(menu.DRINKS.names),
+        "size": rng.choice(menu.SIZES.names),
+        "milk": rng.choice(menu.MILKS.names),
+        "extras": rng.sample(menu.EXTRAS.names, rng.choice((0, 0, 1, 2))),
+    }
+
+
+def synthetic_orders(count, customers, seed):
+    rng = random.Random(seed)
+    favourites = [random_drink(rng) for _ in range(customers)]
+    # Customer i visits with weight 1 / (i + 1)
+    weights = [1 / (i + 1) for i in range(customers)]
+    for index, customer in enumerate(rng.choices(range(customers), weights=weights, k=count)):
+        drink = favourites[customer] if rng.random() < 0.8 else random_drink(rng)
+        yield {"id": f"o{index}", "name": f"Customer {customer}", **drink, "status": "completed"}
+
+
+def time_lookups(index, names, repeat=5):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for name in names:
+            index.lookup(name)
+        best = min(best, time.perf_counter() - start)
+    return best / len(names)
+
+
+def scan_lookup(store, name):
+    """The usual without an index: read every stored order"""
+    key = normalize_name(name)
+    return [order for order in store.read_all() if normalize_name(order.get("name")) == key][-5:]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--orders", type=int, default=1_000_000)
+    parser.add_argument("--customers", type=int, default=300_000)
+    parser.add_argument("--max-customers", type=int, default=100_000, help="customers kept in the index")
+    parser.add_argument("--lookups", type=int, default=100_000)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    failures = []
+    with tempfile.TemporaryDirectory() as tmp:
+        store = JsonlOrderStore(Path(tmp) / "orders.jsonl")
+        batch = []
+        for order in synthetic_orders(args.orders, args.customers, args.seed):
+            batch.append(order)
+            if len(batch) == 10_000:
+                store._open()
+                store._write_batch(batch)
+                store._close()
+                batch = []
+        if batch:
+            store._open()
+            store._write_batch(batch)
+            store._close()
+
+        start = time.perf_counter()
+        index = UsualOrderIndex(max_customers=args.max_customers)
+        index.build(store.read_all())
+        build_s = time.perf_counter() - start
+        # Built again to measure its memory, since tracing slows the build down
+        gc.collect()
+        tracemalloc.start()
+        traced = UsualOrderIndex(max_customers=args.max_customers)
+        traced.build(store.read_all())
+        gc.collect()
+        memory, _ = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        del traced
+        summary = index.summary()
+        print(f"{args.orders:,} orders from {args.customers:,} customers")
+        print(
+            f"build: {build_s:.2f}s ({build_s / args.orders * 1e6:.1f}us per order, reading the store included), "
+            f"{summary['customers']:,} customers kept ({summary['evictions']:,} evicted), "
+            f"{summary['distinct_drinks']:,} distinct drinks, {memory / 2**20:.1f} MB ({memory / len(index):.0f} B/customer)"
+        )
+
+        rng = random.Random(args.seed)
+        print(f"{'customers':>10}{'lookup ns':>11}")
+        size = 1000
+        while True:
+            size = min(size, args.max_customers)
+            sized = UsualOrderIndex(max_customers=size)
+            sized.build(synthetic_orders(size * 10, size * 10, args.seed))
+            kept = [entry[0] for entry in sized._customers.values()]
+            names = [rng.choice(kept) for _ in range(args.lookups)]
+            print(f"{len(sized):>10,}{time_lookups(sized, names) * 1e9:>11.0f}")
+            if size == args.max_customers:
+                break
+            size *= 10
+
+        start = time.perf_counter()
+        scan_lookup(store, "Customer 0")
+        print(f"one lookup by scanning the store: {(time.perf_counter() - start) * 1000:.0f}ms")
+
+        # The regulars come most often, so their usual is their favourite
+        favourites = {}
+        for order in synthetic_orders(args.orders, args.customers, args.seed):
+            favourites.setdefault(order["name"], []).append(tuple(str(order[field]) for field in DRINK_FIELDS))
+        regulars = [f"Customer {i}" for i in range(100)]
+        matched = 0
+        for name in regulars:
+            usual, _, _ = index.lookup(name)
+            history = favourites[name]
+            favourite = max(set(history), key=history.count)
+            matched += usual is not None and tuple(str(usual[f]) for f in DRINK_FIELDS[:3]) == favourite[:3]
+        print(f"usual is the favourite drink for {matched}/{len(regulars)} regulars")
+        if matched < len(regulars) * 0.9:
+            failures.append("the usual found for the regulars is not their favourite drink")
+
+    for failure in failures:
+        print(f"FAIL {failure}")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
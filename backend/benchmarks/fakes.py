@@ -0,0 +1,246 @@
+"""Deterministic local stand-ins for the providers and the LiveKit room.
+
+Used by the benchmarks to run the agent with no network access:
+
+- FakeRoom: records what the agent publishes on the data channel, with an
+  optional simulated publish latency.
+- SilentAudioInput: a microphone track delivering silent frames in real time.
+- ScriptedSTT: a streaming STT that turns the next queued utterance into a
+  final transcript and an end of speech, timed by the incoming audio.
+- ScriptedLLM: answers each user message with the tool calls scripted for it,
+  then with a fixed reply once the tool results are in.
+- SyntheticTTS: a non-streaming TTS that returns a tone whose length follows
+  the text, the way real speech does.
+- FakeAudioOutput: an audio sink that plays out in real time (or instantly)
+  and reports playback as finished, like the room's audio track would.
+"""
+
+import asyncio
+import json
+import math
+import struct
+from collections import deque
+
+from livekit import rtc
+from livekit.agents import DEFAULT_API_CONNECT_OPTIONS, llm, stt, tts, utils
+from livekit.agents.voice.io import AudioInput, AudioOutput, AudioOutputCapabilities
+
+SAMPLE_RATE = 24000
+# Roughly how long a character of text takes to speak
+SECONDS_PER_CHAR = 0.06
+
+
+class FakeParticipant:
+    def __init__(self, publish_latency=0.0):
+        self.publish_latency = publish_latency
+        self.messages = 0
+        self.bytes = 0
+
+    async def publish_data(self, payload, *, topic=None, reliable=True):
+        if self.publish_latency:
+            await asyncio.sleep(self.publish_latency)
+        self.messages += 1
+        self.bytes += len(payload)
+
+
+class FakeRoom:
+    def __init__(self, publish_latency=0.0):
+        self.local_participant = FakeParticipant(publish_latency)
+
+
+class SilentAudioInput(AudioInput):
+    """Silent frames of frame_ms each, paced like a live track"""
+
+    def __init__(self, *, frame_ms=10):
+        super().__init__(label="silent")
+        samples = SAMPLE_RATE * frame_ms // 1000
+        self.frame = rtc.AudioFrame(
+            data=bytes(samples * 2),
+            sample_rate=SAMPLE_RATE,
+            num_channels=1,
+            samples_per_channel=samples,
+        )
+        self.interval = frame_ms / 1000
+        self._next = None
+
+    async def __anext__(self):
+        loop = asyncio.get_running_loop()
+        now = loop.time()
+        # Pace against a fixed schedule so a late frame does not delay the following ones
+        self._next = now if self._next is None else max(self._next + self.interval, now - 0.5)
+        await asyncio.sleep(self._next - now)
+        return self.frame
+
+
+class ScriptedSTT(stt.STT):
+    """Transcribes whatever was queued with say(), as soon as the next audio frame arrives"""
+
+    def __init__(self):
+        super().__init__(capabilities=stt.STTCapabilities(streaming=True, interim_results=False))
+        self.pending = deque()
+        self.frames = 0
+
+    def say(self, text):
+        self.pending.append(text)
+
+    async def _recognize_impl(self, buffer, *, language=None, conn_options=DEFAULT_API_CONNECT_OPTIONS):
+        text = self.pending.popleft() if self.pending else ""
+        return stt.SpeechEvent(
+            type=stt.SpeechEventType.FINAL_TRANSCRIPT,
+            alternatives=[stt.SpeechData(language="en", text=text, confidence=1.0)],
+        )
+
+    def stream(self, *, language=None, conn_options=DEFAULT_API_CONNECT_OPTIONS):
+        return _ScriptedRecognizeStream(stt=self, conn_options=conn_options)
+
+
+class _ScriptedRecognizeStream(stt.RecognizeStream):
+    async def _run(self):
+        async for frame in self._input_ch:
+            if isinstance(frame, self._FlushSentinel):
+                continue
+            self._stt.frames += 1
+            if not self._stt.pending:
+                continue
+            request_id = utils.shortuuid()
+            text = self._stt.pending.popleft()
+            self._event_ch.send_nowait(stt.SpeechEvent(
+                type=stt.SpeechEventType.FINAL_TRANSCRIPT,
+                request_id=request_id,
+                alternatives=[stt.SpeechData(language="en", text=text, confidence=1.0)],
+            ))
+            self._event_ch.send_nowait(stt.SpeechEvent(type=stt.SpeechEventType.END_OF_SPEECH, request_id=request_id))
+
+
+class ScriptedLLM(llm.LLM):
+    """Replies from a script keyed by the user's message text
+
+    script maps a user message to (tool_calls, reply), where tool_calls is a
+    list of (tool_name, arguments) pairs. Unscripted messages get the default
+    reply without tool calls.
+    """
+
+    def __init__(self, script, *, ttft=0.0, default_reply="Sorry, could you say that again?"):
+        super().__init__()
+        self.script = script
+        self.ttft = ttft
+        self.default_reply = default_reply
+
+    def chat(self, *, chat_ctx, tools=None, conn_options=DEFAULT_API_CONNECT_OPTIONS, **kwargs):
+        return _ScriptedLLMStream(self, chat_ctx=chat_ctx, tools=tools or [], conn_options=conn_options)
+
+
+class _ScriptedLLMStream(llm.LLMStream):
+    async def _run(self):
+        if self._llm.ttft:
+            await asyncio.sleep(self._llm.ttft)
+        request_id = utils.shortuuid()
+        # The agent appends system messages (the current order) after the conversation
+        conversation = [item for item in self._chat_ctx.items if getattr(item, "role", None) != "system"]
+        last = conversation[-1] if conversation else None
+        tool_calls, reply = [], self._llm.default_reply
+        if getattr(last, "type", None) == "message" and last.role == "user":
+            tool_calls, reply = self._llm.script.get(last.text_content, ([], self._llm.default_reply))
+        elif getattr(last, "type", None) == "function_call_output":
+            # Find the reply scripted for the user message that led to these tool calls
+            for item in reversed(self._chat_ctx.items):
+                if getattr(item, "type", None) == "message" and item.role == "user":
+                    _, reply = self._llm.script.get(item.text_content, ([], self._llm.default_reply))
+                    break
+            tool_calls = []
+
+        if tool_calls:
+            calls = [
+                llm.FunctionToolCall(name=name, arguments=json.dumps(arguments), call_id=utils.shortuuid())
+                for name, arguments in tool_calls
+            ]
+            self._event_ch.send_nowait(llm.ChatChunk(id=request_id, delta=llm.ChoiceDelta(role="assistant", tool_calls=calls)))
+            return
+        for word in reply.split(" "):
+            self._event_ch.send_nowait(llm.ChatChunk(id=request_id, delta=llm.ChoiceDelta(role="assistant", content=word + " ")))
+        self._event_ch.send_nowait(llm.ChatChunk(
+            id=request_id,
+            usage=llm.CompletionUsage(
+                completion_tokens=len(reply.split()),
+                prompt_tokens=len(self._chat_ctx.items) * 50,
+                total_tokens=len(reply.split()) + len(self._chat_ctx.items) * 50,
+            ),
+        ))
+
+
+def _tone(seconds, frequency=220.0):
+    samples = int(seconds * SAMPLE_RATE)
+    return struct.pack(
+        f"<{samples}h",
+        *(int(8000 * math.sin(2 * math.pi * frequency * i / SAMPLE_RATE)) for i in range(samples)),
+    )
+
+
+class SyntheticTTS(tts.TTS):
+    """Synthesizes a tone as long as the text would take to say"""
+
+    def __init__(self, *, ttfb=0.0):
+        super().__init__(capabilities=tts.TTSCapabilities(streaming=False), sample_rate=SAMPLE_RATE, num_channels=1)
+        self.ttfb = ttfb
+        # One second of tone, sliced for every request
+        self._tone = _tone(1.0)
+
+    def synthesize(self, text, *, conn_options=DEFAULT_API_CONNECT_OPTIONS):
+        return _SyntheticChunkedStream(tts=self, input_text=text, conn_options=conn_options)
+
+
+class _SyntheticChunkedStream(tts.ChunkedStream):
+    async def _run(self, output_emitter):
+        if self._tts.ttfb:
+            await asyncio.sleep(self._tts.ttfb)
+        output_emitter.initialize(
+            request_id=utils.shortuuid(),
+            sample_rate=SAMPLE_RATE,
+            num_channels=1,
+            mime_type="audio/pcm",
+        )
+        remaining = int(len(self._input_text) * SECONDS_PER_CHAR * SAMPLE_RATE) * 2
+        while remaining > 0:
+            chunk = self._tts._tone[:remaining]
+            output_emitter.push(chunk)
+            remaining -= len(chunk)
+        output_emitter.flush()
+
+
+class FakeAudioOutput(AudioOutput):
+    """Audio sink that plays captured audio out in real time, or instantly"""
+
+    def __init__(self, *, realtime=True):
+        super().__init__(label="fake", capabilities=AudioOutputCapabilities(pause=False))
+        self.realtime = realtime
+        self.frames = 0
+        self._pushed = 0.0
+        self._segment_open = False
+        self._playout_task = None
+
+    async def capture_frame(self, frame):
+        await super().capture_frame(frame)
+        self.frames += 1
+        self._pushed += frame.duration
+        self._segment_open = True
+
+    def flush(self):
+        super().flush()
+        # A flush with no audio captured since the last one is not a playback segment
+        if not self._segment_open:
+            return
+        duration, self._pushed, self._segment_open = self._pushed, 0.0, False
+        self._playout_task = asyncio.create_task(self._play_out(duration))
+
+    async def _play_out(self, duration):
+        if self.realtime:
+            await asyncio.sleep(duration)
+        self.on_playback_finished(playback_position=duration, interrupted=False)
+
+    def clear_buffer(self):
+        if self._segment_open:
+            self._pushed, self._segment_open = 0.0, False
+            self.on_playback_finished(playback_position=0.0, interrupted=True)
+        elif self._playout_task and not self._playout_task.done():
+            self._playout_task.cancel()
+            self.on_playback_finished(playback_position=0.0, interrupted=True)
@@ -0,0 +1,386 @@
+"""Load reporting and admission control for the worker.
+
+LiveKit's default load is the host's CPU, and the worker keeps accepting rooms
+until it crosses 0.7. Audio degrades before that, as soon as the job
+processes' event loops fall behind and frames go out late. So the worker
+reports a load built from what the jobs themselves measure:
+
+- Every job process writes a heartbeat to LOAD_METRICS_DIR (default
+  metrics/load/<pid>.json) each second. It holds the p99 and max event-loop
+  lag over that second (how late a 10ms timer fired), the CPU the process used
+  per wall-clock second, and the number of sessions open in it. Noise
+  cancellation (in the LiveKit FFI threads), resampling and VAD run in the
+  job process, while the STT, LLM and TTS run remotely. So the process CPU per
+  session is the cost of a session's audio pipeline.
+- The worker's load_fnc combines the heartbeats of its job processes. The
+  load is the largest of four numbers:
+  - the projected CPU: the CPU of the processes without sessions, plus the
+    measured CPU per session times the sessions, divided by the cores
+  - the worst loop lag over ADMISSION_MAX_LAG_MS
+  - the sessions over ADMISSION_MAX_SESSIONS, if set
+  - the host CPU
+
+  Sessions of jobs just accepted count before their process reports them.
+  LiveKit stops sending jobs to the worker once the load reaches
+  ADMISSION_LOAD_THRESHOLD.
+- The request_fnc accepts a job only if the load with one more session stays
+  under the threshold. A rejected job is offered to another worker.
+
+The worker writes its load, the load's parts and the count of each decision to
+the same directory (worker-<pid>.json). The latency exporter serves them next
+to the histograms (see instrumentation.py). Set ADMISSION_CONTROL=0 to use
+LiveKit's default load.
+"""
+
+import asyncio
+import json
+import logging
+import os
+import threading
+import time
+from collections import Counter
+from dataclasses import asdict, dataclass
+from pathlib import Path
+
+import psutil
+
+from instrumentation import LatencyHistogram
+
+logger = logging.getLogger("agent")
+
+DEFAULT_LOAD_DIR = Path("metrics") / "load"
+DEFAULT_LOAD_THRESHOLD = 0.75
+DEFAULT_MAX_LAG_MS = 50
+# CPU of one session, in cores, until the job processes have measured it
+DEFAULT_SESSION_CPU = 0.1
+
+HEARTBEAT_INTERVAL = 1.0
+LOOP_TICK = 0.01
+# A heartbeat older than this is from a process that is gone or stuck
+STALE_AFTER = 5.0
+# How long an accepted job counts as a session before its process reports it
+PENDING_TIMEOUT = 15.0
+# Weight of each new measurement of the CPU per session
+CPU_SMOOTHING = 0.2
+# Heartbeats of exited processes are deleted after this long
+PRUNE_AFTER = 60.0
+
+WORKER_STATUS_PREFIX = "worker-"
+
+
+def admission_control_enabled():
+    """Whether the worker reports its own load and admits jobs by it (ADMISSION_CONTROL)"""
+    return os.getenv("ADMISSION_CONTROL", "1").lower() not in ("0", "false", "no")
+
+
+def load_metrics_dir():
+    return Path(os.getenv("LOAD_METRICS_DIR") or DEFAULT_LOAD_DIR)
+
+
+def _write_json(path, data):
+    tmp_path = path.with_suffix(".tmp")
+    tmp_path.write_text(json.dumps(data), encoding="utf-8")
+    os.replace(tmp_path, path)
+
+
+class JobLoad:
+    """Loop lag, CPU and open sessions of this process, written as a heartbeat every second
+
+    Each event loop with a session open runs one lag probe, so with
+    JOB_EXECUTOR=thread every job thread's loop is measured.
+    """
+
+    def __init__(self, load_dir=None, interval=HEARTBEAT_INTERVAL):
+        self.load_dir = Path(load_dir) if load_dir else None
+        self.interval = interval
+        self.sessions = 0
+        self._lag = LatencyHistogram()
+        self._probes = {}
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def track_session(self):
+        """Count a session on the running event loop until the returned coroutine function is awaited"""
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            self.sessions += 1
+            probe, sessions = self._probes.get(loop, (None, 0))
+            if probe is None:
+                probe = loop.create_task(self._probe_lag())
+            self._probes[loop] = (probe, sessions + 1)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._write_loop, name="load-heartbeat", daemon=True)
+                self._thread.start()
+
+        async def end_session():
+            with self._lock:
+                self.sessions -= 1
+                probe, sessions = self._probes[loop]
+                if sessions > 1:
+                    self._probes[loop] = (probe, sessions - 1)
+                    return
+                del self._probes[loop]
+            probe.cancel()
+
+        return end_session
+
+    async def _probe_lag(self):
+        while True:
+            start = time.perf_counter()
+            await asyncio.sleep(LOOP_TICK)
+            lag = time.perf_counter() - start - LOOP_TICK
+            with self._lock:
+                self._lag.record(lag)
+
+    def _write_loop(self):
+        path = (self.load_dir or load_metrics_dir()) / f"{os.getpid()}.json"
+        cpu_start, wall_start = time.process_time(), time.perf_counter()
+        while True:
+            time.sleep(self.interval)
+            cpu, wall = time.process_time(), time.perf_counter()
+            with self._lock:
+                lag, self._lag = self._lag, LatencyHistogram()
+                sessions = self.sessions
+            heartbeat = {
+                "time": time.time(),
+                "sessions": sessions,
+                "cpu": (cpu - cpu_start) / (wall - wall_start),
+                "loop_lag_p99": lag.percentile(0.99),
+                "loop_lag_max": lag.max,
+            }
+            cpu_start, wall_start = cpu, wall
+            try:
+                path.parent.mkdir(parents=True, exist_ok=True)
+                _write_json(path, heartbeat)
+            except OSError as e:
+                logger.warning(f"Failed to write the load heartbeat: {e}")
+
+
+# Sessions of this process
+JOB_LOAD = JobLoad()
+
+
+@dataclass
+class WorkerLoad:
+    """The worker's sessions and each part of its load, as a fraction of its limit"""
+
+    sessions: int = 0
+    cpu: float = 0.0
+    loop_lag: float = 0.0
+    session_count: float = 0.0
+    host_cpu: float = 0.0
+
+    def parts(self):
+        return {"cpu": self.cpu, "loop_lag": self.loop_lag, "session_count": self.session_count, "host_cpu": self.host_cpu}
+
+    @property
+    def total(self):
+        return min(max(self.parts().values()), 1.0)
+
+    @property
+    def limited_by(self):
+        parts = self.parts()
+        return max(parts, key=parts.get)
+
+
+def read_heartbeats(load_dir, pids, now=None):
+    """The fresh heartbeats of the given processes"""
+    now = time.time() if now is None else now
+    heartbeats = []
+    for pid in pids:
+        try:
+            heartbeat = json.loads((load_dir / f"{pid}.json").read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            continue
+        if now - heartbeat["time"] <= STALE_AFTER:
+            heartbeats.append(heartbeat)
+    return heartbeats
+
+
+class AdmissionController:
+    """The worker's load_fnc and request_fnc, fed by the heartbeats of its job processes"""
+
+    def __init__(self, load_dir=None, *, threshold=None, max_lag=None, max_sessions=None, session_cpu=None, cores=None):
+        self.load_dir = Path(load_dir) if load_dir else load_metrics_dir()
+        self.threshold = threshold if threshold is not None else float(
+            os.getenv("ADMISSION_LOAD_THRESHOLD") or DEFAULT_LOAD_THRESHOLD
+        )
+        self.max_lag = max_lag if max_lag is not None else float(
+            os.getenv("ADMISSION_MAX_LAG_MS") or DEFAULT_MAX_LAG_MS
+        ) / 1000
+        self.max_sessions = max_sessions if max_sessions is not None else int(os.getenv("ADMISSION_MAX_SESSIONS") or 0)
+        self.session_cpu = session_cpu if session_cpu is not None else float(
+            os.getenv("ADMISSION_SESSION_CPU") or DEFAULT_SESSION_CPU
+        )
+        self.cores = cores or psutil.cpu_count() or 1
+        self.load = WorkerLoad()
+        self.decisions = Counter()
+        self._worker = None
+        self._pending = {}
+        # Time of the newest heartbeat in the CPU per session
+        self._sampled_at = 0.0
+        self._lock = threading.Lock()
+        self._status_written = 0.0
+        self._pruned = 0.0
+        # The first reading of the host CPU only starts the measurement
+        psutil.cpu_percent()
+
+    def worker_options(self):
+        """WorkerOptions fields installing this controller"""
+        return {"load_fnc": self.load_fnc, "request_fnc": self.request_fnc, "load_threshold": self.threshold}
+
+    def _job_pids(self):
+        # Job processes are children of the worker; with JOB_EXECUTOR=thread the jobs run in it
+        try:
+            children = psutil.Process().children(recursive=True)
+        except psutil.Error:
+            children = []
+        return [os.getpid()] + [child.pid for child in children]
+
+    def _running_job_ids(self):
+        if self._worker is None:
+            return set()
+        return {info.job.id for info in self._worker.active_jobs}
+
+    def _sample_session_cpu(self, busy):
+        # Each heartbeat is one sample, however often the load is measured between two of them
+        fresh = [heartbeat for heartbeat in busy if heartbeat["time"] > self._sampled_at]
+        fresh_sessions = sum(heartbeat["sessions"] for heartbeat in fresh)
+        if not fresh_sessions:
+            return
+        measured = sum(heartbeat["cpu"] for heartbeat in fresh) / fresh_sessions
+        self.session_cpu += CPU_SMOOTHING * (measured - self.session_cpu)
+        self._sampled_at = max(heartbeat["time"] for heartbeat in fresh)
+
+    def measure(self, host_cpu, extra_sessions=0, *, sample=True):
+        """The worker's load now, or with extra_sessions more sessions
+
+        With sample, the heartbeats written since the last sample update the
+        CPU per session; otherwise it is only read.
+        """
+        heartbeats = read_heartbeats(self.load_dir, self._job_pids())
+        busy = [heartbeat for heartbeat in heartbeats if heartbeat["sessions"]]
+        busy_sessions = sum(heartbeat["sessions"] for heartbeat in busy)
+        running = self._running_job_ids()
+        with self._lock:
+            if sample:
+                self._sample_session_cpu(busy)
+            now = time.monotonic()
+            self._pending = {
+                job_id: accepted_at
+                for job_id, accepted_at in self._pending.items()
+                if job_id not in running and now - accepted_at < PENDING_TIMEOUT
+            }
+            sessions = max(busy_sessions, len(running)) + len(self._pending) + extra_sessions
+            session_cpu = self.session_cpu
+        idle_cpu = sum(heartbeat["cpu"] for heartbeat in heartbeats if not heartbeat["sessions"])
+        return WorkerLoad(
+            sessions=sessions,
+            cpu=(idle_cpu + sessions * session_cpu) / self.cores,
+            loop_lag=max((heartbeat["loop_lag_p99"] for heartbeat in busy), default=0.0) / self.max_lag,
+            session_count=sessions / self.max_sessions if self.max_sessions else 0.0,
+            host_cpu=host_cpu + extra_sessions * session_cpu / self.cores,
+        )
+
+    def load_fnc(self, worker):
+        """Called by the worker every half second, on an executor thread"""
+        self._worker = worker
+        self.load = self.measure(psutil.cpu_percent() / 100)
+        if time.monotonic() - self._status_written >= HEARTBEAT_INTERVAL:
+            self.write_status()
+        return self.load.total
+
+    async def request_fnc(self, job_request):
+        load = await asyncio.to_thread(self.measure, self.load.host_cpu, 1, sample=False)
+        if load.total < self.threshold:
+            with self._lock:
+                self._pending[job_request.job.id] = time.monotonic()
+                self.decisions["accept"] += 1
+            logger.info(f"Accepting job {job_request.job.id}: load {load.total:.2f} with it ({load.sessions} sessions)")
+            await job_request.accept()
+            return
+        with self._lock:
+            self.decisions[f"reject:{load.limited_by}"] += 1
+        logger.warning(
+            f"Rejecting job {job_request.job.id}: load {load.total:.2f} with it, limited by {load.limited_by} "
+            f"({load.sessions} sessions, {self.session_cpu:.3f} cores per session)"
+        )
+        await job_request.reject()
+
+    def summary(self):
+        return {
+            "load": round(self.load.total, 3),
+            **{part: round(value, 3) for part, value in self.load.parts().items()},
+            "sessions": self.load.sessions,
+            "session_cpu": round(self.session_cpu, 4),
+            "decisions": dict(self.decisions),
+        }
+
+    def write_status(self):
+        self._status_written = time.monotonic()
+        status = {"time": time.time(), "threshold": self.threshold, **asdict(self.load), "total": self.load.total,
+                  "session_cpu": self.session_cpu, "decisions": dict(self.decisions)}
+        try:
+            self.load_dir.mkdir(parents=True, exist_ok=True)
+            _write_json(self.load_dir / f"{WORKER_STATUS_PREFIX}{os.getpid()}.json", status)
+        except OSError as e:
+            logger.warning(f"Failed to write the worker load: {e}")
+        if self._status_written - self._pruned >= PRUNE_AFTER:
+            self._pruned = self._status_written
+            prune_heartbeats(self.load_dir)
+
+
+def prune_heartbeats(load_dir, older_than=PRUNE_AFTER):
+    """Delete the heartbeats of job processes that have exited"""
+    now = time.time()
+    for path in Path(load_dir).glob("*.json"):
+        if not path.stem.isdigit():
+            continue
+        try:
+            if now - path.stat().st_mtime > older_than and not psutil.pid_exists(int(path.stem)):
+                path.unlink(missing_ok=True)
+        except OSError:
+            continue
+
+
+def admission_options():
+    """WorkerOptions fields for admission control, or none to keep LiveKit's default load"""
+    if not admission_control_enabled():
+        return {}
+    return AdmissionController().worker_options()
+
+
+def render_prometheus(load_dir, stale_after=60.0):
+    """Prometheus text exposition of the load and decisions of the workers on this host"""
+    now = time.time()
+    statuses = {}
+    for path in Path(load_dir).glob(f"{WORKER_STATUS_PREFIX}*.json"):
+        try:
+            status = json.loads(path.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            continue
+        if now - status["time"] <= stale_after:
+            statuses[path.stem[len(WORKER_STATUS_PREFIX):]] = status
+    lines = [
+        "# HELP agent_worker_load Load reported to LiveKit and its parts, as a fraction of each limit",
+        "# TYPE agent_worker_load gauge",
+    ]
+    for worker, status in sorted(statuses.items()):
+        for part in ("total", "cpu", "loop_lag", "session_count", "host_cpu"):
+            lines.append(f'agent_worker_load{{worker="{worker}",part="{part}"}} {status[part]:.4f}')
+    lines += ["# HELP agent_worker_sessions Sessions on the worker", "# TYPE agent_worker_sessions gauge"]
+    for worker, status in sorted(statuses.items()):
+        lines.append(f'agent_worker_sessions{{worker="{worker}"}} {status["sessions"]}')
+    lines += ["# HELP agent_session_cpu_cores Measured CPU of one session, in cores", "# TYPE agent_session_cpu_cores gauge"]
+    for worker, status in sorted(statuses.items()):
+        lines.append(f'agent_session_cpu_cores{{worker="{worker}"}} {status["session_cpu"]:.4f}')
+    lines += [
+        "# HELP agent_admission_decisions_total Job requests accepted and rejected by admission control",
+        "# TYPE agent_admission_decisions_total counter",
+    ]
+    for worker, status in sorted(statuses.items()):
+        for decision, count in sorted(status["decisions"].items()):
+            decision, _, reason = decision.partition(":")
+            labels = f'worker="{worker}",decision="{decision}"' + (f',reason="{reason}"' if reason else "")
+            lines.append(f"agent_admission_decisions_total{{{labels}}} {count}")
+    return "\n".join(lines) + "\n"
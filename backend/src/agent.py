@@ -1,9 +1,10 @@
+import asyncio
 import logging
-import json
 from datetime import datetime
-from pathlib import Path
+from typing import Optional
 
 from dotenv import load_dotenv
+from livekit import rtc
 from livekit.agents import (
     Agent,
     AgentSession,
@@ -11,16 +12,55 @@ from livekit.agents import (
     JobProcess,
     MetricsCollectedEvent,
     RoomInputOptions,
+    RunContext,
+    StopResponse,
     WorkerOptions,
     cli,
-    metrics,
-    tokenize,
     function_tool,
-    RunContext
+    metrics,
+    utils,
 )
-from livekit import rtc
-from livekit.plugins import murf, silero, google, deepgram, noise_cancellation, assemblyai
-from livekit.plugins.turn_detector.multilingual import MultilingualModel
+from livekit.plugins import assemblyai, google, murf, noise_cancellation
+
+import drink_renderer
+import menu
+import order_protocol
+from admission import JOB_LOAD, admission_options
+from batched_inference import (
+    batching_summary,
+    create_turn_detector,
+    job_executor_type,
+    load_turn_detector_model,
+    load_vad,
+)
+from context_compaction import (
+    ContextCompactor,
+    PromptTokenStats,
+    context_compaction_enabled,
+    estimate_tokens,
+    order_state_message,
+)
+from instrumentation import LATENCY, TurnTracker, span, timed_tool
+from order_dispatch import open_order_dispatcher
+from order_state import OrderState
+from order_store import open_order_store
+from slot_extractor import (
+    FastPathStats,
+    SlotExtractor,
+    slot_fast_path_enabled,
+    timed_extract,
+)
+from speculation import (
+    TurnBuffer,
+    current_turn,
+    preemptive_generation_enabled,
+    run_or_defer,
+    speculative,
+)
+from tts_cache import CachedTTS, open_phrase_cache, tts_cache_fill_enabled
+from usual_orders import UsualOrderIndex, load_usual_orders
+from visualization_publisher import VisualizationPublisher
+from warmup import FirstResponseTimer, StartupTimings, warm_connections
 
 logger = logging.getLogger("agent")
 
@@ -28,21 +68,72 @@ logger = logging.getLogger("agent")
 
 load_dotenv(".env")
 
+# What the fast path asks next, keyed by OrderState.missing_fields() entries
+NEXT_QUESTIONS = {
+    "drink type": "What would you like to drink?",
+    "size": "What size would you like: small, medium, or large?",
+    "milk preference": "What kind of milk would you like?",
+    "name": "And what name should I put on the order?",
+}
+ORDER_COMPLETE_QUESTION = "That's everything I need, shall I place the order?"
+
+# How get_usual_order names the details it leaves as the customer gave them
+USUAL_FIELD_LABELS = {"drinkType": "drink", "size": "size", "milk": "milk", "extras": "extras"}
+
+SAVE_FAILED_INSTRUCTIONS = (
+    "Saving the order failed. Apologize to the customer, tell them the order was not placed, "
+    "and offer to place it again."
+)
+
+TTS_VOICE = "en-US-matthew"
+TTS_STYLE = "Conversation"
+
+
+def spoken_phrases():
+    """Sentences the agent says often enough to keep in the TTS phrase cache"""
+    phrases = [*NEXT_QUESTIONS.values(), ORDER_COMPLETE_QUESTION, "Order saved successfully!", "Your order will be ready soon."]
+    for drink in menu.DRINKS.names:
+        phrases.append(f"Got it, {drink}.")
+        phrases += [f"Got it, {size} {drink}." for size in menu.SIZES.names]
+    for size in menu.SIZES.names:
+        phrases += [f"Got it, {size}.", f"Perfect, {size} size."]
+    for milk in menu.MILKS.names:
+        phrases += [f"Got it, {milk}.", f"Noted, {milk}."]
+    for extra in menu.EXTRAS.names:
+        phrases += [f"Got it, {extra}.", f"Added {extra}."]
+    return phrases
+
+
+def create_tts(tts_cache):
+    """Murf TTS behind the on-disk phrase cache"""
+    return CachedTTS(
+        murf.TTS(voice=TTS_VOICE, style=TTS_STYLE),
+        voice=f"murf/{TTS_VOICE}/{TTS_STYLE}",
+        cache=tts_cache,
+    )
+
 
 class Assistant(Agent):
-    def __init__(self) -> None:
+    def __init__(self, order_store=None, dispatcher=None, usual_orders=None) -> None:
         super().__init__(
-            instructions="""You are a friendly and enthusiastic barista at AgentX Coffee Shop. The user is interacting with you via voice.
+            instructions=f"""You are a friendly and enthusiastic barista at AgentX Coffee Shop. The user is interacting with you via voice.
             Your job is to take coffee orders and ensure all order details are complete.
             
             You need to collect the following information for each order:
-            1. Drink type (e.g., latte, cappuccino, espresso, americano, mocha, cold brew)
-            2. Size (small, medium, or large)
-            3. Milk type (whole milk, skim milk, oat milk, almond milk, soy milk, or no milk)
-            4. Extras (e.g., extra shot, whipped cream, caramel drizzle, vanilla syrup, sugar-free options)
+            1. Drink type ({menu.DRINKS.describe()})
+            2. Size ({menu.SIZES.describe()})
+            3. Milk type ({menu.MILKS.describe()})
+            4. Extras, optional ({menu.EXTRAS.describe()})
             5. Customer name for the order
             
+            Only items on the menu can be ordered; if a tool says an item is not on the menu, offer the closest options.
             Be conversational and friendly. Ask clarifying questions one at a time if information is missing.
+            Whenever the customer gives you any order details, record all of them with a single update_order call,
+            even if they mention several at once. Its result lists the details that are still missing, so you do not
+            need to call check_order_status. Only use the single-field tools to correct one detail.
+            If the customer asks for their usual, or gives their name before their order, call get_usual_order with
+            their name. It fills their regular drink into the details not given yet; read it back and ask if that is
+            what they would like today.
             Once you have all the information, use the save_order tool to save the order.
             After saving, confirm the order details to the customer and thank them.
             
@@ -50,165 +141,119 @@ class Assistant(Agent):
         )
         
         # Initialize order state
-        self.order_state = {
-            "drinkType": None,
-            "size": None,
-            "milk": None,
-            "extras": [],
-            "name": None
-        }
+        self.committed_state = OrderState()
+        
+        # Tool calls work on a shadow copy of the order state until their turn is confirmed
+        self.turns = TurnBuffer(self.commit_turn)
         
         # Store room reference for sending data
         self.room = None
-    
-    def generate_drink_html(self):
-        """Generate HTML visualization of the current drink order"""
         
-        # Determine cup size - smaller to prevent overlap
-        size_config = {
-            "small": {"height": "80px", "width": "60px"},
-            "medium": {"height": "95px", "width": "70px"},
-            "large": {"height": "110px", "width": "80px"}
-        }
-        cup_size = size_config.get(self.order_state["size"], size_config["medium"])
-        
-        # Determine drink color based on type
-        drink_colors = {
-            "latte": "#D4A574",
-            "cappuccino": "#A67C52",
-            "espresso": "#4A2C2A",
-            "americano": "#5D4037",
-            "mocha": "#7B4B3A",
-            "cold brew": "#6D4C41"
-        }
-        drink_color = drink_colors.get(self.order_state["drinkType"], "#A67C52")
+        # Where completed orders are persisted, and how they are numbered and sent to the kitchen
+        self.order_store = order_store or open_order_store()
+        self.dispatcher = dispatcher or open_order_dispatcher()
+        self.orders_completed = 0
         
-        # Check for whipped cream
-        has_whipped_cream = any("whipped cream" in extra.lower() for extra in self.order_state["extras"])
+        # Regulars' usual orders by name, kept up to date with the orders saved here
+        self.usual_orders = usual_orders if usual_orders is not None else UsualOrderIndex()
+        self._tasks = set()
         
-        # Build extras list
-        extras_html = ""
-        if self.order_state["extras"]:
-            extras_items = "".join([f"<div style='margin: 2px 0; font-size: 12px;'>• {extra}</div>" for extra in self.order_state["extras"]])
-            extras_html = f'<div style="margin: 0;">{extras_items}</div>'
+        # Keeps the LLM context from growing with every order of a long session
+        self.compactor = ContextCompactor() if context_compaction_enabled() else None
+        self.prompt_tokens = PromptTokenStats()
         
-        html = f"""
-        <div style="font-family: 'Segoe UI', Arial, sans-serif; padding: 12px; background: linear-gradient(135deg, #667eea 0%, #764ba2 100%); border-radius: 12px; max-width: 260px; margin: 0 auto; color: white; box-shadow: 0 6px 20px rgba(0,0,0,0.3);">
-            <div style="text-align: center; margin-bottom: 10px;">
-                <h2 style="margin: 0; font-size: 17px; font-weight: 600; display: inline-flex; align-items: center; gap: 5px;">
-                    <span style="font-size: 20px;">☕</span>
-                    <span>AgentX Coffee</span>
-                </h2>
-            </div>
-            
-            <div style="background: white; border-radius: 10px; padding: 12px; color: #333; box-shadow: 0 2px 6px rgba(0,0,0,0.1);">
-                <h3 style="margin: 0 0 10px 0; color: #667eea; text-align: center; font-size: 14px; font-weight: 600; border-bottom: 2px solid #e8eaf6; padding-bottom: 6px;">Your Order</h3>
-                
-                <!-- Drink Visualization -->
-                <div style="display: flex; justify-content: center; align-items: center; margin: 10px 0; padding: 14px; background: linear-gradient(to bottom, #f8f9fa 0%, #e9ecef 100%); border-radius: 10px;">
-                    <div style="position: relative; display: inline-block;">
-                        <!-- Simple Modern Cup -->
-                        <div style="position: relative; width: {cup_size['width']}; height: {cup_size['height']}; background: linear-gradient(to bottom, {drink_color} 0%, {drink_color} 85%, #3e2723 100%); border-radius: 0 0 15px 15px; box-shadow: 0 6px 12px rgba(0,0,0,0.2), inset -5px 0 10px rgba(0,0,0,0.1), inset 5px 0 10px rgba(255,255,255,0.1); border: 3px solid #3e2723; border-top: none;">
-                            <!-- Cup Top/Rim -->
-                            <div style="position: absolute; top: -8px; left: -3px; right: -3px; height: 12px; background: {drink_color}; border: 3px solid #3e2723; border-radius: 50%; box-shadow: inset 0 -2px 4px rgba(0,0,0,0.3);"></div>
-                            
-                            <!-- Whipped Cream -->
-                            {f'''<div style="position: absolute; top: -25px; left: 50%; transform: translateX(-50%); width: calc(100% - 10px); height: 35px; background: radial-gradient(ellipse at center, #FFFEF7 0%, #FFF8E7 50%, #F5E6D3 100%); border-radius: 50% 50% 40% 40%; box-shadow: 0 2px 6px rgba(0,0,0,0.15); border: 2px solid #F0E5D8;"></div>
-                            <div style="position: absolute; top: -30px; left: 50%; transform: translateX(-50%); width: 60%; height: 20px; background: radial-gradient(circle, #FFFFFF 0%, #FFFEF7 100%); border-radius: 50%; opacity: 0.9;"></div>''' if has_whipped_cream else ''}
-                            
-                            <!-- Cup Handle -->
-                            <div style="position: absolute; right: -22px; top: 25%; width: 28px; height: 40%; border: 4px solid #3e2723; border-left: none; border-radius: 0 50% 50% 0; background: linear-gradient(to right, transparent 0%, {drink_color} 50%); opacity: 0.8;"></div>
-                        </div>
-                        
-                        <!-- Size Badge -->
-                        <div style="text-align: center; margin-top: 12px;">
-                            <span style="display: inline-block; background: linear-gradient(135deg, #667eea 0%, #764ba2 100%); color: white; padding: 5px 14px; border-radius: 14px; font-weight: 700; font-size: 11px; letter-spacing: 1.2px; box-shadow: 0 2px 6px rg
-                                  fill="url(#cupGradient)" 
-                                  opacity="0.3"/>
-                            
-                            <!-- Cup Handle -->
-                            <path d="M 150 80 Q 180 80 180 120 Q 180 160 150 160" 
-                                  fill="none" 
-                                  stroke="#2c1810" 
-                                  stroke-width="8" 
-                                  stroke-linecap="round"/>
-                            <path d="M 150 85 Q 175 85 175 120 Q 175 155 150 155" 
-                                  fill="none" 
-                                  stroke="{drink_color}" 
-                                  stroke-width="5" 
-                                  stroke-linecap="round" 
-                                  opacity="0.6"/>
-                            
-                            <!-- Whipped Cream -->
-                            {f'''
-                            <ellipse cx="90" cy="15" rx="55" ry="25" fill="#FFFAF0" stroke="#F5DEB3" stroke-width="2"/>
-                            <ellipse cx="70" cy="10" rx="20" ry="15" fill="#FFFFFF" opacity="0.8"/>
-                            <ellipse cx="110" cy="10" rx="20" ry="15" fill="#FFFFFF" opacity="0.8"/>
-                            <ellipse cx="90" cy="5" rx="18" ry="12" fill="#FFFFFF" opacity="0.9"/>
-                            ''' if has_whipped_cream else ''}
-                            
-                            <!-- Gradient Definition -->
-                            <defs>
-                                <linearGradient id="cupGradient" x1="0%" y1="0%" x2="100%" y2="0%">
-                                    <stop offset="0%" style="stop-color:black;stop-opacity:0.3" />
-                                    <stop offset="50%" style="stop-color:white;stop-opacity:0.1" />
-                                    <stop offset="100%" style="stop-color:black;stop-opacity:0.2" />
-                                </linearGradient>
-                            </defs>
-                        </svg>
-                        
-                        <!-- Size Label -->
-                        <div style="text-align: center; margin-top: 10px;">
-                            <span style="display: inline-block; background: #667eea; color: white; padding: 4px 12px; border-radius: 12px; font-weight: 700; font-size: 12px; letter-spacing: 1px;">
-                                {self.order_state["size"].upper() if self.order_state["size"] else "SELECT SIZE"}
-                            </span>
-                        </div>
-                    </div>
-                </div>
-                
-                <!-- Order Details -->
-                <div style="margin-top: 10px; background: #f8f9fa; border-radius: 8px; padding: 8px; font-size: 12px;">
-                    <div style="display: grid; grid-template-columns: auto 1fr; gap: 5px 10px; align-items: start;">
-                        <strong style="color: #667eea;">Drink:</strong>
-                        <span>{self.order_state["drinkType"] or "Not selected"}</span>
-                        
-                        <strong style="color: #667eea;">Size:</strong>
-                        <span>{self.order_state["size"] or "Not selected"}</span>
-                        
-                        <strong style="color: #667eea;">Milk:</strong>
-                        <span>{self.order_state["milk"] or "Not selected"}</span>
-                        
-                        <strong style="color: #667eea;">Extras:</strong>
-                        <div>{extras_html if self.order_state["extras"] else '<span style="color: #999; font-size: 11px;">None</span>'}</div>
-                        
-                        <strong style="color: #667eea;">Name:</strong>
-                        <span>{self.order_state["name"] or "Not provided"}</span>
-                    </div>
-                </div>
-            </div>
-        </div>
+        # Tracks what the frontend has seen so updates only carry changed fields
+        self.state_encoder = order_protocol.OrderStateEncoder()
+        
+        # Publishes frontend updates in the background so tools return immediately
+        self.publisher = VisualizationPublisher(self.publish)
+        
+        # Handles plain menu phrases without a round trip to the LLM
+        self.slot_extractor = SlotExtractor() if slot_fast_path_enabled() else None
+        self.fast_path_stats = FastPathStats()
+        
+        # Correlates this session's metrics and tool timings per turn
+        self.turn_tracker = TurnTracker()
+    
+    @property
+    def order_state(self):
+        """The order state as seen by the running tool call: its turn's shadow copy, or the committed state"""
+        turn = current_turn()
+        return self.committed_state if turn is None else turn.state
+    
+    @order_state.setter
+    def order_state(self, state):
+        turn = current_turn()
+        if turn is None:
+            self.committed_state = state
+        else:
+            turn.state = state
+    
+    def commit_turn(self, turn):
+        """Make a confirmed turn's shadow state the order state and run its held-back side effects"""
+        self.committed_state = turn.state
+        for effect in turn.effects.values():
+            effect()
+    
+    async def on_enter(self):
+        self.session.on("function_tools_executed", self.turns.on_tools_executed)
+    
+    def generate_drink_html(self):
+        """Generate HTML visualization of the current drink order"""
+        return drink_renderer.render_drink_html(self.order_state)
+    
+    async def publish(self, payload, topic):
+        """Publish a data message to the frontend"""
+        with span("publish"):
+            await self.room.local_participant.publish_data(payload, topic=topic)
+    
+    def _state_messages(self, payload, state):
+        messages = [] if payload is None else [(payload, order_protocol.STATE_TOPIC)]
+        if order_protocol.html_fallback_enabled():
+            html = drink_renderer.render_drink_html(state)
+            messages.append((html.encode('utf-8'), order_protocol.HTML_TOPIC))
+        return messages
+    
+    def send_drink_visualization(self):
+        """Queue the current order state for the frontend without waiting for the publish
+        
+        Only the newest queued state is sent, as a delta of the fields changed since
+        the last one the frontend received. During a tool call the state is queued
+        once the turn is committed.
         """
+        def queue():
+            if self.room:
+                state = self.order_state.copy()
+                self.publisher.submit(
+                    lambda: self._state_messages(self.state_encoder.delta(state), state),
+                    coalesce_key="order_state",
+                )
         
-        return html
+        run_or_defer("order_state", queue)
     
-    async def send_drink_visualization(self):
-        """Send the drink visualization HTML to the frontend"""
+    def send_state_snapshot(self):
+        """Queue the full order state, e.g. when a frontend connects or asks to resync"""
         if self.room:
-            try:
-                html = self.generate_drink_html()
-                # Send as data message
-                await self.room.local_participant.publish_data(
-                    html.encode('utf-8'),
-                    topic="drink_visualization"
-                )
-                logger.info("Sent drink visualization to frontend")
-            except Exception as e:
-                logger.error(f"Failed to send visualization: {e}")
+            state = self.order_state.copy()
+            self.publisher.submit(
+                lambda: self._state_messages(self.state_encoder.snapshot(state), state),
+                coalesce_key="order_state_snapshot",
+            )
+    
+    def build_receipt(self):
+        """Collect the receipt details for the completed order; the order number is set when it is saved"""
+        now = datetime.now()
+        return {
+            "orderNumber": None,
+            "orderTime": now.isoformat(timespec="seconds"),
+            "order": self.order_state.to_dict(),
+        }
     
-    def generate_receipt_html(self):
+    def generate_receipt_html(self, receipt):
         """Generate HTML receipt for completed order"""
-        extras_list = ", ".join(self.order_state["extras"]) if self.order_state["extras"] else "None"
-        order_time = datetime.now().strftime("%B %d, %Y at %I:%M %p")
+        order = receipt["order"]
+        extras_list = ", ".join(order["extras"]) if order["extras"] else "None"
+        order_time = datetime.fromisoformat(receipt["orderTime"]).strftime("%B %d, %Y at %I:%M %p")
         
         html = f"""
         <div style="font-family: 'Courier New', monospace; padding: 20px; background: white; border-radius: 12px; max-width: 350px; margin: 0 auto; color: #333; box-shadow: 0 10px 40px rgba(0,0,0,0.3); border: 2px dashed #d4a574;">
@@ -219,15 +264,15 @@ class Assistant(Agent):
             </div>
             
             <div style="margin-bottom: 16px;">
-                <p style="margin: 4px 0; font-size: 13px;"><strong>Order #:</strong> {datetime.now().strftime('%Y%m%d%H%M%S')}</p>
+                <p style="margin: 4px 0; font-size: 13px;"><strong>Order #:</strong> {receipt["orderNumber"]}</p>
                 <p style="margin: 4px 0; font-size: 13px;"><strong>Date:</strong> {order_time}</p>
-                <p style="margin: 4px 0; font-size: 13px;"><strong>Customer:</strong> {self.order_state["name"]}</p>
+                <p style="margin: 4px 0; font-size: 13px;"><strong>Customer:</strong> {order["name"]}</p>
             </div>
             
             <div style="border-top: 2px dashed #d4a574; border-bottom: 2px dashed #d4a574; padding: 12px 0; margin: 16px 0;">
-                <p style="margin: 8px 0; font-size: 14px;"><strong>ITEM:</strong> {self.order_state["drinkType"].title()}</p>
-                <p style="margin: 8px 0; font-size: 14px; padding-left: 20px;">Size: {self.order_state["size"].title()}</p>
-                <p style="margin: 8px 0; font-size: 14px; padding-left: 20px;">Milk: {self.order_state["milk"]}</p>
+                <p style="margin: 8px 0; font-size: 14px;"><strong>ITEM:</strong> {order["drinkType"].title()}</p>
+                <p style="margin: 8px 0; font-size: 14px; padding-left: 20px;">Size: {order["size"].title()}</p>
+                <p style="margin: 8px 0; font-size: 14px; padding-left: 20px;">Milk: {order["milk"]}</p>
                 <p style="margin: 8px 0; font-size: 14px; padding-left: 20px;">Extras: {extras_list}</p>
             </div>
             
@@ -244,156 +289,411 @@ class Assistant(Agent):
         """
         return html
     
-    async def send_receipt(self):
-        """Send the receipt HTML to the frontend"""
+    def send_receipt(self, receipt=None):
+        """Queue the receipt for the completed order, after any pending state updates"""
         if self.room:
+            receipt = receipt or self.build_receipt()
+            
+            def build():
+                messages = [(self.state_encoder.receipt(receipt), order_protocol.STATE_TOPIC)]
+                if order_protocol.html_fallback_enabled():
+                    html = self.generate_receipt_html(receipt)
+                    messages.append((html.encode('utf-8'), order_protocol.RECEIPT_HTML_TOPIC))
+                return messages
+            
+            self.publisher.submit(build)
+    
+    def _run_in_background(self, coro):
+        task = asyncio.create_task(coro)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+    
+    def persist_order(self, order, receipt):
+        """Save a completed order in the background, then send its receipt"""
+        self._run_in_background(self._persist_order(order, receipt))
+    
+    async def _persist_order(self, order, receipt):
+        # Number the order and hand it to the store's background writer; awaiting them does not block the event loop
+        try:
+            order_number = await self.dispatcher.allocate()
+            order = await self.order_store.save({**order, "orderNumber": order_number})
+        except Exception as e:
+            logger.error(f"Failed to save order: {e}")
+            # The customer was told the order is placed; reopen it unless a new one was started
+            if self.committed_state.empty:
+                self.order_state = OrderState.from_dict(order)
+                self.send_drink_visualization()
             try:
-                html = self.generate_receipt_html()
-                # Send as data message
-                await self.room.local_participant.publish_data(
-                    html.encode('utf-8'),
-                    topic="order_receipt"
-                )
-                logger.info("Sent order receipt to frontend")
-            except Exception as e:
-                logger.error(f"Failed to send receipt: {e}")
+                self.session.generate_reply(instructions=SAVE_FAILED_INSTRUCTIONS)
+            except RuntimeError as reply_error:
+                logger.warning(f"Could not tell the customer the order was not saved: {reply_error}")
+            return
+        
+        logger.info(f"Order #{order_number} ({order['id']}) saved to {self.order_store!r}: {order['size']} {order['drinkType']} for {order['name']}")
+        self.usual_orders.record(order)
+        self.send_receipt({**receipt, "orderNumber": str(order_number)})
+        
+        try:
+            await self.dispatcher.publish(order)
+        except Exception as e:
+            logger.error(f"Order #{order_number} was saved but not sent to the kitchen displays: {e}")
+    
+    def order_completed(self, order, speech_handle):
+        """Start the next order, compacting the finished one out of the LLM context after its speech"""
+        self.orders_completed += 1
+        if self.compactor is None:
+            return
+        self.compactor.record_order(order)
+        
+        def compact(_=None):
+            self._run_in_background(self.compact_context(keep=1, reason="order saved"))
+        
+        # Wait until the agent has confirmed the order, so the confirmation stays in the context
+        if speech_handle is None:
+            compact()
+        else:
+            speech_handle.add_done_callback(compact)
+    
+    async def compact_context(self, keep, reason):
+        """Replace all but the last keep chat items with the session summary"""
+        chat_ctx, removed = self.compactor.compact(self.chat_ctx, keep)
+        await self.update_chat_ctx(chat_ctx)
+        logger.info(f"Compacted LLM context ({reason}): removed ~{removed} tokens, ~{estimate_tokens(chat_ctx)} left")
 
     @function_tool
+    @timed_tool
+    @speculative
     async def save_order(self, context: RunContext):
         """Use this tool when all order information is collected (drinkType, size, milk, extras, and name).
-        This will save the complete order to a JSON file.
+        This will save the complete order.
         """
         
         # Check if all required fields are filled
-        if not all([
-            self.order_state["drinkType"],
-            self.order_state["size"],
-            self.order_state["milk"] is not None,
-            self.order_state["name"]
-        ]):
+        if not self.order_state.complete:
             return "Order is incomplete. Please collect all required information first."
         
-        # Create orders directory if it doesn't exist
-        orders_dir = Path("orders")
-        orders_dir.mkdir(exist_ok=True)
-        
         # Add timestamp to order
         order_with_timestamp = {
-            **self.order_state,
+            **self.order_state.to_dict(),
             "timestamp": datetime.now().isoformat(),
             "status": "completed"
         }
         
-        # Generate filename with timestamp
-        filename = f"order_{datetime.now().strftime('%Y%m%d_%H%M%S')}_{self.order_state['name'].replace(' ', '_')}.json"
-        filepath = orders_dir / filename
+        # Persist the order and send the receipt once the turn is committed
+        receipt = self.build_receipt()
+        run_or_defer("save_order", lambda: self.persist_order(order_with_timestamp, receipt))
+        speech_handle = getattr(context, "speech_handle", None)
+        run_or_defer("order_completed", lambda: self.order_completed(order_with_timestamp, speech_handle))
         
-        # Save to JSON file
-        with open(filepath, 'w') as f:
-            json.dump(order_with_timestamp, f, indent=2)
+        # Reset order state for next customer
+        self.order_state = OrderState()
         
-        logger.info(f"Order saved to {filepath}")
-        logger.info(f"Order details: {json.dumps(order_with_timestamp, indent=2)}")
+        return f"Order saved successfully! Your order will be ready soon."
+    
+    def apply_order_update(self, updates, extras=()):
+        """Apply validated field updates and new extras, then publish one visualization update"""
+        self.order_state.update(updates)
+        for extra in extras:
+            self.order_state.add_extra(extra)
+        logger.info(f"Updated order: {updates}, extras: {list(extras)}")
+        self.send_drink_visualization()
+    
+    def fast_path_reply(self, slots):
+        """Spoken confirmation for slots filled by the fast path, asking for the next missing detail"""
+        heard = [slots[field] for field in ("size", "drinkType", "milk") if field in slots]
+        heard += slots.get("extras", [])
+        missing = self.order_state.missing_fields()
+        if missing:
+            return f"Got it, {' '.join(heard)}. {NEXT_QUESTIONS[missing[0]]}"
+        return f"Got it, {' '.join(heard)}. {ORDER_COMPLETE_QUESTION}"
+    
+    async def on_user_turn_completed(self, turn_ctx, new_message):
+        """Fill order slots from plain menu phrases without waiting for the LLM"""
+        if self.compactor is not None and self.compactor.over_budget(self.chat_ctx):
+            # Applies from the next LLM request on; this turn keeps its context so a
+            # preemptive reply started on it stays valid
+            await self.compact_context(self.compactor.keep_recent, reason="token budget")
+        if self.slot_extractor is None:
+            return
+        text = new_message.text_content
+        slots, elapsed = timed_extract(self.slot_extractor, text) if text else (None, 0.0)
+        saved = self.fast_path_stats.record_turn(slots is not None, elapsed)
+        LATENCY.record("slot_fast_path", elapsed)
+        if slots is None:
+            return
         
-        # Generate and send receipt
-        await self.send_receipt()
+        extras = slots.pop("extras", [])
+        self.apply_order_update(slots, extras)
+        if extras:
+            slots["extras"] = extras
+        logger.info(
+            f"Fast path filled {slots} in {elapsed * 1e6:.0f}us, saved ~{saved * 1000:.0f}ms "
+            f"(hit rate {self.fast_path_stats.hit_rate:.0%})"
+        )
         
-        # Reset order state for next customer
-        self.order_state = {
-            "drinkType": None,
-            "size": None,
-            "milk": None,
-            "extras": [],
-            "name": None
-        }
+        # The LLM is skipped for this turn, so keep the transcript in its context ourselves
+        chat_ctx = self.chat_ctx.copy()
+        chat_ctx.add_message(role="user", content=text)
+        await self.update_chat_ctx(chat_ctx)
+        self.session.say(self.fast_path_reply(slots))
+        raise StopResponse()
+    
+    def fast_path_answers(self, chat_ctx):
+        """Whether the context ends in a spoken user turn that the slot fast path will answer"""
+        if self.slot_extractor is None or not chat_ctx.items:
+            return False
+        last = chat_ctx.items[-1]
+        if last.type != "message" or last.role != "user" or last.transcript_confidence is None:
+            return False
+        text = last.text_content
+        return bool(text) and self.slot_extractor.extract(text) is not None
+    
+    async def llm_node(self, chat_ctx, tools, model_settings):
+        """Skip the LLM for spoken turns the slot fast path answers, and tell it the current order
         
-        return f"Order saved successfully! Your order will be ready soon."
+        With preemptive generation the LLM is started on the final transcript, before
+        on_user_turn_completed runs, and its reply would be dropped for these turns.
+        Typed input never goes through on_user_turn_completed, so it always reaches the LLM.
+        """
+        if self.fast_path_answers(chat_ctx):
+            return
+        if self.compactor is not None:
+            # The order state comes from here rather than from turns that may have been compacted
+            chat_ctx = chat_ctx.copy()
+            chat_ctx.items.append(order_state_message(self.order_state))
+        async for chunk in Agent.default.llm_node(self, chat_ctx, tools, model_settings):
+            yield chunk
+    
+    @function_tool
+    @timed_tool
+    @speculative
+    async def update_order(
+        self,
+        context: RunContext,
+        drink_type: Optional[str] = None,
+        size: Optional[str] = None,
+        milk_type: Optional[str] = None,
+        extras: Optional[list[str]] = None,
+        customer_name: Optional[str] = None,
+    ):
+        """Update any number of order details at once. Use this whenever the customer gives order details.
+        
+        Only pass the details the customer just gave. All details are checked together,
+        and nothing is changed if any of them is invalid.
+        
+        Args:
+            drink_type: The type of drink (e.g., latte, cappuccino, espresso, americano, mocha, cold brew)
+            size: The size of the drink (small, medium, or large)
+            milk_type: The type of milk (whole milk, skim milk, oat milk, almond milk, soy milk, or no milk)
+            extras: Extra items to add (e.g., extra shot, whipped cream, caramel drizzle, vanilla syrup)
+            customer_name: The customer's name
+        """
+        updates = {}
+        errors = []
+        fields = (
+            ("drinkType", "drink type", drink_type),
+            ("size", "size", size),
+            ("milk", "milk type", milk_type),
+            ("name", "name", customer_name),
+        )
+        for field, label, value in fields:
+            if value is None:
+                continue
+            value = value.strip()
+            if not value:
+                errors.append(f"{label} is empty")
+                continue
+            category = menu.FIELD_CATEGORIES.get(field)
+            if category is not None:
+                canonical = category.lookup(value)
+                if canonical is None:
+                    errors.append(category.unknown(value))
+                    continue
+                value = canonical
+            updates[field] = value
+        new_extras = []
+        for extra in extras or []:
+            if not extra.strip():
+                continue
+            canonical = menu.EXTRAS.lookup(extra)
+            if canonical is None:
+                errors.append(menu.EXTRAS.unknown(extra.strip()))
+            else:
+                new_extras.append(canonical)
+        
+        if errors:
+            return f"Nothing was updated: {'; '.join(errors)}."
+        if not updates and not new_extras:
+            return "No order details were given."
+        
+        self.apply_order_update(updates, new_extras)
+        
+        missing = self.order_state.missing_fields()
+        if missing:
+            return f"Updated. Still need: {', '.join(missing)}."
+        return "Updated. The order is complete and ready to save."
     
     @function_tool
+    @timed_tool
+    @speculative
     async def update_drink_type(self, context: RunContext, drink_type: str):
         """Update the drink type in the order.
         
         Args:
             drink_type: The type of drink (e.g., latte, cappuccino, espresso, americano, mocha, cold brew)
         """
-        self.order_state["drinkType"] = drink_type
-        logger.info(f"Updated drink type: {drink_type}")
-        await self.send_drink_visualization()
-        return f"Got it, {drink_type}."
+        canonical = menu.DRINKS.lookup(drink_type)
+        if canonical is None:
+            return f"{menu.DRINKS.unknown(drink_type)}."
+        self.order_state.drink_type = canonical
+        logger.info(f"Updated drink type: {canonical}")
+        self.send_drink_visualization()
+        return f"Got it, {canonical}."
     
     @function_tool
+    @timed_tool
+    @speculative
     async def update_size(self, context: RunContext, size: str):
         """Update the size in the order.
         
         Args:
             size: The size of the drink (small, medium, or large)
         """
-        self.order_state["size"] = size.lower()
-        logger.info(f"Updated size: {size}")
-        await self.send_drink_visualization()
-        return f"Perfect, {size} size."
+        canonical = menu.SIZES.lookup(size)
+        if canonical is None:
+            return f"{menu.SIZES.unknown(size)}."
+        self.order_state.size = canonical
+        logger.info(f"Updated size: {canonical}")
+        self.send_drink_visualization()
+        return f"Perfect, {canonical} size."
     
     @function_tool
+    @timed_tool
+    @speculative
     async def update_milk(self, context: RunContext, milk_type: str):
         """Update the milk type in the order.
         
         Args:
             milk_type: The type of milk (whole milk, skim milk, oat milk, almond milk, soy milk, or no milk)
         """
-        self.order_state["milk"] = milk_type
-        logger.info(f"Updated milk: {milk_type}")
-        await self.send_drink_visualization()
-        return f"Noted, {milk_type}."
+        canonical = menu.MILKS.lookup(milk_type)
+        if canonical is None:
+            return f"{menu.MILKS.unknown(milk_type)}."
+        self.order_state.milk = canonical
+        logger.info(f"Updated milk: {canonical}")
+        self.send_drink_visualization()
+        return f"Noted, {canonical}."
     
     @function_tool
+    @timed_tool
+    @speculative
     async def add_extra(self, context: RunContext, extra: str):
         """Add an extra item to the order.
         
         Args:
             extra: An extra item (e.g., extra shot, whipped cream, caramel drizzle, vanilla syrup)
         """
-        if extra not in self.order_state["extras"]:
-            self.order_state["extras"].append(extra)
-        logger.info(f"Added extra: {extra}")
-        await self.send_drink_visualization()
-        return f"Added {extra}."
+        canonical = menu.EXTRAS.lookup(extra)
+        if canonical is None:
+            return f"{menu.EXTRAS.unknown(extra)}."
+        self.order_state.add_extra(canonical)
+        logger.info(f"Added extra: {canonical}")
+        self.send_drink_visualization()
+        return f"Added {canonical}."
     
     @function_tool
+    @timed_tool
+    @speculative
     async def update_name(self, context: RunContext, customer_name: str):
         """Update the customer name for the order.
         
         Args:
             customer_name: The customer's name
         """
-        self.order_state["name"] = customer_name
+        customer_name = customer_name.strip()
+        if not customer_name:
+            return "Nothing was updated: name is empty."
+        self.order_state.name = customer_name
         logger.info(f"Updated name: {customer_name}")
-        await self.send_drink_visualization()
+        self.send_drink_visualization()
         return f"Great, {customer_name}."
     
     @function_tool
+    @timed_tool
+    @speculative
+    async def get_usual_order(self, context: RunContext, customer_name: str):
+        """Look up a returning customer's usual order by name and fill it into the details not given yet.
+        
+        Args:
+            customer_name: The customer's name
+        """
+        usual, times, recent = self.usual_orders.lookup(customer_name)
+        if usual is None:
+            return f"No previous orders found for {customer_name}. Take their order as usual."
+        
+        # Details already given in this session win over the usual
+        state = self.order_state.copy()
+        current = state.to_dict()
+        usual = OrderState.from_dict(usual).to_dict()
+        kept = [
+            f"{USUAL_FIELD_LABELS[field]} {', '.join(value) if field == 'extras' else value}"
+            for field, value in current.items()
+            if field in USUAL_FIELD_LABELS and value and usual[field] and value != usual[field]
+        ]
+        state.update({field: value for field, value in usual.items() if field != "extras" and current[field] is None})
+        if not current["extras"]:
+            for extra in usual["extras"]:
+                state.add_extra(extra)
+        self.order_state = state
+        logger.info(f"Filled in the usual order of {state.name}: {state!r}, kept {kept}")
+        self.send_drink_visualization()
+        extras = f" and {', '.join(state.extras)}" if state.extras else ""
+        kept = f" Kept what they already asked for: {'; '.join(kept)}." if kept else ""
+        return (
+            f"Filled in {state.name}'s usual ({times} of their last {recent} orders): "
+            f"{state.size} {state.drink_type} with {state.milk}{extras}.{kept} "
+            "Read it back and ask if they want it again today; change any detail they ask for."
+        )
+    
+    @function_tool
+    @timed_tool
+    @speculative
     async def check_order_status(self, context: RunContext):
         """Check what information is still needed for the order.
         
         This function takes no parameters and returns the current order status.
         """
-        missing = []
-        if not self.order_state["drinkType"]:
-            missing.append("drink type")
-        if not self.order_state["size"]:
-            missing.append("size")
-        if self.order_state["milk"] is None:
-            missing.append("milk preference")
-        if not self.order_state["name"]:
-            missing.append("name")
-        
+        missing = self.order_state.missing_fields()
         if missing:
             return f"Still need: {', '.join(missing)}"
         else:
-            return f"Order complete: {json.dumps(self.order_state, indent=2)}"
+            return f"Order complete: {self.order_state.describe()}"
+
+
+def create_stt():
+    return assemblyai.STT()
+
+
+def create_llm():
+    return google.LLM(model="gemini-flash-latest")
 
 
 def prewarm(proc: JobProcess):
-    proc.userdata["vad"] = silero.VAD.load()
+    """Load models and create provider clients before the process gets its first job"""
+    timings = StartupTimings()
+    proc.userdata["vad"] = timings.run("vad", load_vad)
+    timings.run("turn_detector", load_turn_detector_model)
+    proc.userdata["noise_cancellation"] = timings.run("noise_cancellation", noise_cancellation.BVC)
+    proc.userdata["order_store"] = timings.run("order_store", open_order_store)
+    proc.userdata["order_dispatcher"] = timings.run("order_dispatcher", open_order_dispatcher)
+    proc.userdata["usual_orders"] = timings.run("usual_orders", load_usual_orders, proc.userdata["order_store"])
+    proc.userdata["tts_cache"] = timings.run("tts_cache", open_phrase_cache)
+    proc.userdata["stt"] = timings.run("stt", create_stt)
+    proc.userdata["llm"] = timings.run("llm", create_llm)
+    proc.userdata["tts"] = timings.run("tts", create_tts, proc.userdata["tts_cache"])
+    timings.run("drink_renderer", drink_renderer.prewarm)
+    timings.run("slot_extractor", SlotExtractor)
+    logger.info(f"Job process prewarmed: {timings.summary()}")
 
 
 async def entrypoint(ctx: JobContext):
@@ -403,29 +703,35 @@ async def entrypoint(ctx: JobContext):
         "room": ctx.room.name,
     }
 
+    # Models and provider clients were created in prewarm; start connecting to
+    # the providers now, while the agent is still joining the room
+    first_response = FirstResponseTimer()
+    stt, llm, tts = ctx.proc.userdata["stt"], ctx.proc.userdata["llm"], ctx.proc.userdata["tts"]
+    warm_connections(stt, llm, tts)
+
     # Set up a voice AI pipeline using OpenAI, Cartesia, AssemblyAI, and the LiveKit turn detector
     session = AgentSession(
         # Speech-to-text (STT) is your agent's ears, turning the user's speech into text that the LLM can understand
         # See all available models at https://docs.livekit.io/agents/models/stt/
-        stt=assemblyai.STT(),
+        stt=stt,
         # A Large Language Model (LLM) is your agent's brain, processing user input and generating a response
         # See all available models at https://docs.livekit.io/agents/models/llm/
-        llm=google.LLM(
-            model="gemini-flash-latest",
-        ),
+        llm=llm,
         # Text-to-speech (TTS) is your agent's voice, turning the LLM's text into speech that the user can hear
         # See all available models as well as voice selections at https://docs.livekit.io/agents/models/tts/
-        tts=murf.TTS(
-            voice="en-US-matthew",
-            style="Conversation",
-        ),
+        # Recurring sentences are served from the phrase cache, see tts_cache.py
+        tts=tts,
         # VAD and turn detection are used to determine when the user is speaking and when the agent should respond
         # See more at https://docs.livekit.io/agents/build/turns
-        turn_detection=MultilingualModel(),
+        # The turn detector model runs in the worker's shared inference process, or batched
+        # in this one with JOB_EXECUTOR=thread (see batched_inference.py); the handle needs
+        # the job context, so it is created here rather than in prewarm
+        turn_detection=create_turn_detector(),
         vad=ctx.proc.userdata["vad"],
-        # allow the LLM to generate a response while waiting for the end of turn
+        # allow the LLM to generate a response while waiting for the end of turn; tool calls
+        # only change the order once their turn is confirmed, see speculation.py
         # See more at https://docs.livekit.io/agents/build/audio/#preemptive-generation
-        preemptive_generation=False,
+        preemptive_generation=preemptive_generation_enabled(),
     )
 
     # To use a realtime model instead of a voice pipeline, use the following session setup instead.
@@ -442,14 +748,37 @@ async def entrypoint(ctx: JobContext):
     # For more information, see https://docs.livekit.io/agents/build/metrics/
     usage_collector = metrics.UsageCollector()
 
+    @session.on("speech_created")
+    def _on_speech_created(ev):
+        # Logs each reply's latency breakdown once all of its speech and tool steps are done
+        assistant.turn_tracker.on_speech_created(ev)
+
     @session.on("metrics_collected")
     def _on_metrics_collected(ev: MetricsCollectedEvent):
         metrics.log_metrics(ev.metrics)
         usage_collector.collect(ev.metrics)
+        first_response.record(ev.metrics)
+        assistant.turn_tracker.on_metrics(ev.metrics)
+        if isinstance(ev.metrics, metrics.LLMMetrics):
+            assistant.fast_path_stats.record_llm_latency(ev.metrics.duration)
+            assistant.prompt_tokens.record(ev.metrics, assistant.orders_completed)
+        elif isinstance(ev.metrics, metrics.TTSMetrics):
+            session.tts.stats.record(ev.metrics)
 
     async def log_usage():
         summary = usage_collector.get_summary()
         logger.info(f"Usage: {summary}")
+        logger.info(f"Visualization publisher: {assistant.publisher.stats.summary()}")
+        logger.info(f"Slot fast path: {assistant.fast_path_stats.summary()}")
+        logger.info(f"TTS phrase cache: {session.tts.stats.summary()}")
+        logger.info(f"Speculative turns: {assistant.turns.stats.summary()}")
+        logger.info(f"Prompt tokens: {assistant.prompt_tokens.summary()}")
+        logger.info(f"Order dispatch: {assistant.dispatcher.summary()}")
+        logger.info(f"Usual orders: {assistant.usual_orders.summary()}")
+        logger.info(f"Inference batching: {batching_summary()}")
+        if assistant.compactor is not None:
+            logger.info(f"Context compaction: {assistant.compactor.summary()}")
+        logger.info(f"Latency: {LATENCY.summary()}")
 
     ctx.add_shutdown_callback(log_usage)
 
@@ -462,8 +791,13 @@ async def entrypoint(ctx: JobContext):
     # await avatar.start(session, room=ctx.room)
 
     # Create assistant and set room reference
-    assistant = Assistant()
+    assistant = Assistant(
+        order_store=ctx.proc.userdata["order_store"],
+        dispatcher=ctx.proc.userdata["order_dispatcher"],
+        usual_orders=ctx.proc.userdata["usual_orders"],
+    )
     assistant.room = ctx.room
+    ctx.add_shutdown_callback(assistant.publisher.aclose)
     
     # Start the session, which initializes the voice pipeline and warms up the models
     await session.start(
@@ -471,16 +805,47 @@ async def entrypoint(ctx: JobContext):
         room=ctx.room,
         room_input_options=RoomInputOptions(
             # For telephony applications, use `BVCTelephony` for best results
-            noise_cancellation=noise_cancellation.BVC(),
+            noise_cancellation=ctx.proc.userdata["noise_cancellation"],
         ),
     )
 
     # Join the room and connect to the user
     await ctx.connect()
+    first_response.setup_done()
+
+    # Keep this process's latency histograms on disk for the exporter
+    LATENCY.start_flushing()
+    ctx.add_shutdown_callback(LATENCY.stop_flushing)
+    # Report this session's loop lag and CPU to the worker's admission control
+    ctx.add_shutdown_callback(JOB_LOAD.track_session())
+
+    # Resend the full order state whenever a frontend joins or reports a missed update
+    @ctx.room.on("data_received")
+    def _on_data_received(packet: rtc.DataPacket):
+        if packet.topic != order_protocol.SYNC_TOPIC:
+            return
+        message = order_protocol.decode_message(packet.data)
+        if message and message.get("type") == "sync":
+            assistant.send_state_snapshot()
+
+    @ctx.room.on("participant_connected")
+    def _on_participant_connected(participant: rtc.RemoteParticipant):
+        assistant.send_state_snapshot()
+
+    # Send initial snapshot to ensure UI is ready
+    assistant.send_state_snapshot()
 
-    # Send initial visualization to ensure UI is ready
-    await assistant.send_drink_visualization()
+    # Render recurring phrases missing from the phrase cache while the session is quiet
+    if tts_cache_fill_enabled():
+        fill_task = asyncio.create_task(session.tts.fill(spoken_phrases()))
+        ctx.add_shutdown_callback(lambda: utils.aio.cancel_and_wait(fill_task))
 
 
 if __name__ == "__main__":
-    cli.run_app(WorkerOptions(entrypoint_fnc=entrypoint, prewarm_fnc=prewarm))
+    cli.run_app(WorkerOptions(
+        entrypoint_fnc=entrypoint,
+        prewarm_fnc=prewarm,
+        job_executor_type=job_executor_type(),
+        # Report load from the job processes' loop lag and CPU, and turn jobs away before saturation
+        **admission_options(),
+    ))
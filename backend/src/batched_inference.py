@@ -0,0 +1,403 @@
+"""Batched VAD and end-of-utterance inference for the sessions of one process.
+
+Every session runs Silero VAD on each 32ms window of the customer's audio,
+and the turn detector whenever a turn may have ended. Called one session at a
+time these are tiny ONNX calls whose fixed per-call cost is most of the
+agent's CPU on CPU-only hosts. When several sessions share a process
+(JOB_EXECUTOR=thread runs every job of the worker as a thread of one
+process), an InferenceBatcher per model gathers the requests of all sessions
+for up to INFERENCE_BATCH_DELAY_MS and runs them as one batched call on its
+own thread:
+
+- BatchedVAD streams hand each window to the process's VAD batcher, which
+  runs the windows of every stream through one Silero session at once.
+- BatchedTurnDetector runs the multilingual end-of-utterance model in the
+  process, on the chat contexts of every session waiting for a prediction.
+  In the default process-per-job mode the plugin's model already runs in the
+  worker's shared inference process, one request at a time, and a job
+  process has a single session, so the plugin's model is used as is.
+
+A batch runs as soon as every open VAD stream has a window waiting, so a lone
+session never waits for the delay. The probabilities are the ones the
+per-stream calls return. Batch sizes and times are recorded in the latency
+histograms (vad_batch, eou_batch). Batching is on by default with
+JOB_EXECUTOR=thread only; INFERENCE_BATCHING=1 or 0 forces it on or off.
+"""
+
+import asyncio
+import concurrent.futures
+import logging
+import os
+import threading
+import time
+from dataclasses import dataclass
+
+import numpy as np
+from livekit.agents import JobExecutorType
+from livekit.plugins import silero
+from livekit.plugins.silero import onnx_model
+from livekit.plugins.turn_detector.base import MAX_HISTORY_TOKENS, MAX_HISTORY_TURNS
+from livekit.plugins.turn_detector.multilingual import (
+    MultilingualModel,
+    _EUORunnerMultilingual,
+)
+
+from instrumentation import LATENCY
+
+logger = logging.getLogger("agent")
+
+DEFAULT_BATCH_DELAY_MS = 8
+DEFAULT_MAX_BATCH = 64
+
+# Silero's RNN state size
+VAD_STATE_SIZE = 128
+
+
+def inference_batching_enabled():
+    """Whether VAD and turn detection calls are batched across sessions (INFERENCE_BATCHING)
+
+    On by default only with JOB_EXECUTOR=thread: a job process has a single
+    session, so batching would only add a thread hop and the batch delay.
+    """
+    default = "1" if job_executor_type() == JobExecutorType.THREAD else "0"
+    return os.getenv("INFERENCE_BATCHING", default).lower() not in ("0", "false", "no")
+
+
+def inference_batch_delay():
+    """Longest a request waits for others to join its batch, in seconds (INFERENCE_BATCH_DELAY_MS)"""
+    return float(os.getenv("INFERENCE_BATCH_DELAY_MS") or DEFAULT_BATCH_DELAY_MS) / 1000
+
+
+def job_executor_type():
+    """Run jobs as processes (default) or as threads of one process (JOB_EXECUTOR=thread)"""
+    if os.getenv("JOB_EXECUTOR", "process").lower() == "thread":
+        return JobExecutorType.THREAD
+    return JobExecutorType.PROCESS
+
+
+def eou_batching_enabled():
+    """Whether turn detection runs batched in this process, see the module docstring"""
+    return (
+        inference_batching_enabled()
+        and job_executor_type() == JobExecutorType.THREAD
+        and not os.getenv("LIVEKIT_REMOTE_EOT_URL")
+    )
+
+
+@dataclass
+class BatchStats:
+    """Requests and batches run by one batcher"""
+
+    batches: int = 0
+    requests: int = 0
+    largest: int = 0
+
+    def record(self, size):
+        self.batches += 1
+        self.requests += size
+        self.largest = max(self.largest, size)
+
+    def summary(self):
+        return {
+            "batches": self.batches,
+            "requests": self.requests,
+            "mean_batch": round(self.requests / self.batches, 1) if self.batches else 0.0,
+            "largest_batch": self.largest,
+        }
+
+
+class InferenceBatcher:
+    """Runs requests from any thread or event loop in batches, on one inference thread
+
+    run_batch(requests) returns one result per request. A batch is run once
+    max_batch requests are waiting, once every client registered with
+    add_client() has a request waiting, or max_delay after its first request
+    arrived, whichever comes first.
+    """
+
+    def __init__(self, name, run_batch, *, max_delay=None, max_batch=DEFAULT_MAX_BATCH, load=None):
+        self.name = name
+        self.run_batch = run_batch
+        self.max_delay = inference_batch_delay() if max_delay is None else max_delay
+        self.max_batch = max_batch
+        self.stats = BatchStats()
+        self.clients = 0
+        self._load = load
+        self._pending = []
+        self._cond = threading.Condition()
+        self._thread = None
+        self._loaded = threading.Event()
+        self._load_error = None
+
+    def __repr__(self):
+        return f"InferenceBatcher({self.name!r})"
+
+    def start(self, wait=True):
+        """Start the inference thread, loading the model first; waits for the model by default"""
+        with self._cond:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name=f"{self.name}-batcher", daemon=True)
+                self._thread.start()
+        if wait:
+            self._loaded.wait()
+            if self._load_error is not None:
+                raise self._load_error
+
+    def add_client(self):
+        with self._cond:
+            self.clients += 1
+
+    def remove_client(self):
+        with self._cond:
+            self.clients -= 1
+            self._cond.notify()
+
+    def submit(self, request):
+        """Queue a request; returns a concurrent.futures.Future for its result"""
+        self.start(wait=False)
+        future = concurrent.futures.Future()
+        with self._cond:
+            self._pending.append((request, future, time.monotonic()))
+            self._cond.notify()
+        return future
+
+    def __call__(self, request):
+        """Run a request and block until its batch is done, for callers on a worker thread"""
+        return self.submit(request).result()
+
+    async def run(self, request):
+        """Run a request without blocking the calling event loop"""
+        return await asyncio.wrap_future(self.submit(request))
+
+    def _ready(self):
+        return len(self._pending) >= min(self.max_batch, max(self.clients, 1))
+
+    def _next_batch(self):
+        with self._cond:
+            while not self._pending:
+                self._cond.wait()
+            deadline = self._pending[0][2] + self.max_delay
+            while not self._ready():
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+            batch, self._pending = self._pending[:self.max_batch], self._pending[self.max_batch:]
+        return batch
+
+    def _run(self):
+        try:
+            if self._load is not None:
+                self._load()
+        except Exception as e:
+            logger.exception(f"Failed to load the model of {self!r}")
+            self._load_error = e
+        self._loaded.set()
+        if self._load_error is not None:
+            self._fail_forever(self._load_error)
+            return
+        while True:
+            batch = self._next_batch()
+            start = time.perf_counter()
+            try:
+                results = self.run_batch([request for request, _, _ in batch])
+            except Exception as e:
+                logger.exception(f"Batched inference of {self!r} failed for {len(batch)} requests")
+                for _, future, _ in batch:
+                    future.set_exception(e)
+                continue
+            LATENCY.record(f"{self.name}_batch", time.perf_counter() - start)
+            self.stats.record(len(batch))
+            for (_, future, _), result in zip(batch, results):
+                future.set_result(result)
+
+    def _fail_forever(self, error):
+        while True:
+            for _, future, _ in self._next_batch():
+                future.set_exception(error)
+
+
+class _VADBatch:
+    """Process-wide Silero session running the windows of every BatchedVAD stream"""
+
+    def __init__(self):
+        self.session = None
+
+    def load(self):
+        self.session = onnx_model.new_inference_session(force_cpu=True)
+
+    def __call__(self, requests):
+        results = [0.0] * len(requests)
+        by_rate = {}
+        for index, (sample_rate, _) in enumerate(requests):
+            by_rate.setdefault(sample_rate, []).append(index)
+        for sample_rate, indexes in by_rate.items():
+            inputs = np.concatenate([requests[index][1] for index in indexes])
+            # Like OnnxModel, every window starts from the initial RNN state
+            state = np.zeros((2, len(indexes), VAD_STATE_SIZE), dtype=np.float32)
+            out, _ = self.session.run(
+                None, {"input": inputs, "state": state, "sr": np.array(sample_rate, dtype=np.int64)}
+            )
+            for row, index in enumerate(indexes):
+                results[index] = float(out[row, 0])
+        return results
+
+
+_vad_batch = _VADBatch()
+VAD_BATCHER = InferenceBatcher("vad", _vad_batch, load=_vad_batch.load)
+
+
+class _BatchedOnnxModel(onnx_model.OnnxModel):
+    """OnnxModel whose windows are run by the VAD batcher"""
+
+    def __init__(self, batcher, sample_rate):
+        super().__init__(onnx_session=None, sample_rate=sample_rate)
+        self._batcher = batcher
+
+    def submit(self, x):
+        """Queue a window; returns a concurrent.futures.Future for its speech probability"""
+        self._input_buffer[:, :self._context_size] = self._context
+        self._input_buffer[:, self._context_size:] = x
+        window = self._input_buffer.copy()
+        self._context = window[:, -self._context_size:]
+        return self._batcher.submit((self._sample_rate, window))
+
+    def __call__(self, x):
+        return self.submit(x).result()
+
+
+class _BatcherLoop:
+    """Stands in for the VAD stream's event loop, which it only uses to run the model in an executor
+
+    Waiting on the batcher in an executor thread would take one thread per
+    stream and cap the batch size at the executor's size, so the window is
+    handed to the batcher directly and awaited on the stream's loop.
+    """
+
+    def run_in_executor(self, executor, model, x):
+        return asyncio.wrap_future(model.submit(x))
+
+
+class _BatchedVADStream(silero.VADStream):
+    def __init__(self, vad, opts, model, batcher):
+        super().__init__(vad, opts, model)
+        self._loop = _BatcherLoop()
+        self._batcher = batcher
+        batcher.add_client()
+        self._client_open = True
+
+    async def aclose(self):
+        if self._client_open:
+            self._client_open = False
+            self._batcher.remove_client()
+        await super().aclose()
+
+
+class BatchedVAD(silero.VAD):
+    """Silero VAD whose streams share the process's VAD batcher
+
+    Create it with BatchedVAD.load(), like silero.VAD.
+    """
+
+    batcher = VAD_BATCHER
+
+    def stream(self):
+        stream = _BatchedVADStream(
+            self, self._opts, _BatchedOnnxModel(self.batcher, self._opts.sample_rate), self.batcher
+        )
+        self._streams.add(stream)
+        return stream
+
+
+class _EOUBatch(_EUORunnerMultilingual):
+    """The multilingual turn detector runner, predicting for several chat contexts per call"""
+
+    def load(self):
+        self.initialize()
+        self._pad_id = self._tokenizer.pad_token_id or self._tokenizer.eos_token_id or 0
+        # Whether the model scores every position; a causal model's scores at a
+        # position do not depend on the tokens after it, so contexts of
+        # different lengths can share a right-padded batch
+        probe = self._session.run(None, {"input_ids": np.full((1, 2), self._pad_id, dtype=np.int64)})[0]
+        self._per_position = probe.size == 2
+
+    def _encode(self, messages):
+        text = self._format_chat_ctx(messages)
+        inputs = self._tokenizer(
+            text,
+            add_special_tokens=False,
+            return_tensors="np",
+            max_length=MAX_HISTORY_TOKENS,
+            truncation=True,
+        )
+        return inputs["input_ids"][0].astype(np.int64)
+
+    def __call__(self, requests):
+        encoded = [self._encode(messages) for messages in requests]
+        if self._per_position:
+            groups = [list(range(len(encoded)))]
+        else:
+            # Only contexts of the same length can be batched
+            by_length = {}
+            for index, ids in enumerate(encoded):
+                by_length.setdefault(len(ids), []).append(index)
+            groups = list(by_length.values())
+
+        results = [0.0] * len(requests)
+        for indexes in groups:
+            width = max(len(encoded[index]) for index in indexes)
+            input_ids = np.full((len(indexes), width), self._pad_id, dtype=np.int64)
+            for row, index in enumerate(indexes):
+                input_ids[row, :len(encoded[index])] = encoded[index]
+            scores = self._session.run(None, {"input_ids": input_ids})[0].reshape(len(indexes), -1)
+            for row, index in enumerate(indexes):
+                column = len(encoded[index]) - 1 if self._per_position else -1
+                results[index] = float(scores[row, column])
+        return results
+
+
+_eou_batch = _EOUBatch()
+EOU_BATCHER = InferenceBatcher("eou", _eou_batch, load=_eou_batch.load)
+
+
+class BatchedTurnDetector(MultilingualModel):
+    """Multilingual turn detector predicting in this process, batched across its sessions"""
+
+    batcher = EOU_BATCHER
+
+    async def predict_end_of_turn(self, chat_ctx, *, timeout=3):
+        messages = [
+            {"role": item.role, "content": item.text_content}
+            for item in chat_ctx.items
+            if item.type == "message" and item.role in ("user", "assistant") and item.text_content
+        ][-MAX_HISTORY_TURNS:]
+        if not messages:
+            raise ValueError("chat_ctx is required for an end of utterance prediction")
+        probability = await asyncio.wait_for(self.batcher.run(messages), timeout=timeout)
+        logger.debug(f"EOU prediction {probability:.3f} (batched)")
+        return probability
+
+
+def load_vad():
+    """The VAD for a job: batched across the sessions of the process unless disabled"""
+    if not inference_batching_enabled():
+        return silero.VAD.load()
+    VAD_BATCHER.start()
+    return BatchedVAD.load()
+
+
+def load_turn_detector_model():
+    """Load the in-process turn detector model when turn detection is batched (from prewarm)"""
+    if eou_batching_enabled():
+        EOU_BATCHER.start()
+
+
+def create_turn_detector():
+    """The turn detector for a job, created in the job since the plugin's needs the job context"""
+    if eou_batching_enabled():
+        return BatchedTurnDetector()
+    return MultilingualModel()
+
+
+def batching_summary():
+    return {batcher.name: batcher.stats.summary() for batcher in (VAD_BATCHER, EOU_BATCHER) if batcher.stats.batches}
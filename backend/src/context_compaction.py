@@ -0,0 +1,180 @@
+"""Keeps the LLM context of a long kiosk session bounded.
+
+A session can take many orders in a row, and without intervention every
+turn of every earlier order stays in the chat context sent to the LLM, so
+prompt tokens (and with them latency and cost) grow with the queue. Instead:
+
+- When an order is saved, the turns that produced it are replaced by a short
+  summary of the orders placed so far in the session, once the agent has
+  finished confirming it.
+- When the context of a single order grows past CONTEXT_TOKEN_BUDGET
+  (estimated tokens), everything but the most recent turns is dropped.
+- The current order state is given to the LLM as a small system message on
+  every request, so it never has to be rebuilt from the turns that were
+  dropped.
+
+Prompt tokens are reported per LLM request from the session's metrics,
+grouped by order, so the curve can be checked to stay flat.
+"""
+
+import logging
+import os
+import time
+from collections import deque
+
+from livekit.agents import llm
+
+logger = logging.getLogger("agent")
+
+DEFAULT_TOKEN_BUDGET = 3000
+# Items kept when a single order runs over the budget
+KEEP_RECENT_ITEMS = 8
+# Orders listed by name in the session summary; older ones are only counted
+SUMMARY_ORDERS = 5
+
+SUMMARY_MESSAGE_ID = "order_history"
+ORDER_STATE_MESSAGE_ID = "order_state"
+INSTRUCTIONS_MESSAGE_ID = "lk.agent_task.instructions"
+
+# Rough size of one token in characters, and the per-item overhead of the chat format
+CHARS_PER_TOKEN = 4
+TOKENS_PER_ITEM = 4
+
+
+def context_compaction_enabled():
+    """Whether finished orders are compacted out of the LLM context (CONTEXT_COMPACTION)"""
+    return os.getenv("CONTEXT_COMPACTION", "1").lower() not in ("0", "false", "no")
+
+
+def context_token_budget():
+    """Estimated tokens of chat history allowed before older turns are dropped (CONTEXT_TOKEN_BUDGET)"""
+    return int(os.getenv("CONTEXT_TOKEN_BUDGET") or DEFAULT_TOKEN_BUDGET)
+
+
+def item_text(item):
+    if item.type == "message":
+        return item.text_content or ""
+    if item.type == "function_call":
+        return f"{item.name}{item.arguments}"
+    if item.type == "function_call_output":
+        return item.output
+    return ""
+
+
+def estimate_tokens(chat_ctx):
+    """Approximate prompt tokens of a chat context, without a tokenizer"""
+    return sum(len(item_text(item)) // CHARS_PER_TOKEN + TOKENS_PER_ITEM for item in chat_ctx.items)
+
+
+def describe_order(order):
+    """One line for an order, e.g. "large oat milk latte with extra shot for Sam\""""
+    words = [order.get("size"), order.get("milk") if order.get("milk") != "no milk" else None, order.get("drinkType")]
+    description = " ".join(word for word in words if word)
+    if order.get("milk") == "no milk":
+        description += " with no milk"
+    if order.get("extras"):
+        description += f" with {', '.join(order['extras'])}"
+    if order.get("name"):
+        description += f" for {order['name']}"
+    return description
+
+
+def order_state_message(order_state):
+    """System message with the order being taken, given to the LLM on every request"""
+    return llm.ChatMessage(
+        id=ORDER_STATE_MESSAGE_ID, role="system", content=[f"Current order: {order_state.describe()}."]
+    )
+
+
+def _recent_items(items, keep):
+    """The last keep items, starting at a message so no tool call is cut from its output"""
+    tail = items[-keep:] if keep else []
+    while tail and tail[0].type != "message":
+        tail = tail[1:]
+    return tail
+
+
+class ContextCompactor:
+    """Replaces finished orders in the chat context with a running summary"""
+
+    def __init__(self, token_budget=None, keep_recent=KEEP_RECENT_ITEMS):
+        self.token_budget = context_token_budget() if token_budget is None else token_budget
+        self.keep_recent = keep_recent
+        self.orders_placed = 0
+        self.recent_orders = deque(maxlen=SUMMARY_ORDERS)
+        self.compactions = 0
+        self.tokens_removed = 0
+
+    def record_order(self, order):
+        """Note a saved order for the session summary"""
+        self.orders_placed += 1
+        self.recent_orders.append(describe_order(order))
+
+    def over_budget(self, chat_ctx):
+        return bool(self.token_budget) and estimate_tokens(chat_ctx) > self.token_budget
+
+    def summary_message(self, created_at):
+        earlier = self.orders_placed - len(self.recent_orders)
+        lines = [f"Orders already placed in this session: {self.orders_placed}."]
+        if earlier:
+            lines.append(f"The {len(self.recent_orders)} most recent:")
+        lines += [f"- {order}" for order in self.recent_orders]
+        return llm.ChatMessage(id=SUMMARY_MESSAGE_ID, role="system", content=["\n".join(lines)], created_at=created_at)
+
+    def compact(self, chat_ctx, keep):
+        """A copy of chat_ctx with the instructions, the session summary and the last keep items"""
+        items = [item for item in chat_ctx.items if item.id not in (SUMMARY_MESSAGE_ID, ORDER_STATE_MESSAGE_ID)]
+        instructions = [item for item in items if item.id == INSTRUCTIONS_MESSAGE_ID]
+        history = [item for item in items if item.id != INSTRUCTIONS_MESSAGE_ID]
+        tail = _recent_items(history, keep)
+        compacted = list(instructions)
+        if self.orders_placed:
+            created_at = tail[0].created_at - 0.001 if tail else time.time()
+            compacted.append(self.summary_message(created_at))
+        compacted += tail
+
+        new_ctx = llm.ChatContext(compacted)
+        removed = estimate_tokens(chat_ctx) - estimate_tokens(new_ctx)
+        self.compactions += 1
+        self.tokens_removed += max(removed, 0)
+        return new_ctx, removed
+
+    def summary(self):
+        return {
+            "orders_placed": self.orders_placed,
+            "compactions": self.compactions,
+            "tokens_removed": self.tokens_removed,
+        }
+
+
+class PromptTokenStats:
+    """Prompt tokens of each LLM request, grouped by the order being taken"""
+
+    def __init__(self, max_orders=50):
+        # (order index, requests, total prompt tokens, max prompt tokens) of the latest orders
+        self.orders = deque(maxlen=max_orders)
+        self.requests = 0
+        self.total = 0
+        self.max = 0
+
+    def record(self, llm_metrics, order_index):
+        """Count one LLMMetrics event taken while order number order_index was open"""
+        tokens = llm_metrics.prompt_tokens
+        self.requests += 1
+        self.total += tokens
+        self.max = max(self.max, tokens)
+        if not self.orders or self.orders[-1][0] != order_index:
+            self.orders.append([order_index, 0, 0, 0])
+        entry = self.orders[-1]
+        entry[1] += 1
+        entry[2] += tokens
+        entry[3] = max(entry[3], tokens)
+        logger.info(f"LLM request {llm_metrics.speech_id}: {tokens} prompt tokens (order {order_index + 1})")
+
+    def summary(self):
+        return {
+            "requests": self.requests,
+            "mean": round(self.total / self.requests) if self.requests else 0,
+            "max": self.max,
+            "mean_per_order": {index + 1: round(total / requests) for index, requests, total, _ in self.orders},
+        }
@@ -0,0 +1,212 @@
+"""Precompiled renderer for the drink visualization panel.
+
+The panel markup is compiled once at import time into fixed segments and named
+slots. The cup half of the panel only depends on the size, the drink type and
+whether whipped cream was added, so it is memoized in a bounded LRU keyed on
+those three values; the order details are spliced in on every render.
+"""
+
+import string
+from functools import lru_cache
+
+import menu
+
+# Number of (size, drinkType, whipped cream) cup fragments kept in memory
+FRAGMENT_CACHE_SIZE = 256
+
+SIZE_CONFIG = {
+    name: {"height": item["height"], "width": item["width"]}
+    for name, item in menu.SIZES.items.items()
+}
+DEFAULT_SIZE = menu.DEFAULT_SIZE
+
+DRINK_COLORS = {name: item["color"] for name, item in menu.DRINKS.items.items()}
+DEFAULT_DRINK_COLOR = menu.DEFAULT_DRINK_COLOR
+
+WHIPPED_CREAM_HTML = """<div style="position: absolute; top: -25px; left: 50%; transform: translateX(-50%); width: calc(100% - 10px); height: 35px; background: radial-gradient(ellipse at center, #FFFEF7 0%, #FFF8E7 50%, #F5E6D3 100%); border-radius: 50% 50% 40% 40%; box-shadow: 0 2px 6px rgba(0,0,0,0.15); border: 2px solid #F0E5D8;"></div>
+                            <div style="position: absolute; top: -30px; left: 50%; transform: translateX(-50%); width: 60%; height: 20px; background: radial-gradient(circle, #FFFFFF 0%, #FFFEF7 100%); border-radius: 50%; opacity: 0.9;"></div>"""
+
+WHIPPED_CREAM_SVG = """
+                            <ellipse cx="90" cy="15" rx="55" ry="25" fill="#FFFAF0" stroke="#F5DEB3" stroke-width="2"/>
+                            <ellipse cx="70" cy="10" rx="20" ry="15" fill="#FFFFFF" opacity="0.8"/>
+                            <ellipse cx="110" cy="10" rx="20" ry="15" fill="#FFFFFF" opacity="0.8"/>
+                            <ellipse cx="90" cy="5" rx="18" ry="12" fill="#FFFFFF" opacity="0.9"/>
+                            """
+
+NO_EXTRAS_HTML = '<span style="color: #999; font-size: 11px;">None</span>'
+
+# Everything up to the first order detail; depends only on the cup fragment key.
+# The markup is kept byte-identical to what the frontend has always received,
+# including the leftover SVG cup markup after the size badge.
+_CUP_TEMPLATE = """
+        <div style="font-family: 'Segoe UI', Arial, sans-serif; padding: 12px; background: linear-gradient(135deg, #667eea 0%, #764ba2 100%); border-radius: 12px; max-width: 260px; margin: 0 auto; color: white; box-shadow: 0 6px 20px rgba(0,0,0,0.3);">
+            <div style="text-align: center; margin-bottom: 10px;">
+                <h2 style="margin: 0; font-size: 17px; font-weight: 600; display: inline-flex; align-items: center; gap: 5px;">
+                    <span style="font-size: 20px;">☕</span>
+                    <span>AgentX Coffee</span>
+                </h2>
+            </div>
+            
+            <div style="background: white; border-radius: 10px; padding: 12px; color: #333; box-shadow: 0 2px 6px rgba(0,0,0,0.1);">
+                <h3 style="margin: 0 0 10px 0; color: #667eea; text-align: center; font-size: 14px; font-weight: 600; border-bottom: 2px solid #e8eaf6; padding-bottom: 6px;">Your Order</h3>
+                
+                <!-- Drink Visualization -->
+                <div style="display: flex; justify-content: center; align-items: center; margin: 10px 0; padding: 14px; background: linear-gradient(to bottom, #f8f9fa 0%, #e9ecef 100%); border-radius: 10px;">
+                    <div style="position: relative; display: inline-block;">
+                        <!-- Simple Modern Cup -->
+                        <div style="position: relative; width: {cup_width}; height: {cup_height}; background: linear-gradient(to bottom, {drink_color} 0%, {drink_color} 85%, #3e2723 100%); border-radius: 0 0 15px 15px; box-shadow: 0 6px 12px rgba(0,0,0,0.2), inset -5px 0 10px rgba(0,0,0,0.1), inset 5px 0 10px rgba(255,255,255,0.1); border: 3px solid #3e2723; border-top: none;">
+                            <!-- Cup Top/Rim -->
+                            <div style="position: absolute; top: -8px; left: -3px; right: -3px; height: 12px; background: {drink_color}; border: 3px solid #3e2723; border-radius: 50%; box-shadow: inset 0 -2px 4px rgba(0,0,0,0.3);"></div>
+                            
+                            <!-- Whipped Cream -->
+                            {whipped_cream}
+                            
+                            <!-- Cup Handle -->
+                            <div style="position: absolute; right: -22px; top: 25%; width: 28px; height: 40%; border: 4px solid #3e2723; border-left: none; border-radius: 0 50% 50% 0; background: linear-gradient(to right, transparent 0%, {drink_color} 50%); opacity: 0.8;"></div>
+                        </div>
+                        
+                        <!-- Size Badge -->
+                        <div style="text-align: center; margin-top: 12px;">
+                            <span style="display: inline-block; background: linear-gradient(135deg, #667eea 0%, #764ba2 100%); color: white; padding: 5px 14px; border-radius: 14px; font-weight: 700; font-size: 11px; letter-spacing: 1.2px; box-shadow: 0 2px 6px rg
+                                  fill="url(#cupGradient)" 
+                                  opacity="0.3"/>
+                            
+                            <!-- Cup Handle -->
+                            <path d="M 150 80 Q 180 80 180 120 Q 180 160 150 160" 
+                                  fill="none" 
+                                  stroke="#2c1810" 
+                                  stroke-width="8" 
+                                  stroke-linecap="round"/>
+                            <path d="M 150 85 Q 175 85 175 120 Q 175 155 150 155" 
+                                  fill="none" 
+                                  stroke="{drink_color}" 
+                                  stroke-width="5" 
+                                  stroke-linecap="round" 
+                                  opacity="0.6"/>
+                            
+                            <!-- Whipped Cream -->
+                            {whipped_cream_svg}
+                            
+                            <!-- Gradient Definition -->
+                            <defs>
+                                <linearGradient id="cupGradient" x1="0%" y1="0%" x2="100%" y2="0%">
+                                    <stop offset="0%" style="stop-color:black;stop-opacity:0.3" />
+                                    <stop offset="50%" style="stop-color:white;stop-opacity:0.1" />
+                                    <stop offset="100%" style="stop-color:black;stop-opacity:0.2" />
+                                </linearGradient>
+                            </defs>
+                        </svg>
+                        
+                        <!-- Size Label -->
+                        <div style="text-align: center; margin-top: 10px;">
+                            <span style="display: inline-block; background: #667eea; color: white; padding: 4px 12px; border-radius: 12px; font-weight: 700; font-size: 12px; letter-spacing: 1px;">
+                                {size_label}
+                            </span>
+                        </div>
+                    </div>
+                </div>
+                
+                <!-- Order Details -->
+                <div style="margin-top: 10px; background: #f8f9fa; border-radius: 8px; padding: 8px; font-size: 12px;">
+                    <div style="display: grid; grid-template-columns: auto 1fr; gap: 5px 10px; align-items: start;">
+                        <strong style="color: #667eea;">Drink:</strong>
+                        <span>"""
+
+_DETAILS_TEMPLATE = """{drink}</span>
+                        
+                        <strong style="color: #667eea;">Size:</strong>
+                        <span>{size}</span>
+                        
+                        <strong style="color: #667eea;">Milk:</strong>
+                        <span>{milk}</span>
+                        
+                        <strong style="color: #667eea;">Extras:</strong>
+                        <div>{extras}</div>
+                        
+                        <strong style="color: #667eea;">Name:</strong>
+                        <span>{name}</span>
+                    </div>
+                </div>
+            </div>
+        </div>
+        """
+
+
+def compile_template(template):
+    """Split a template into its fixed segments and the slot names between them"""
+    segments = []
+    slots = []
+    for literal, field, _spec, _conversion in string.Formatter().parse(template):
+        segments.append(literal)
+        if field is not None:
+            slots.append(field)
+    if len(segments) == len(slots):
+        segments.append("")
+    return tuple(segments), tuple(slots)
+
+
+def fill_template(compiled, values):
+    """Join the fixed segments of a compiled template with values given in slot order"""
+    segments, slots = compiled
+    parts = [""] * (len(segments) + len(slots))
+    parts[0::2] = segments
+    parts[1::2] = values
+    return "".join(parts)
+
+
+_CUP = compile_template(_CUP_TEMPLATE)
+_DETAILS = compile_template(_DETAILS_TEMPLATE)
+# render_drink_html fills the detail slots positionally
+assert _DETAILS[1] == ("drink", "size", "milk", "extras", "name")
+
+
+@lru_cache(maxsize=FRAGMENT_CACHE_SIZE)
+def render_cup_fragment(size, drink_type, has_whipped_cream):
+    """Render the cup half of the panel for one (size, drinkType, whipped cream) key"""
+    cup_size = SIZE_CONFIG.get(size, SIZE_CONFIG[DEFAULT_SIZE])
+    values = {
+        "cup_width": cup_size["width"],
+        "cup_height": cup_size["height"],
+        "drink_color": DRINK_COLORS.get(drink_type, DEFAULT_DRINK_COLOR),
+        "whipped_cream": WHIPPED_CREAM_HTML if has_whipped_cream else "",
+        "whipped_cream_svg": WHIPPED_CREAM_SVG if has_whipped_cream else "",
+        "size_label": size.upper() if size else "SELECT SIZE",
+    }
+    return fill_template(_CUP, [values[slot] for slot in _CUP[1]])
+
+
+@lru_cache(maxsize=FRAGMENT_CACHE_SIZE)
+def render_extras_html(extras):
+    """Render the extras list shown in the order details from a tuple of extras"""
+    if not extras:
+        return NO_EXTRAS_HTML
+    extras_items = "".join([f"<div style='margin: 2px 0; font-size: 12px;'>• {extra}</div>" for extra in extras])
+    return f'<div style="margin: 0;">{extras_items}</div>'
+
+
+@lru_cache(maxsize=FRAGMENT_CACHE_SIZE)
+def has_whipped_cream(extras):
+    """Whether a tuple of extras puts whipped cream on the cup"""
+    return any("whipped cream" in extra.lower() for extra in extras)
+
+
+def render_drink_html(order_state):
+    """Render the HTML visualization of an OrderState"""
+    extras = order_state.extras
+    size = order_state.size
+    drink_type = order_state.drink_type
+    return render_cup_fragment(size, drink_type, has_whipped_cream(extras)) + fill_template(_DETAILS, (
+        drink_type or "Not selected",
+        size or "Not selected",
+        order_state.milk or "Not selected",
+        render_extras_html(extras),
+        order_state.name or "Not provided",
+    ))
+
+
+def prewarm():
+    """Render every known cup fragment so the first orders hit the cache"""
+    for size in [None, *SIZE_CONFIG]:
+        for drink_type in [None, *DRINK_COLORS]:
+            for whipped in (False, True):
+                render_cup_fragment(size, drink_type, whipped)
@@ -0,0 +1,444 @@
+"""Per-turn latency breakdown and per-stage latency histograms.
+
+Every job process keeps one LatencyHistogram per stage: the STT, EOU, LLM and
+TTS timings reported by the session metrics, our own tool bodies and data
+channel publishes, and the end-to-end response time of each turn. The
+histograms use log-linear buckets in the style of HdrHistogram: exact below
+32us and within about 6% above that, in a fixed array of counters, so
+recording a value is a couple of integer operations and histograms from
+different processes can be merged exactly.
+
+TurnTracker correlates the session metrics of one reply by speech id and logs
+a single line per turn with the breakdown of where the time went, once the
+reply's speech is done.
+
+Job processes write their histograms to LATENCY_METRICS_DIR (default
+metrics/latency/) every few seconds and at shutdown. The exporter merges the
+snapshots of all job processes on the host into one set of histograms, folding
+the snapshots of exited processes into a running total, and renders them in
+the Prometheus text format, either over HTTP or into a file for a textfile
+collector:
+
+    uv run python src/instrumentation.py serve --port 9464
+    uv run python src/instrumentation.py write metrics/agent_latency.prom
+
+The exporter also renders the workers' load and admission decisions (see
+admission.py).
+"""
+
+import argparse
+import asyncio
+import functools
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+import psutil
+from livekit.agents import metrics
+
+logger = logging.getLogger("agent")
+
+DEFAULT_METRICS_DIR = Path("metrics") / "latency"
+DEFAULT_FLUSH_INTERVAL = 15.0
+
+QUANTILES = (0.5, 0.9, 0.99, 0.999)
+
+# Buckets: values below 2**SUB_BITS microseconds are exact, above that each power
+# of two is split into 2**(SUB_BITS - 1) buckets
+SUB_BITS = 5
+SUB_COUNT = 1 << SUB_BITS
+HALF_COUNT = SUB_COUNT >> 1
+# Up to about 2**36us (19 hours); anything longer lands in the last bucket
+BUCKET_COUNT = SUB_COUNT + (36 - SUB_BITS) * HALF_COUNT
+
+# Snapshots of exited processes are folded into this file
+MERGED_SNAPSHOT = "merged.json"
+
+
+def bucket_index(micros):
+    if micros < SUB_COUNT:
+        return micros
+    shift = micros.bit_length() - SUB_BITS
+    index = SUB_COUNT + (shift - 1) * HALF_COUNT + (micros >> shift) - HALF_COUNT
+    return min(index, BUCKET_COUNT - 1)
+
+
+def bucket_value(index):
+    """Midpoint of a bucket in microseconds"""
+    if index < SUB_COUNT:
+        return index
+    shift, offset = divmod(index - SUB_COUNT, HALF_COUNT)
+    shift += 1
+    low = (offset + HALF_COUNT) << shift
+    return low + ((1 << shift) - 1) / 2
+
+
+class LatencyHistogram:
+    """Log-linear latency histogram with fixed buckets"""
+
+    __slots__ = ("counts", "count", "total", "max")
+
+    def __init__(self):
+        self.counts = [0] * BUCKET_COUNT
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def record(self, seconds):
+        if seconds < 0:
+            return
+        self.counts[bucket_index(int(seconds * 1e6))] += 1
+        self.count += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+
+    def percentile(self, q):
+        """Approximate q-quantile in seconds (0 when empty)"""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for index, n in enumerate(self.counts):
+            seen += n
+            if n and seen >= rank:
+                return min(bucket_value(index) / 1e6, self.max)
+        return self.max
+
+    def merge(self, other):
+        for index, n in enumerate(other.counts):
+            if n:
+                self.counts[index] += n
+        self.count += other.count
+        self.total += other.total
+        self.max = max(self.max, other.max)
+
+    def to_dict(self):
+        return {
+            "counts": {str(index): n for index, n in enumerate(self.counts) if n},
+            "count": self.count,
+            "total": self.total,
+            "max": self.max,
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        histogram = cls()
+        for index, n in data["counts"].items():
+            histogram.counts[int(index)] = n
+        histogram.count = data["count"]
+        histogram.total = data["total"]
+        histogram.max = data["max"]
+        return histogram
+
+    def summary(self):
+        return {
+            "count": self.count,
+            **{f"p{q * 100:g}_ms": round(self.percentile(q) * 1000, 1) for q in QUANTILES},
+            "max_ms": round(self.max * 1000, 1),
+        }
+
+
+class LatencyRegistry:
+    """The latency histograms of one process, keyed by stage
+
+    With JOB_EXECUTOR=thread the sessions of several job threads and the
+    inference thread record into the same registry, so recording and
+    snapshots hold a lock, and the histograms are flushed by one thread for
+    as long as any session is open.
+    """
+
+    def __init__(self):
+        self.histograms = {}
+        self._lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        self._sessions = 0
+        self._stop = None
+        self._thread = None
+
+    def record(self, stage, seconds):
+        with self._lock:
+            histogram = self.histograms.get(stage)
+            if histogram is None:
+                histogram = self.histograms[stage] = LatencyHistogram()
+            histogram.record(seconds)
+
+    @contextmanager
+    def span(self, stage):
+        """Record how long the body of a with block takes"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(stage, time.perf_counter() - start)
+
+    def snapshot(self):
+        with self._lock:
+            return {stage: histogram.to_dict() for stage, histogram in self.histograms.items()}
+
+    def summary(self):
+        with self._lock:
+            return {stage: histogram.summary() for stage, histogram in sorted(self.histograms.items())}
+
+    def flush(self, metrics_dir=None):
+        """Write this process's histograms for the exporter"""
+        metrics_dir = Path(metrics_dir or latency_metrics_dir())
+        snapshot = json.dumps(self.snapshot())
+        with self._write_lock:
+            metrics_dir.mkdir(parents=True, exist_ok=True)
+            path = metrics_dir / f"{os.getpid()}.json"
+            tmp_path = path.with_suffix(".tmp")
+            tmp_path.write_text(snapshot, encoding="utf-8")
+            os.replace(tmp_path, path)
+
+    def _try_flush(self):
+        try:
+            self.flush()
+        except OSError as e:
+            logger.warning(f"Failed to write latency metrics: {e}")
+
+    def start_flushing(self, interval=DEFAULT_FLUSH_INTERVAL):
+        """Flush periodically from a background thread until every session has called stop_flushing()"""
+        with self._lock:
+            self._sessions += 1
+            if self._thread is None:
+                self._stop = threading.Event()
+                self._thread = threading.Thread(
+                    target=self._flush_loop, args=(interval, self._stop), name="latency-flush", daemon=True
+                )
+                self._thread.start()
+
+    def _flush_loop(self, interval, stop):
+        while not stop.wait(interval):
+            self._try_flush()
+
+    async def stop_flushing(self):
+        """End a session's flushing; the last one stops the thread. Writes a final snapshot"""
+        thread = None
+        with self._lock:
+            self._sessions = max(self._sessions - 1, 0)
+            if not self._sessions and self._thread is not None:
+                self._stop.set()
+                thread, self._thread = self._thread, None
+        if thread is not None:
+            await asyncio.to_thread(thread.join)
+        await asyncio.to_thread(self._try_flush)
+
+
+def latency_metrics_dir():
+    return Path(os.getenv("LATENCY_METRICS_DIR") or DEFAULT_METRICS_DIR)
+
+
+# Histograms of this process
+LATENCY = LatencyRegistry()
+
+
+def span(stage):
+    """Context manager recording a stage duration into the process histograms"""
+    return LATENCY.span(stage)
+
+
+def timed_tool(func):
+    """Record the duration of a tool body, per tool and against the current turn"""
+    stage = f"tool.{func.__name__}"
+
+    @functools.wraps(func)
+    async def wrapper(self, *args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return await func(self, *args, **kwargs)
+        finally:
+            elapsed = time.perf_counter() - start
+            LATENCY.record(stage, elapsed)
+            context = kwargs.get("context", args[0] if args else None)
+            speech_handle = getattr(context, "speech_handle", None)
+            tracker = getattr(self, "turn_tracker", None)
+            if speech_handle is not None and tracker is not None:
+                tracker.record_tool(speech_handle.id, func.__name__, elapsed)
+
+    return wrapper
+
+
+class TurnTracker:
+    """Correlates one session's metrics by speech id and logs a breakdown per turn"""
+
+    def __init__(self, registry=LATENCY, max_open_turns=32):
+        self.registry = registry
+        self.max_open_turns = max_open_turns
+        self._turns = OrderedDict()
+
+    def _turn(self, speech_id):
+        turn = self._turns.get(speech_id)
+        if turn is None:
+            turn = self._turns[speech_id] = {}
+            # Speeches not tracked with on_speech_created never finish; forget the oldest
+            while len(self._turns) > self.max_open_turns:
+                self._turns.popitem(last=False)
+        return turn
+
+    def record_tool(self, speech_id, name, seconds):
+        turn = self._turn(speech_id)
+        turn[f"tool.{name}"] = turn.get(f"tool.{name}", 0.0) + seconds
+
+    def on_metrics(self, collected):
+        """Record session metrics into the histograms and the turn they belong to"""
+        stages = {}
+        if isinstance(collected, metrics.EOUMetrics):
+            stages = {
+                "eou_delay": collected.end_of_utterance_delay,
+                "stt_final_delay": collected.transcription_delay,
+                "on_user_turn_completed": collected.on_user_turn_completed_delay,
+            }
+        elif isinstance(collected, metrics.LLMMetrics):
+            stages = {"llm_ttft": collected.ttft, "llm_duration": collected.duration}
+        elif isinstance(collected, metrics.TTSMetrics):
+            stages = {"tts_ttfb": collected.ttfb}
+        elif isinstance(collected, metrics.STTMetrics) and collected.duration > 0:
+            stages = {"stt_duration": collected.duration}
+        for stage, seconds in stages.items():
+            self.registry.record(stage, seconds)
+
+        speech_id = getattr(collected, "speech_id", None)
+        if not speech_id or not stages:
+            return
+        turn = self._turn(speech_id)
+        first_audio = isinstance(collected, metrics.TTSMetrics) and "tts_ttfb" not in turn
+        for stage, seconds in stages.items():
+            # The first LLM call and the first sentence of speech are what the user waits for
+            turn.setdefault(stage, seconds)
+        if first_audio and "eou_delay" in turn and "llm_ttft" in turn:
+            # Slightly optimistic: leaves out the time the first sentence takes to stream from the LLM
+            response = turn["eou_delay"] + turn["llm_ttft"] + turn["tts_ttfb"]
+            turn["response"] = response
+            self.registry.record("response", response)
+
+    def on_speech_created(self, ev):
+        """Session speech_created handler: log the speech's turn once it is done
+
+        The turn stays open until then, so the metrics of its later sentences
+        and tool steps join it.
+        """
+        ev.speech_handle.add_done_callback(lambda handle: self._complete(handle.id))
+
+    def _complete(self, speech_id):
+        turn = self._turns.pop(speech_id, None)
+        if not turn:
+            return
+        breakdown = ", ".join(f"{stage}={seconds * 1000:.0f}ms" for stage, seconds in turn.items())
+        logger.info(f"Turn {speech_id} latency: {breakdown}")
+
+
+def read_snapshot(path):
+    with open(path, encoding="utf-8") as f:
+        return {stage: LatencyHistogram.from_dict(data) for stage, data in json.load(f).items()}
+
+
+def merge_into(total, histograms):
+    for stage, histogram in histograms.items():
+        total.setdefault(stage, LatencyHistogram()).merge(histogram)
+
+
+def collect(metrics_dir, fold_after=60.0):
+    """Merge the snapshots of all job processes, folding those of exited processes into merged.json"""
+    metrics_dir = Path(metrics_dir)
+    merged_path = metrics_dir / MERGED_SNAPSHOT
+    merged = read_snapshot(merged_path) if merged_path.exists() else {}
+    live = {}
+    folded = False
+    for path in metrics_dir.glob("*.json"):
+        if path.name == MERGED_SNAPSHOT:
+            continue
+        try:
+            histograms = read_snapshot(path)
+            pid = int(path.stem)
+            exited = not psutil.pid_exists(pid) and time.time() - path.stat().st_mtime > fold_after
+        except (OSError, ValueError):
+            continue
+        if exited:
+            merge_into(merged, histograms)
+            path.unlink(missing_ok=True)
+            folded = True
+        else:
+            merge_into(live, histograms)
+    if folded:
+        tmp_path = merged_path.with_suffix(".tmp")
+        tmp_path.write_text(json.dumps({stage: h.to_dict() for stage, h in merged.items()}), encoding="utf-8")
+        os.replace(tmp_path, merged_path)
+    merge_into(live, merged)
+    return live
+
+
+def render_prometheus(histograms):
+    """Prometheus text exposition of merged histograms as summaries"""
+    lines = [
+        "# HELP agent_stage_latency_seconds Latency of each voice pipeline stage",
+        "# TYPE agent_stage_latency_seconds summary",
+    ]
+    for stage, histogram in sorted(histograms.items()):
+        for q in QUANTILES:
+            lines.append(f'agent_stage_latency_seconds{{stage="{stage}",quantile="{q:g}"}} {histogram.percentile(q):.6f}')
+        lines.append(f'agent_stage_latency_seconds_sum{{stage="{stage}"}} {histogram.total:.6f}')
+        lines.append(f'agent_stage_latency_seconds_count{{stage="{stage}"}} {histogram.count}')
+    return "\n".join(lines) + "\n"
+
+
+def exposition(metrics_dir):
+    """The latency histograms of the host's job processes and the load of its workers"""
+    import admission
+
+    return render_prometheus(collect(metrics_dir)) + admission.render_prometheus(admission.load_metrics_dir())
+
+
+def serve(metrics_dir, port):
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path not in ("/", "/metrics"):
+                self.send_error(404)
+                return
+            body = exposition(metrics_dir).encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer(("", port), Handler)
+    print(f"Serving latency metrics from {metrics_dir} on :{port}/metrics")
+    server.serve_forever()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export the agent's latency histograms")
+    parser.add_argument("--dir", default=None, help="snapshot directory (default: $LATENCY_METRICS_DIR or metrics/latency)")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    serve_parser = subparsers.add_parser("serve", help="serve the Prometheus text format over HTTP")
+    serve_parser.add_argument("--port", type=int, default=9464)
+    write_parser = subparsers.add_parser("write", help="write the Prometheus text format to a file")
+    write_parser.add_argument("output")
+    subparsers.add_parser("summary", help="print percentiles per stage")
+    args = parser.parse_args()
+
+    metrics_dir = Path(args.dir) if args.dir else latency_metrics_dir()
+    if args.command == "serve":
+        serve(metrics_dir, args.port)
+    elif args.command == "write":
+        output = Path(args.output)
+        tmp_path = output.with_suffix(".tmp")
+        tmp_path.write_text(exposition(metrics_dir), encoding="utf-8")
+        os.replace(tmp_path, output)
+    elif args.command == "summary":
+        for stage, histogram in sorted(collect(metrics_dir).items()):
+            print(f"{stage:<32}{histogram.summary()}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,187 @@
+"""The coffee shop menu and lookup of free-text order values against it.
+
+The catalog in menu.json (drinks, sizes, milks, extras, drink colors and cup
+dimensions) is loaded once at import time. Each category gets a lookup index
+built up front:
+
+- every canonical name and alias under a normalized key ("Oat Milk" ->
+  "oat milk") and a compact key without spaces or dashes ("oatmilk"), and
+- a character trigram index over the compact keys, used to find candidates
+  for misspelled input ("late", "capucino"), which are then confirmed with a
+  bounded edit distance.
+
+Lookups return the canonical name, or None for anything not on the menu, so
+the tools, the renderer and the order store only ever see canonical values.
+The cup dimensions and drink colors reach the frontend in the order state
+snapshots (CUP_STYLE), so the catalog is not repeated there.
+"""
+
+import json
+import re
+import unicodedata
+from functools import lru_cache
+from pathlib import Path
+
+CATALOG_PATH = Path(__file__).with_name("menu.json")
+
+# Cached lookups per category; the space of inputs seen in practice is small
+LOOKUP_CACHE_SIZE = 1024
+
+_NON_ALNUM_RE = re.compile(r"[^a-z0-9]+")
+
+
+def normalize(text):
+    """Lowercase, strip accents and punctuation, collapse whitespace ("Café-Latte " -> "cafe latte")"""
+    text = unicodedata.normalize("NFKD", text).encode("ascii", "ignore").decode("ascii")
+    return " ".join(_NON_ALNUM_RE.sub(" ", text.lower()).split())
+
+
+def compact(key):
+    return key.replace(" ", "")
+
+
+def trigrams(key):
+    padded = f"  {key} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def edit_distance(a, b, limit):
+    """Levenshtein distance between a and b, or limit + 1 once it is known to exceed limit
+
+    Only the diagonal band of width 2 * limit + 1 is computed, since any cell
+    outside it already costs more than the limit.
+    """
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    over = limit + 1
+    previous = [j if j <= limit else over for j in range(len(b) + 1)]
+    for i in range(1, len(a) + 1):
+        ca = a[i - 1]
+        lo = max(1, i - limit)
+        hi = min(len(b), i + limit)
+        current = [over] * (len(b) + 1)
+        current[0] = i if i <= limit else over
+        best = current[0]
+        for j in range(lo, hi + 1):
+            cost = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (ca != b[j - 1]))
+            current[j] = cost
+            if cost < best:
+                best = cost
+        if best > limit:
+            return over
+        previous = current
+    return min(previous[-1], over)
+
+
+def max_typos(key):
+    """Edit distance tolerated for a misspelling of a key of this length"""
+    if len(key) <= 3:
+        return 0
+    return 1 if len(key) <= 6 else 2
+
+
+class MenuCategory:
+    """One section of the menu with a precomputed lookup index"""
+
+    def __init__(self, name, items):
+        self.name = name
+        self.items = items
+        self.names = tuple(items)
+        self._exact = {}
+        self._grams = {}
+        for canonical, item in items.items():
+            for alias in (canonical, *item.get("aliases", ())):
+                key = normalize(alias)
+                self._exact[key] = canonical
+                self._exact[compact(key)] = canonical
+                for gram in trigrams(compact(key)):
+                    self._grams.setdefault(gram, set()).add(compact(key))
+        self.lookup = lru_cache(maxsize=LOOKUP_CACHE_SIZE)(self._lookup)
+
+    def __contains__(self, canonical):
+        return canonical in self.items
+
+    def __getitem__(self, canonical):
+        return self.items[canonical]
+
+    def aliases(self, canonical):
+        """The canonical name followed by its aliases"""
+        return [canonical, *self.items[canonical].get("aliases", ())]
+
+    def _lookup(self, text):
+        """Canonical name for free text, or None if it is not on the menu"""
+        if not text:
+            return None
+        key = normalize(text)
+        canonical = self._exact.get(key) or self._exact.get(compact(key))
+        if canonical is None and key.endswith("s"):
+            canonical = self._exact.get(key[:-1]) or self._exact.get(compact(key[:-1]))
+        if canonical is None:
+            canonical = self._fuzzy(compact(key))
+        return canonical
+
+    def _fuzzy(self, key):
+        limit = max_typos(key)
+        if not limit:
+            return None
+        grams = trigrams(key)
+        shared = {}
+        for gram in grams:
+            for candidate in self._grams.get(gram, ()):
+                shared[candidate] = shared.get(candidate, 0) + 1
+        # Each edit destroys at most three trigrams, so weaker candidates cannot be within the limit
+        min_shared = len(grams) - 3 * limit
+        best = None
+        best_distance = limit + 1
+        for candidate, count in shared.items():
+            if count < min_shared or abs(len(candidate) - len(key)) > limit:
+                continue
+            distance = edit_distance(key, candidate, limit)
+            if distance < best_distance:
+                best, best_distance = self._exact[candidate], distance
+            elif distance == best_distance and best is not None and self._exact[candidate] != best:
+                # Equally close to two different items: ambiguous
+                best = None
+        return best if best_distance <= limit else None
+
+    def unknown(self, value):
+        """Explanation for a value that is not on the menu, listing what is"""
+        return f"{value} is not on the menu, the {self.name} are {self.describe()}"
+
+    def describe(self):
+        """The canonical names as a spoken list, like: small, medium, or large"""
+        if len(self.names) < 2:
+            return "".join(self.names)
+        return f"{', '.join(self.names[:-1])}, or {self.names[-1]}"
+
+
+def load_catalog(path=CATALOG_PATH):
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+CATALOG = load_catalog()
+
+DRINKS = MenuCategory("drinks", CATALOG["drinks"])
+SIZES = MenuCategory("sizes", CATALOG["sizes"])
+MILKS = MenuCategory("milk options", CATALOG["milks"])
+EXTRAS = MenuCategory("extras", CATALOG["extras"])
+
+DEFAULT_SIZE = CATALOG["defaults"]["size"]
+DEFAULT_DRINK_COLOR = CATALOG["defaults"]["drinkColor"]
+
+# What the frontend needs to draw the cup, sent with every order state snapshot
+CUP_STYLE = {
+    "cupSizes": {name: {"width": item["width"], "height": item["height"]} for name, item in SIZES.items.items()},
+    "drinkColors": {name: item["color"] for name, item in DRINKS.items.items()},
+    "defaultSize": DEFAULT_SIZE,
+    "defaultDrinkColor": DEFAULT_DRINK_COLOR,
+}
+
+# Menu category for each order state field that holds menu items
+FIELD_CATEGORIES = {
+    "drinkType": DRINKS,
+    "size": SIZES,
+    "milk": MILKS,
+    "extras": EXTRAS,
+}
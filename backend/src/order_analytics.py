@@ -0,0 +1,377 @@
+"""Columnar analytics index over the order history.
+
+Answering questions like "large oat lattes per hour yesterday" used to mean
+parsing every saved order. This module keeps an incremental, array-backed
+index of the history instead:
+
+- ``timestamp.i64``: order time as int64 local wall-clock seconds since the
+  epoch (the host's local time, as the agent saves it, so buckets are local
+  hours and days)
+- ``drinkType.u2``, ``size.u2``, ``milk.u2``: uint16 dictionary codes
+  (0 means missing)
+- ``extras.u8``: uint64 bitmask over the extras dictionary
+- ``meta.json``: the dictionaries, the row count and how far each source has
+  been read
+
+The column files are plain little-endian arrays opened with ``numpy.memmap``,
+so queries only touch the pages they need. Each ``ingest`` only reads orders
+added since the previous run: new lines of the order store (see
+``order_store.read_since``) and legacy ``orders/order_*.json`` files it has
+not seen yet. Queries are answered with vectorized NumPy masks and
+``numpy.unique`` group-bys rather than per-order Python loops.
+
+    uv run python src/order_analytics.py ingest
+    uv run python src/order_analytics.py query --where drinkType=latte \\
+        --where size=large --where milk="oat milk" --bucket hour --since yesterday --until today
+    uv run python src/order_analytics.py query --group-by size,milk --since 2026-02-01
+"""
+
+import argparse
+import json
+import os
+from datetime import date, datetime, timedelta, timezone
+from pathlib import Path
+
+import numpy as np
+
+from order_store import DEFAULT_ORDERS_DIR, open_order_store
+
+DEFAULT_INDEX_DIR = DEFAULT_ORDERS_DIR / "analytics"
+
+CODED_COLUMNS = ("drinkType", "size", "milk")
+COLUMN_DTYPES = {
+    "timestamp": np.dtype("<i8"),
+    "drinkType": np.dtype("<u2"),
+    "size": np.dtype("<u2"),
+    "milk": np.dtype("<u2"),
+    "extras": np.dtype("<u8"),
+}
+COLUMN_FILES = {
+    "timestamp": "timestamp.i64",
+    "drinkType": "drinkType.u2",
+    "size": "size.u2",
+    "milk": "milk.u2",
+    "extras": "extras.u8",
+}
+
+# Extras beyond the first 63 distinct values share the last bit
+MAX_EXTRAS_BITS = 64
+OTHER_EXTRAS = "(other)"
+
+BUCKET_SECONDS = {"minute": 60, "hour": 3600, "day": 86400}
+
+
+def normalize(value):
+    """Fold case and whitespace so "Cold Brew" and "cold brew" share a code"""
+    return " ".join(str(value).lower().split()) if value else None
+
+
+def to_epoch_seconds(timestamp):
+    """Local wall-clock seconds for an ISO timestamp
+
+    Naive timestamps are local time, as the agent saves them; aware ones are
+    converted to local time first, so stored orders and query bounds of
+    either kind land in the same buckets.
+    """
+    parsed = datetime.fromisoformat(timestamp)
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone().replace(tzinfo=None)
+    return int(parsed.replace(tzinfo=timezone.utc).timestamp())
+
+
+def from_epoch_seconds(seconds):
+    return datetime.fromtimestamp(int(seconds), tz=timezone.utc).replace(tzinfo=None)
+
+
+class OrderIndex:
+    """Memory-mapped columnar index of saved orders"""
+
+    def __init__(self, index_dir=DEFAULT_INDEX_DIR):
+        self.index_dir = Path(index_dir)
+        self.meta = {
+            "version": 1,
+            "count": 0,
+            "dictionaries": {column: [None] for column in CODED_COLUMNS},
+            "extras": [],
+            "cursors": {},
+            "legacy_files": [],
+        }
+        meta_path = self.index_dir / "meta.json"
+        if meta_path.exists():
+            with open(meta_path, encoding="utf-8") as f:
+                self.meta = json.load(f)
+        self._codes = {
+            column: {value: code for code, value in enumerate(values)}
+            for column, values in self.meta["dictionaries"].items()
+        }
+        self._extra_bits = {value: bit for bit, value in enumerate(self.meta["extras"])}
+        self._columns = None
+
+    @property
+    def count(self):
+        return self.meta["count"]
+
+    # Ingest
+
+    def encode_value(self, column, value):
+        """Dictionary code for a drinkType/size/milk value, adding it if new"""
+        value = normalize(value)
+        codes = self._codes[column]
+        code = codes.get(value)
+        if code is None:
+            code = codes[value] = len(codes)
+            self.meta["dictionaries"][column].append(value)
+        return code
+
+    def encode_extras(self, extras):
+        """Bitmask for a list of extras, adding new extras to the dictionary"""
+        mask = 0
+        for extra in extras or ():
+            value = normalize(extra)
+            bit = self._extra_bits.get(value)
+            if bit is None:
+                if len(self._extra_bits) < MAX_EXTRAS_BITS - 1:
+                    bit = self._extra_bits[value] = len(self._extra_bits)
+                    self.meta["extras"].append(value)
+                else:
+                    bit = MAX_EXTRAS_BITS - 1
+            mask |= 1 << bit
+        return mask
+
+    def append(self, orders):
+        """Encode orders and append them to the column files"""
+        orders = [order for order in orders if order.get("timestamp")]
+        if not orders:
+            return 0
+        columns = {
+            "timestamp": np.fromiter((to_epoch_seconds(o["timestamp"]) for o in orders), COLUMN_DTYPES["timestamp"], len(orders)),
+            "extras": np.fromiter((self.encode_extras(o.get("extras")) for o in orders), COLUMN_DTYPES["extras"], len(orders)),
+        }
+        for column in CODED_COLUMNS:
+            columns[column] = np.fromiter((self.encode_value(column, o.get(column)) for o in orders), COLUMN_DTYPES[column], len(orders))
+        self.append_columns(columns)
+        return len(orders)
+
+    def append_columns(self, columns):
+        """Append already-encoded column arrays of equal length"""
+        self.index_dir.mkdir(parents=True, exist_ok=True)
+        self._truncate_to_count()
+        for column, filename in COLUMN_FILES.items():
+            with open(self.index_dir / filename, "ab") as f:
+                np.ascontiguousarray(columns[column], dtype=COLUMN_DTYPES[column]).tofile(f)
+        self.meta["count"] += len(columns["timestamp"])
+        self._columns = None
+
+    def _truncate_to_count(self):
+        # Drop rows a crashed ingest appended without recording them in meta.json
+        for column, filename in COLUMN_FILES.items():
+            path = self.index_dir / filename
+            size = self.meta["count"] * COLUMN_DTYPES[column].itemsize
+            if path.exists() and path.stat().st_size > size:
+                os.truncate(path, size)
+
+    def save(self):
+        """Persist meta.json; call after appending"""
+        self.index_dir.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.index_dir / "meta.json.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.meta, f, separators=(",", ":"))
+        os.replace(tmp_path, self.index_dir / "meta.json")
+
+    def ingest(self, store, orders_dir=DEFAULT_ORDERS_DIR):
+        """Append orders saved since the last ingest; returns the number of new orders"""
+        legacy_files = set(self.meta["legacy_files"])
+        new_orders = []
+        for filepath in sorted(Path(orders_dir).glob("order_*.json")):
+            if filepath.name in legacy_files:
+                continue
+            try:
+                with open(filepath, encoding="utf-8") as f:
+                    new_orders.append(json.load(f))
+            except (OSError, ValueError):
+                continue
+            self.meta["legacy_files"].append(filepath.name)
+
+        # Legacy files imported into the store keep their file name as id
+        legacy_ids = {Path(name).stem for name in self.meta["legacy_files"]}
+        cursor_key = f"{type(store).__name__}:{store.path}"
+        orders, cursor = store.read_since(self.meta["cursors"].get(cursor_key))
+        new_orders.extend(order for order in orders if order.get("id") not in legacy_ids)
+        self.meta["cursors"][cursor_key] = cursor
+
+        added = self.append(new_orders)
+        self.save()
+        return added
+
+    # Query
+
+    def columns(self):
+        """Memory-mapped column arrays"""
+        if self._columns is None:
+            self._columns = {}
+            for column, filename in COLUMN_FILES.items():
+                path = self.index_dir / filename
+                if self.count == 0 or not path.exists():
+                    self._columns[column] = np.zeros(0, COLUMN_DTYPES[column])
+                else:
+                    self._columns[column] = np.memmap(path, dtype=COLUMN_DTYPES[column], mode="r", shape=(self.count,))
+        return self._columns
+
+    def _filter_mask(self, where, since, until):
+        columns = self.columns()
+        timestamps = columns["timestamp"]
+        mask = np.ones(len(timestamps), dtype=bool)
+        if since is not None:
+            mask &= timestamps >= since
+        if until is not None:
+            mask &= timestamps < until
+        for column, value in (where or {}).items():
+            if column == "extras":
+                bit = self._extra_bits.get(normalize(value))
+                if bit is None:
+                    return np.zeros(len(timestamps), dtype=bool)
+                mask &= (columns["extras"] & np.uint64(1 << bit)) != 0
+            else:
+                code = self._codes[column].get(normalize(value))
+                if code is None:
+                    return np.zeros(len(timestamps), dtype=bool)
+                mask &= columns[column] == code
+        return mask
+
+    def query(self, group_by=(), bucket=None, where=None, since=None, until=None):
+        """Count orders grouped by time bucket and columns
+
+        group_by: column names from drinkType, size, milk and extras; an order
+        with several extras is counted once per extra.
+        bucket: "minute", "hour", "day" or None.
+        where: {column: value} equality filters (for extras: has that extra).
+        since / until: local wall-clock epoch seconds, until is exclusive.
+
+        Returns a list of (key, count) where key is a tuple of the bucket start
+        (if bucketing) followed by the group-by values, sorted by key.
+        """
+        columns = self.columns()
+        mask = self._filter_mask(where, since, until)
+        coded = [column for column in group_by if column != "extras"]
+        by_extras = "extras" in group_by
+
+        # Pack the bucket and every coded column into one int64 key per order
+        keys = np.zeros(int(mask.sum()), dtype=np.int64)
+        radices = []
+        base = 0
+        if bucket is not None:
+            width = BUCKET_SECONDS[bucket]
+            buckets = columns["timestamp"][mask] // width
+            base = int(buckets.min()) if len(buckets) else 0
+            span = int(buckets.max()) - base + 1 if len(buckets) else 1
+            keys = buckets - base
+            radices.append(span)
+        for column in coded:
+            radix = len(self.meta["dictionaries"][column])
+            keys = keys * radix + columns[column][mask].astype(np.int64)
+            radices.append(radix)
+
+        if by_extras:
+            extras = columns["extras"][mask]
+            known = len(self.meta["extras"])
+            # The shared overflow bit is only in use once the dictionary is full
+            bits = range(MAX_EXTRAS_BITS if known == MAX_EXTRAS_BITS - 1 else known)
+            groups = [(keys[(extras & np.uint64(1 << bit)) != 0], bit) for bit in bits]
+        else:
+            groups = [(keys, None)]
+
+        results = []
+        for group_keys, bit in groups:
+            unique, counts = np.unique(group_keys, return_counts=True)
+            for key, count in zip(unique.tolist(), counts.tolist()):
+                results.append((self._decode_key(key, radices, bucket, coded, base, bit), count))
+        results.sort(key=lambda item: tuple("" if v is None else str(v) for v in item[0]))
+        return results
+
+    def _decode_key(self, key, radices, bucket, coded, base, bit):
+        values = []
+        for radix in reversed(radices):
+            key, part = divmod(key, radix)
+            values.append(part)
+        values.reverse()
+        decoded = []
+        if bucket is not None:
+            decoded.append(from_epoch_seconds((values.pop(0) + base) * BUCKET_SECONDS[bucket]))
+        for column, code in zip(coded, values):
+            decoded.append(self.meta["dictionaries"][column][code])
+        if bit is not None:
+            decoded.append(self.meta["extras"][bit] if bit < len(self.meta["extras"]) else OTHER_EXTRAS)
+        return tuple(decoded)
+
+
+def parse_day(value):
+    """Epoch seconds for the start of a day given as YYYY-MM-DD, "today" or "yesterday" (or a full ISO timestamp)"""
+    today = date.today()
+    named = {"today": today, "yesterday": today - timedelta(days=1), "tomorrow": today + timedelta(days=1)}
+    if value in named:
+        value = named[value].isoformat()
+    return to_epoch_seconds(value)
+
+
+def parse_group_by(value):
+    group_by = [column for column in value.split(",") if column]
+    for column in group_by:
+        if column not in (*CODED_COLUMNS, "extras"):
+            raise argparse.ArgumentTypeError(f"--group-by expects columns from drinkType, size, milk, extras: {column!r}")
+    return group_by
+
+
+def parse_where(values):
+    where = {}
+    for item in values or ():
+        column, sep, value = item.partition("=")
+        if not sep or column not in (*CODED_COLUMNS, "extras"):
+            raise argparse.ArgumentTypeError(f"--where expects column=value with column in drinkType, size, milk, extras: {item!r}")
+        where[column] = value
+    return where
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Order history analytics")
+    parser.add_argument("--index-dir", default=os.getenv("ORDER_ANALYTICS_DIR", str(DEFAULT_INDEX_DIR)))
+    parser.add_argument("--orders-dir", default=str(DEFAULT_ORDERS_DIR), help="directory with legacy order_*.json files")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    subparsers.add_parser("ingest", help="index orders saved since the last run")
+    query_parser = subparsers.add_parser("query", help="count orders")
+    query_parser.add_argument("--group-by", default="", help="comma-separated: drinkType,size,milk,extras")
+    query_parser.add_argument("--bucket", choices=sorted(BUCKET_SECONDS))
+    query_parser.add_argument("--where", action="append", help="column=value filter, may be repeated")
+    query_parser.add_argument("--since", help="YYYY-MM-DD, today or yesterday (inclusive)")
+    query_parser.add_argument("--until", help="YYYY-MM-DD, today or yesterday (exclusive)")
+    query_parser.add_argument("--no-ingest", action="store_true", help="query the index without ingesting new orders first")
+    args = parser.parse_args()
+    if args.command == "query":
+        try:
+            group_by = parse_group_by(args.group_by)
+            where = parse_where(args.where)
+        except argparse.ArgumentTypeError as e:
+            query_parser.error(str(e))
+
+    index = OrderIndex(args.index_dir)
+    if args.command == "ingest" or not args.no_ingest:
+        added = index.ingest(open_order_store(), args.orders_dir)
+        if args.command == "ingest":
+            print(f"Indexed {added} new orders ({index.count} total)")
+            return
+
+    results = index.query(
+        group_by=group_by,
+        bucket=args.bucket,
+        where=where,
+        since=parse_day(args.since) if args.since else None,
+        until=parse_day(args.until) if args.until else None,
+    )
+    header = ([args.bucket] if args.bucket else []) + group_by
+    if header:
+        print("\t".join([*header, "count"]))
+    for key, count in results:
+        print("\t".join([*("" if value is None else str(value) for value in key), str(count)]))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,477 @@
+"""Cross-process order numbers and the kitchen display queue.
+
+Receipt order numbers used to be the current time to the second, so two job
+processes (or two rooms in one process) saving an order in the same second
+printed the same number, and saved orders went nowhere but the order log. Both
+now go through one SQLite database in WAL mode that every job process on the
+host shares (orders/dispatch.db, ORDER_DISPATCH_PATH):
+
+- Order numbers come from a sequence row incremented inside a write
+  transaction, so they never repeat and increase in the order they were
+  allocated, whichever process allocates them.
+- Every saved order is appended to the dispatch stream. Kitchen displays read
+  it as members of a consumer group: every group (say "kitchen" and "bar")
+  sees every order, and the displays of one group share its orders.
+- A fetched order is leased to its display until it is acknowledged. Orders
+  whose lease runs out (the display crashed or lost its connection) are
+  redelivered to the next display of the group that fetches, up to
+  MAX_DELIVERIES times, after which they are set aside as dead letters.
+
+Like the order stores, job processes hand allocations and publishes to a
+writer thread that commits everything waiting in one transaction, so a burst
+of orders costs one commit and the event loop never waits for the database
+lock. Publishers wait once DEFAULT_MAX_PENDING orders are queued in the
+process, and a group never holds more than max_in_flight unacknowledged
+orders, so a stalled display does not pile up leases that all expire at once.
+Orders older than DISPATCH_RETENTION_HOURS are trimmed from the stream.
+
+A kitchen display subscribes with:
+
+    uv run python src/order_dispatch.py subscribe --group kitchen --consumer display-1
+    uv run python src/order_dispatch.py status
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import sqlite3
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Optional
+
+from order_store import DEFAULT_ORDERS_DIR, BatchWriter, resolve_future
+
+logger = logging.getLogger("agent")
+
+DEFAULT_DISPATCH_PATH = DEFAULT_ORDERS_DIR / "dispatch.db"
+ORDER_SEQUENCE = "order"
+
+# Orders a job process may have queued for the writer before publishers wait
+DEFAULT_MAX_PENDING = 1024
+DEFAULT_RETENTION_HOURS = 24.0
+# Published orders between two trims of the stream
+TRIM_EVERY = 1000
+
+# Consumer defaults: seconds a fetched order stays leased, unacknowledged orders per group
+DEFAULT_LEASE = 30.0
+DEFAULT_MAX_IN_FLIGHT = 64
+MAX_DELIVERIES = 5
+DEFAULT_POLL_INTERVAL = 0.05
+
+_SEPARATORS = (",", ":")
+
+_SCHEMA = (
+    "CREATE TABLE IF NOT EXISTS sequences (name TEXT PRIMARY KEY, value INTEGER NOT NULL)",
+    """
+    CREATE TABLE IF NOT EXISTS dispatch (
+        seq INTEGER PRIMARY KEY AUTOINCREMENT,
+        order_number INTEGER UNIQUE,
+        published_at REAL NOT NULL,
+        data TEXT NOT NULL
+    )
+    """,
+    "CREATE TABLE IF NOT EXISTS consumer_groups (name TEXT PRIMARY KEY, last_delivered INTEGER NOT NULL)",
+    """
+    CREATE TABLE IF NOT EXISTS leases (
+        group_name TEXT NOT NULL,
+        seq INTEGER NOT NULL,
+        consumer TEXT NOT NULL,
+        lease_until REAL NOT NULL,
+        deliveries INTEGER NOT NULL,
+        PRIMARY KEY (group_name, seq)
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS leases_expiry ON leases (group_name, lease_until)",
+    """
+    CREATE TABLE IF NOT EXISTS dead_letters (
+        group_name TEXT NOT NULL,
+        seq INTEGER NOT NULL,
+        consumer TEXT NOT NULL,
+        deliveries INTEGER NOT NULL,
+        failed_at REAL NOT NULL,
+        PRIMARY KEY (group_name, seq)
+    )
+    """,
+)
+
+
+def order_dispatch_path():
+    """The dispatch database shared by the job processes (ORDER_DISPATCH_PATH)"""
+    return Path(os.getenv("ORDER_DISPATCH_PATH") or DEFAULT_DISPATCH_PATH)
+
+
+def dispatch_retention_hours():
+    """How long published orders stay in the stream (DISPATCH_RETENTION_HOURS)"""
+    return float(os.getenv("DISPATCH_RETENTION_HOURS") or DEFAULT_RETENTION_HOURS)
+
+
+def connect(path):
+    """Open the dispatch database, creating its tables; transactions are started explicitly"""
+    # Consumers read from worker threads, one call at a time
+    conn = sqlite3.connect(path, timeout=30, isolation_level=None, check_same_thread=False)
+    conn.execute("PRAGMA journal_mode=WAL")
+    # Numbers handed out must survive a power loss, or they could be handed out again
+    conn.execute("PRAGMA synchronous=FULL")
+    for statement in _SCHEMA:
+        conn.execute(statement)
+    return conn
+
+
+@contextmanager
+def write_transaction(conn):
+    """Take the database write lock up front, so readers-turned-writers never deadlock"""
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        yield conn
+    except BaseException:
+        conn.execute("ROLLBACK")
+        raise
+    conn.execute("COMMIT")
+
+
+def allocate(conn, count, name=ORDER_SEQUENCE):
+    """Reserve count consecutive numbers of a sequence inside a write transaction; returns the first"""
+    conn.execute("INSERT OR IGNORE INTO sequences (name, value) VALUES (?, 0)", (name,))
+    conn.execute("UPDATE sequences SET value = value + ? WHERE name = ?", (count, name))
+    (last,) = conn.execute("SELECT value FROM sequences WHERE name = ?", (name,)).fetchone()
+    return last - count + 1
+
+
+@dataclass
+class _Request:
+    """An allocation (order is None) or a publish queued for the writer thread"""
+
+    order: Optional[dict] = None
+    result: Optional[int] = None
+
+
+class OrderDispatcher(BatchWriter):
+    """Allocates order numbers and publishes saved orders for the kitchen displays"""
+
+    def __init__(self, path, *, max_pending=DEFAULT_MAX_PENDING, retention_hours=None, **kwargs):
+        super().__init__(path, **kwargs)
+        self.max_pending = max_pending
+        self.retention = (dispatch_retention_hours() if retention_hours is None else retention_hours) * 3600
+        self.numbers_allocated = 0
+        self.orders_published = 0
+        self._slots = None
+        self._since_trim = 0
+
+    async def allocate(self):
+        """Reserve the next order number"""
+        request = await self._call(_Request())
+        return request.result
+
+    async def publish(self, order):
+        """Append a saved order to the dispatch stream, waiting while too many are queued"""
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.max_pending)
+        async with self._slots:
+            await self._call(_Request(order=order))
+
+    async def _call(self, request):
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self.submit(request, lambda error: loop.call_soon_threadsafe(resolve_future, future, request, error))
+        return await future
+
+    def _open(self):
+        self._conn = connect(self.path)
+
+    def _close(self):
+        self._conn.close()
+
+    def _write_batch(self, requests):
+        allocations = [request for request in requests if request.order is None]
+        orders = [request.order for request in requests if request.order is not None]
+        with write_transaction(self._conn):
+            if allocations:
+                first = allocate(self._conn, len(allocations))
+                for offset, request in enumerate(allocations):
+                    request.result = first + offset
+            if orders:
+                now = time.time()
+                # A republished order keeps its first place in the stream
+                self._conn.executemany(
+                    "INSERT OR IGNORE INTO dispatch (order_number, published_at, data) VALUES (?, ?, ?)",
+                    [
+                        (order.get("orderNumber"), now, json.dumps(order, separators=_SEPARATORS, ensure_ascii=False))
+                        for order in orders
+                    ],
+                )
+        self.numbers_allocated += len(allocations)
+        self.orders_published += len(orders)
+        self._since_trim += len(orders)
+        if self.retention and self._since_trim >= TRIM_EVERY:
+            self._since_trim = 0
+            trimmed = trim(self._conn, time.time() - self.retention)
+            if trimmed:
+                logger.info(f"Trimmed {trimmed} orders older than {self.retention / 3600:g}h from {self!r}")
+
+    def summary(self):
+        return {
+            "numbers_allocated": self.numbers_allocated,
+            "orders_published": self.orders_published,
+            "batches_committed": self.batches_committed,
+        }
+
+
+def open_order_dispatcher(path=None, **kwargs):
+    """Create the dispatcher for the database configured by ORDER_DISPATCH_PATH"""
+    return OrderDispatcher(path or order_dispatch_path(), **kwargs)
+
+
+def trim(conn, before):
+    """Delete orders published before a timestamp, with their leases and dead letters; returns the number deleted"""
+    with write_transaction(conn):
+        deleted = conn.execute("DELETE FROM dispatch WHERE published_at < ?", (before,)).rowcount
+        if deleted:
+            conn.execute("DELETE FROM leases WHERE seq NOT IN (SELECT seq FROM dispatch)")
+            conn.execute("DELETE FROM dead_letters WHERE seq NOT IN (SELECT seq FROM dispatch)")
+    return deleted
+
+
+@dataclass
+class Delivery:
+    """An order leased to a consumer; acknowledge it with DispatchConsumer.ack"""
+
+    seq: int
+    order: dict
+    deliveries: int
+
+
+class DispatchConsumer:
+    """A kitchen display reading the dispatch stream as a member of a consumer group
+
+    A group created by its first consumer starts at the end of the stream, or
+    at the oldest order kept with start="earliest".
+    """
+
+    def __init__(
+        self,
+        path,
+        group,
+        consumer,
+        *,
+        lease=DEFAULT_LEASE,
+        max_in_flight=DEFAULT_MAX_IN_FLIGHT,
+        max_deliveries=MAX_DELIVERIES,
+        start="latest",
+    ):
+        self.path = Path(path)
+        self.group = group
+        self.consumer = consumer
+        self.lease = lease
+        self.max_in_flight = max_in_flight
+        self.max_deliveries = max_deliveries
+        self.start = start
+        self.redelivered = 0
+        self.dead_lettered = 0
+        self._conn = None
+
+    def __repr__(self):
+        return f"DispatchConsumer({str(self.path)!r}, group={self.group!r}, consumer={self.consumer!r})"
+
+    @property
+    def conn(self):
+        if self._conn is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self._conn = connect(self.path)
+        return self._conn
+
+    def close(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+    def _has_work(self, now):
+        """Read-only check for new orders or expired leases, so idle polls never take the write lock"""
+        row = self.conn.execute("SELECT last_delivered FROM consumer_groups WHERE name = ?", (self.group,)).fetchone()
+        if row is None:
+            return True
+        (pending,) = self.conn.execute(
+            "SELECT EXISTS (SELECT 1 FROM dispatch WHERE seq > ?)"
+            " OR EXISTS (SELECT 1 FROM leases WHERE group_name = ? AND lease_until <= ?)",
+            (row[0], self.group, now),
+        ).fetchone()
+        return bool(pending)
+
+    def fetch(self, limit=32):
+        """Lease up to limit orders: the group's expired leases first, then new orders"""
+        now = time.time()
+        if not self._has_work(now):
+            return []
+        conn = self.conn
+        with write_transaction(conn):
+            row = conn.execute("SELECT last_delivered FROM consumer_groups WHERE name = ?", (self.group,)).fetchone()
+            if row is None:
+                if self.start == "earliest":
+                    last_delivered = 0
+                else:
+                    (last_delivered,) = conn.execute("SELECT COALESCE(MAX(seq), 0) FROM dispatch").fetchone()
+                conn.execute("INSERT INTO consumer_groups (name, last_delivered) VALUES (?, ?)", (self.group, last_delivered))
+            else:
+                (last_delivered,) = row
+
+            expired = conn.execute(
+                "SELECT seq, consumer, deliveries FROM leases WHERE group_name = ? AND lease_until <= ? ORDER BY seq LIMIT ?",
+                (self.group, now, limit),
+            ).fetchall()
+            dead = [(seq, consumer, deliveries) for seq, consumer, deliveries in expired if deliveries >= self.max_deliveries]
+            redeliver = [seq for seq, _, deliveries in expired if deliveries < self.max_deliveries]
+            if dead:
+                conn.executemany(
+                    "INSERT OR REPLACE INTO dead_letters (group_name, seq, consumer, deliveries, failed_at) VALUES (?, ?, ?, ?, ?)",
+                    [(self.group, seq, consumer, deliveries, now) for seq, consumer, deliveries in dead],
+                )
+                conn.executemany("DELETE FROM leases WHERE group_name = ? AND seq = ?", [(self.group, seq) for seq, _, _ in dead])
+                for seq, _, deliveries in dead:
+                    logger.warning(f"Stream entry {seq} was not acknowledged by group {self.group!r} after {deliveries} deliveries")
+            if redeliver:
+                conn.executemany(
+                    "UPDATE leases SET consumer = ?, lease_until = ?, deliveries = deliveries + 1 WHERE group_name = ? AND seq = ?",
+                    [(self.consumer, now + self.lease, self.group, seq) for seq in redeliver],
+                )
+
+            (in_flight,) = conn.execute("SELECT COUNT(*) FROM leases WHERE group_name = ?", (self.group,)).fetchone()
+            room = min(limit - len(redeliver), self.max_in_flight - in_flight)
+            new = []
+            if room > 0:
+                new = [
+                    seq for (seq,) in conn.execute(
+                        "SELECT seq FROM dispatch WHERE seq > ? ORDER BY seq LIMIT ?", (last_delivered, room)
+                    )
+                ]
+            if new:
+                conn.executemany(
+                    "INSERT OR REPLACE INTO leases (group_name, seq, consumer, lease_until, deliveries) VALUES (?, ?, ?, ?, 1)",
+                    [(self.group, seq, self.consumer, now + self.lease) for seq in new],
+                )
+                conn.execute("UPDATE consumer_groups SET last_delivered = ? WHERE name = ?", (new[-1], self.group))
+
+            seqs = redeliver + new
+            rows = []
+            if seqs:
+                placeholders = ",".join("?" * len(seqs))
+                rows = conn.execute(
+                    f"SELECT d.seq, d.data, l.deliveries FROM dispatch d JOIN leases l ON l.seq = d.seq AND l.group_name = ?"
+                    f" WHERE d.seq IN ({placeholders}) ORDER BY d.seq",
+                    (self.group, *seqs),
+                ).fetchall()
+        self.redelivered += len(redeliver)
+        self.dead_lettered += len(dead)
+        return [Delivery(seq, json.loads(data), deliveries) for seq, data, deliveries in rows]
+
+    def ack(self, deliveries):
+        """Acknowledge handled orders, so they are not delivered to the group again"""
+        if not deliveries:
+            return
+        with write_transaction(self.conn):
+            self.conn.executemany(
+                "DELETE FROM leases WHERE group_name = ? AND seq = ?",
+                [(self.group, delivery.seq) for delivery in deliveries],
+            )
+
+    async def orders(self, limit=32, poll_interval=DEFAULT_POLL_INTERVAL):
+        """Yield batches of leased orders as they are published; acknowledge each batch after handling it
+
+        The database is read in a worker thread, so the display's event loop
+        keeps running while another process holds the write lock.
+        """
+        while True:
+            batch = await asyncio.to_thread(self.fetch, limit)
+            if batch:
+                yield batch
+            else:
+                await asyncio.sleep(poll_interval)
+
+
+def dispatch_status(path):
+    """The order sequence, the stream and every consumer group's backlog"""
+    conn = connect(path)
+    try:
+        now = time.time()
+        row = conn.execute("SELECT value FROM sequences WHERE name = ?", (ORDER_SEQUENCE,)).fetchone()
+        stream_length, last_seq = conn.execute("SELECT COUNT(*), COALESCE(MAX(seq), 0) FROM dispatch").fetchone()
+        groups = {}
+        for name, last_delivered in conn.execute("SELECT name, last_delivered FROM consumer_groups ORDER BY name").fetchall():
+            in_flight, expired = conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(lease_until <= ?), 0) FROM leases WHERE group_name = ?", (now, name)
+            ).fetchone()
+            (dead_letters,) = conn.execute("SELECT COUNT(*) FROM dead_letters WHERE group_name = ?", (name,)).fetchone()
+            groups[name] = {
+                "backlog": last_seq - last_delivered,
+                "in_flight": in_flight,
+                "expired_leases": expired,
+                "dead_letters": dead_letters,
+            }
+        return {
+            "last_order_number": row[0] if row else 0,
+            "stream_length": stream_length,
+            "groups": groups,
+        }
+    finally:
+        conn.close()
+
+
+def describe(order):
+    extras = f" + {', '.join(order['extras'])}" if order.get("extras") else ""
+    return f"#{order.get('orderNumber')} {order.get('size')} {order.get('drinkType')} ({order.get('milk')}){extras} for {order.get('name')}"
+
+
+async def subscribe(consumer, as_json):
+    """Print orders as they are published, acknowledging each batch once printed"""
+    async for batch in consumer.orders():
+        for delivery in batch:
+            if as_json:
+                print(json.dumps({"seq": delivery.seq, "deliveries": delivery.deliveries, "order": delivery.order}), flush=True)
+            else:
+                redelivered = f" (delivery {delivery.deliveries})" if delivery.deliveries > 1 else ""
+                print(f"{describe(delivery.order)}{redelivered}", flush=True)
+        consumer.ack(batch)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Kitchen display queue of saved orders")
+    parser.add_argument("--path", help="dispatch database (default: $ORDER_DISPATCH_PATH or orders/dispatch.db)")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    subscribe_parser = subparsers.add_parser("subscribe", help="print orders as they are saved")
+    subscribe_parser.add_argument("--group", default="kitchen", help="consumer group; every group sees every order")
+    subscribe_parser.add_argument("--consumer", default=f"display-{os.getpid()}", help="name of this display in its group")
+    subscribe_parser.add_argument("--from-start", action="store_true", help="start a new group at the oldest order kept")
+    subscribe_parser.add_argument("--lease", type=float, default=DEFAULT_LEASE, help="seconds before an unacknowledged order is redelivered")
+    subscribe_parser.add_argument("--json", action="store_true", help="print one JSON object per order")
+    subparsers.add_parser("status", help="print the backlog of every consumer group")
+    trim_parser = subparsers.add_parser("trim", help="delete old orders from the stream")
+    trim_parser.add_argument("--hours", type=float, default=None, help="keep orders this recent (default: $DISPATCH_RETENTION_HOURS or 24)")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    path = Path(args.path) if args.path else order_dispatch_path()
+    if args.command == "subscribe":
+        consumer = DispatchConsumer(
+            path, args.group, args.consumer, lease=args.lease, start="earliest" if args.from_start else "latest"
+        )
+        try:
+            asyncio.run(subscribe(consumer, args.json))
+        except KeyboardInterrupt:
+            pass
+        finally:
+            consumer.close()
+    elif args.command == "status":
+        print(json.dumps(dispatch_status(path), indent=2))
+    elif args.command == "trim":
+        hours = dispatch_retention_hours() if args.hours is None else args.hours
+        conn = connect(path)
+        try:
+            print(f"Trimmed {trim(conn, time.time() - hours * 3600)} orders")
+        finally:
+            conn.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+"""Versioned wire format for streaming the order state to the frontend.
+
+Instead of re-sending the rendered drink panel on every change, the agent sends
+a full snapshot of the order state when a frontend connects (or asks to resync)
+and then only the fields that changed, tagged with a sequence number so the
+frontend can detect a missed message and ask for a new snapshot.
+
+    {"v":1,"type":"snapshot","seq":0,"state":{"drinkType":null,...},"menu":{"cupSizes":...}}
+    {"v":1,"type":"delta","seq":1,"set":{"size":"large"}}
+    {"v":1,"type":"receipt","seq":2,"receipt":{"orderNumber":"...",...}}
+
+Snapshots also carry the cup dimensions and drink colors from menu.json, so
+the frontend draws the cup from the same catalog as the agent.
+
+The frontend sends {"v":1,"type":"sync"} on SYNC_TOPIC to request a snapshot.
+The rendered HTML is still published on the legacy topics when
+DRINK_VISUALIZATION_HTML is enabled, for frontends that predate this protocol.
+"""
+
+import json
+import os
+
+import menu
+
+PROTOCOL_VERSION = 1
+
+# Topic carrying snapshots, deltas and receipts
+STATE_TOPIC = "order_state"
+# Topic the frontend uses to ask for a fresh snapshot
+SYNC_TOPIC = "order_state_sync"
+# Legacy topics carrying server-rendered HTML
+HTML_TOPIC = "drink_visualization"
+RECEIPT_HTML_TOPIC = "order_receipt"
+
+_SEPARATORS = (",", ":")
+
+
+def html_fallback_enabled():
+    """Whether the legacy server-rendered HTML topics should also be published"""
+    return os.getenv("DRINK_VISUALIZATION_HTML", "").lower() in ("1", "true", "yes")
+
+
+def encode_message(message):
+    """Serialize a protocol message as compact UTF-8 JSON"""
+    return json.dumps(message, separators=_SEPARATORS, ensure_ascii=False).encode("utf-8")
+
+
+def decode_message(payload):
+    """Parse a protocol message, returning None for anything we do not understand"""
+    try:
+        message = json.loads(payload.decode("utf-8"))
+    except (UnicodeDecodeError, ValueError):
+        return None
+    if not isinstance(message, dict) or message.get("v") != PROTOCOL_VERSION:
+        return None
+    return message
+
+
+class OrderStateEncoder:
+    """Encodes snapshots and per-field deltas of one session's order state
+
+    The encoder remembers the last state it encoded, so a delta only carries
+    the fields that changed since then, however many updates happened in
+    between.
+    """
+
+    def __init__(self):
+        self.seq = -1
+        self._last_state = None
+
+    def _next_seq(self):
+        self.seq += 1
+        return self.seq
+
+    def snapshot(self, order_state):
+        """Encode the full order state"""
+        self._last_state = order_state.copy()
+        return encode_message({
+            "v": PROTOCOL_VERSION,
+            "type": "snapshot",
+            "seq": self._next_seq(),
+            "state": order_state.to_dict(),
+            "menu": menu.CUP_STYLE,
+        })
+
+    def delta(self, order_state):
+        """Encode the fields changed since the last message, or None if nothing changed"""
+        if self._last_state is None:
+            return self.snapshot(order_state)
+        changed = order_state.changes(self._last_state)
+        if not changed:
+            return None
+        self._last_state = order_state.copy()
+        return encode_message({
+            "v": PROTOCOL_VERSION,
+            "type": "delta",
+            "seq": self._next_seq(),
+            "set": changed,
+        })
+
+    def receipt(self, receipt):
+        """Encode a completed order receipt"""
+        return encode_message({
+            "v": PROTOCOL_VERSION,
+            "type": "receipt",
+            "seq": self._next_seq(),
+            "receipt": receipt,
+        })
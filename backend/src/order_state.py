@@ -0,0 +1,222 @@
+"""The order being taken in a session.
+
+OrderState replaces the plain dict the tools used to edit, and is kept small
+since every session holds one, plus a shadow copy per speculative turn:
+
+- the drink type, size and milk are small integer codes into the menu
+  category's canonical names (0 when not given yet), so a state holds no
+  strings besides the customer's name and comparing states compares ints
+- the extras are a bitset over the menu's extras, so adding one is an OR
+  rather than a list search; they are listed in menu order
+- the required fields still missing are a bitmask updated by the setters,
+  so completeness is never re-derived, and the list of missing fields for
+  each mask is computed once
+
+It is serialized in one place: to_dict() is the form the frontend protocol,
+the receipt and the order store use, changes() the fields a protocol delta
+carries, and describe() the line the LLM is given. Only canonical menu
+values can be set, since the tools look free text up in the menu first;
+anything else raises ValueError, as does a blank name.
+"""
+
+from functools import lru_cache
+from typing import ClassVar
+
+import menu
+
+# Code 0 is "not given"
+DRINK_NAMES = (None, *menu.DRINKS.names)
+SIZE_NAMES = (None, *menu.SIZES.names)
+MILK_NAMES = (None, *menu.MILKS.names)
+DRINK_CODES = {name: code for code, name in enumerate(DRINK_NAMES)}
+SIZE_CODES = {name: code for code, name in enumerate(SIZE_NAMES)}
+MILK_CODES = {name: code for code, name in enumerate(MILK_NAMES)}
+
+EXTRA_NAMES = menu.EXTRAS.names
+EXTRA_BITS = {name: 1 << bit for bit, name in enumerate(EXTRA_NAMES)}
+
+# Missing-field bits, in the order the agent asks for them
+MISSING_DRINK, MISSING_SIZE, MISSING_MILK, MISSING_NAME = 1, 2, 4, 8
+MISSING_ALL = 15
+MISSING_LABELS = ("drink type", "size", "milk preference", "name")
+_MISSING_FIELDS = tuple(
+    tuple(label for bit, label in enumerate(MISSING_LABELS) if mask >> bit & 1) for mask in range(MISSING_ALL + 1)
+)
+
+
+@lru_cache(maxsize=1024)
+def extra_names(bits):
+    """The extras in a bitset, in menu order"""
+    return tuple(name for name, bit in EXTRA_BITS.items() if bits & bit)
+
+
+class OrderState:
+    """Drink, size, milk, extras and name of the order being taken"""
+
+    __slots__ = ("_drink", "_extras", "_milk", "_missing", "_name", "_size")
+
+    def __init__(self):
+        self._drink = self._size = self._milk = self._extras = 0
+        self._name = None
+        self._missing = MISSING_ALL
+
+    @property
+    def drink_type(self):
+        return DRINK_NAMES[self._drink]
+
+    @drink_type.setter
+    def drink_type(self, value):
+        code = DRINK_CODES.get(value)
+        if code is None:
+            raise ValueError(f"{value!r} is not a drink on the menu")
+        self._drink = code
+        self._missing = self._missing & ~MISSING_DRINK if code else self._missing | MISSING_DRINK
+
+    @property
+    def size(self):
+        return SIZE_NAMES[self._size]
+
+    @size.setter
+    def size(self, value):
+        code = SIZE_CODES.get(value)
+        if code is None:
+            raise ValueError(f"{value!r} is not a size on the menu")
+        self._size = code
+        self._missing = self._missing & ~MISSING_SIZE if code else self._missing | MISSING_SIZE
+
+    @property
+    def milk(self):
+        return MILK_NAMES[self._milk]
+
+    @milk.setter
+    def milk(self, value):
+        code = MILK_CODES.get(value)
+        if code is None:
+            raise ValueError(f"{value!r} is not a milk on the menu")
+        self._milk = code
+        self._missing = self._missing & ~MISSING_MILK if code else self._missing | MISSING_MILK
+
+    @property
+    def name(self):
+        return self._name
+
+    @name.setter
+    def name(self, value):
+        if value is not None:
+            value = value.strip()
+            if not value:
+                raise ValueError("a name cannot be empty")
+        self._name = value
+        self._missing = self._missing & ~MISSING_NAME if value else self._missing | MISSING_NAME
+
+    @property
+    def extras(self):
+        return extra_names(self._extras)
+
+    def add_extra(self, extra):
+        """Add an extra; returns whether it was not in the order yet"""
+        bit = EXTRA_BITS.get(extra)
+        if bit is None:
+            raise ValueError(f"{extra!r} is not an extra on the menu")
+        added = not self._extras & bit
+        self._extras |= bit
+        return added
+
+    def has_extra(self, extra):
+        return bool(self._extras & EXTRA_BITS.get(extra, 0))
+
+    # Setters for the fields of to_dict(), except extras
+    _SETTERS: ClassVar[dict] = {
+        "drinkType": drink_type.fset,
+        "size": size.fset,
+        "milk": milk.fset,
+        "name": name.fset,
+    }
+
+    def update(self, fields):
+        """Set fields given by their to_dict() names"""
+        for field, value in fields.items():
+            self._SETTERS[field](self, value)
+
+    @property
+    def complete(self):
+        return not self._missing
+
+    @property
+    def empty(self):
+        return self._missing == MISSING_ALL and not self._extras
+
+    def missing_fields(self):
+        """Labels of the required fields not given yet, in the order to ask for them"""
+        return _MISSING_FIELDS[self._missing]
+
+    def copy(self):
+        state = OrderState.__new__(OrderState)
+        state._drink, state._size, state._milk = self._drink, self._size, self._milk
+        state._extras, state._name, state._missing = self._extras, self._name, self._missing
+        return state
+
+    def to_dict(self):
+        """The state as the frontend protocol, receipts and the order store see it"""
+        return {
+            "drinkType": DRINK_NAMES[self._drink],
+            "size": SIZE_NAMES[self._size],
+            "milk": MILK_NAMES[self._milk],
+            "extras": list(extra_names(self._extras)),
+            "name": self._name,
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        """A state from to_dict() output or a stored order, leaving out values no longer on the menu"""
+        state = cls()
+        state._drink = DRINK_CODES.get(data.get("drinkType"), 0)
+        state._size = SIZE_CODES.get(data.get("size"), 0)
+        state._milk = MILK_CODES.get(data.get("milk"), 0)
+        for extra in data.get("extras") or ():
+            state._extras |= EXTRA_BITS.get(extra, 0)
+        state._name = (data.get("name") or "").strip() or None
+        state._missing = (
+            (not state._drink) * MISSING_DRINK
+            | (not state._size) * MISSING_SIZE
+            | (not state._milk) * MISSING_MILK
+            | (not state._name) * MISSING_NAME
+        )
+        return state
+
+    def changes(self, other):
+        """The to_dict() fields that differ from another state, with this state's values"""
+        changed = {}
+        if self._drink != other._drink:
+            changed["drinkType"] = DRINK_NAMES[self._drink]
+        if self._size != other._size:
+            changed["size"] = SIZE_NAMES[self._size]
+        if self._milk != other._milk:
+            changed["milk"] = MILK_NAMES[self._milk]
+        if self._extras != other._extras:
+            changed["extras"] = list(extra_names(self._extras))
+        if self._name != other._name:
+            changed["name"] = self._name
+        return changed
+
+    def describe(self):
+        """One line for the LLM, e.g. "drink type: latte; size: not given yet; ...\""""
+        fields = (
+            ("drink type", DRINK_NAMES[self._drink]),
+            ("size", SIZE_NAMES[self._size]),
+            ("milk", MILK_NAMES[self._milk]),
+            ("extras", ", ".join(extra_names(self._extras)) or "none"),
+            ("name", self._name),
+        )
+        return "; ".join(f"{label}: {value or 'not given yet'}" for label, value in fields)
+
+    def __eq__(self, other):
+        if not isinstance(other, OrderState):
+            return NotImplemented
+        return (
+            self._drink == other._drink and self._size == other._size and self._milk == other._milk
+            and self._extras == other._extras and self._name == other._name
+        )
+
+    def __repr__(self):
+        return f"OrderState({self.to_dict()!r})"
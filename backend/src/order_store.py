@@ -0,0 +1,364 @@
+"""Durable order storage with a background writer and group commit.
+
+Orders used to be written as one pretty-printed JSON file per order, straight
+from the tool call on the event loop. The stores here hand each order to a
+writer thread instead; the writer takes every order that is waiting, writes
+them in one batch and syncs the batch to disk with a single fsync before
+resolving the callers' futures. Awaiting ``save`` therefore never blocks the
+event loop, and a burst of orders costs one fsync rather than one per order.
+
+Two backends are available, selected with ORDER_STORE (default ``jsonl``):
+
+- ``jsonl``: an append-only JSON Lines log (``orders/orders.jsonl``). Each
+  batch is a single ``write`` on a file opened in append mode, so job
+  processes on the same host can share the log.
+- ``sqlite``: a SQLite database in WAL mode (``orders/orders.db``).
+
+ORDER_STORE_PATH overrides the file location. Orders saved by older versions
+of the agent as ``orders/order_*.json`` can be imported with:
+
+    uv run python src/order_store.py import orders
+"""
+
+import argparse
+import asyncio
+import atexit
+import json
+import logging
+import os
+import queue
+import sqlite3
+import threading
+import uuid
+from pathlib import Path
+
+logger = logging.getLogger("agent")
+
+DEFAULT_ORDERS_DIR = Path("orders")
+
+# Longest a batch waits for more orders after the first one arrives (seconds)
+DEFAULT_COMMIT_DELAY = 0.002
+DEFAULT_MAX_BATCH = 512
+
+_SEPARATORS = (",", ":")
+
+
+class BatchWriter:
+    """Writer thread committing every queued record in one batch; subclasses implement the batch write"""
+
+    def __init__(self, path, *, commit_delay=DEFAULT_COMMIT_DELAY, max_batch=DEFAULT_MAX_BATCH):
+        self.path = Path(path)
+        self.commit_delay = commit_delay
+        self.max_batch = max_batch
+        self.batches_committed = 0
+        self.records_committed = 0
+        self._queue = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+        self._closed = False
+        # Set if the writer could not open the store; fails every record from then on
+        self._error = None
+
+    def __repr__(self):
+        return f"{type(self).__name__}({str(self.path)!r})"
+
+    def start(self):
+        """Start the writer thread if it is not already running"""
+        with self._lock:
+            if self._thread is None and not self._closed:
+                self._thread = threading.Thread(target=self._writer, name=f"{type(self).__name__}-writer", daemon=True)
+                self._thread.start()
+                atexit.register(self.close)
+
+    def submit(self, record, on_commit=None):
+        """Queue a record for the writer; on_commit(error) is called from the writer thread"""
+        if self._closed:
+            raise RuntimeError(f"{self!r} is closed")
+        self.start()
+        with self._lock:
+            error = self._error
+            if error is None:
+                self._queue.put((record, on_commit))
+                return
+        if on_commit is not None:
+            on_commit(error)
+
+    def _writer(self):
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self._open()
+        except Exception as e:
+            logger.error(f"Failed to open {self!r}: {e}")
+            self._fail(e)
+            return
+        try:
+            while True:
+                item = self._queue.get()
+                if item is None:
+                    return
+                batch = [item]
+                stop = self._collect(batch)
+                self._commit(batch)
+                if stop:
+                    return
+        finally:
+            self._close()
+
+    def _fail(self, error):
+        """Fail the queued records and every later submission with the error that stopped the writer"""
+        with self._lock:
+            self._error = error
+        while True:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                return
+            if item is not None and item[1] is not None:
+                item[1](error)
+
+    def _collect(self, batch):
+        """Add waiting records to the batch; returns True if the store is closing"""
+        try:
+            while len(batch) < self.max_batch:
+                item = self._queue.get(timeout=self.commit_delay) if self.commit_delay else self._queue.get_nowait()
+                if item is None:
+                    return True
+                batch.append(item)
+        except queue.Empty:
+            pass
+        return False
+
+    def _commit(self, batch):
+        error = None
+        try:
+            self._write_batch([record for record, _ in batch])
+            self.batches_committed += 1
+            self.records_committed += len(batch)
+        except Exception as e:
+            logger.error(f"Failed to write {len(batch)} records to {self!r}: {e}")
+            error = e
+        for _, on_commit in batch:
+            if on_commit is not None:
+                on_commit(error)
+
+    def close(self):
+        """Write everything still queued and stop the writer thread"""
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            thread = self._thread
+        if thread is not None:
+            self._queue.put(None)
+            thread.join()
+
+    def _open(self):
+        pass
+
+    def _close(self):
+        pass
+
+    def _write_batch(self, records):
+        raise NotImplementedError
+
+
+class OrderStore(BatchWriter):
+    """Base class for order stores"""
+
+    async def save(self, order):
+        """Durably store an order and return it with its assigned id"""
+        record = {**order, "id": order.get("id") or uuid.uuid4().hex}
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self.submit(record, lambda error: loop.call_soon_threadsafe(resolve_future, future, record, error))
+        return await future
+
+    def read_all(self):
+        """Yield every stored order, oldest first"""
+        raise NotImplementedError
+
+    def read_since(self, cursor=None):
+        """Return (orders, cursor) for the orders stored after a cursor from an earlier call
+
+        Pass cursor=None to read from the beginning. Cursors are opaque,
+        JSON-serializable values that stay valid while the store is only
+        appended to.
+        """
+        raise NotImplementedError
+
+    def order_ids(self):
+        """The set of stored order ids"""
+        return {order["id"] for order in self.read_all()}
+
+
+def resolve_future(future, record, error):
+    if future.done():
+        return
+    if error is None:
+        future.set_result(record)
+    else:
+        future.set_exception(error)
+
+
+class JsonlOrderStore(OrderStore):
+    """Append-only JSON Lines order log, one fsync per batch"""
+
+    def _open(self):
+        self._file = open(self.path, "a", encoding="utf-8")
+
+    def _close(self):
+        self._file.close()
+
+    def _write_batch(self, records):
+        data = "".join(json.dumps(record, separators=_SEPARATORS, ensure_ascii=False) + "\n" for record in records)
+        self._file.write(data)
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+    def read_all(self):
+        if not self.path.exists():
+            return
+        with open(self.path, encoding="utf-8") as f:
+            for line in f:
+                # A crash mid-write can leave a torn last line; skip it
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    continue
+
+    def read_since(self, cursor=None):
+        offset = cursor or 0
+        if not self.path.exists():
+            return [], offset
+        with open(self.path, "rb") as f:
+            f.seek(offset)
+            data = f.read()
+        # Only consume complete lines; a batch may still be being appended
+        end = data.rfind(b"\n") + 1
+        orders = []
+        for line in data[:end].splitlines():
+            try:
+                orders.append(json.loads(line))
+            except ValueError:
+                continue
+        return orders, offset + end
+
+
+class SqliteOrderStore(OrderStore):
+    """SQLite order table in WAL mode, one transaction per batch"""
+
+    _SCHEMA = """
+        CREATE TABLE IF NOT EXISTS orders (
+            seq INTEGER PRIMARY KEY AUTOINCREMENT,
+            id TEXT NOT NULL UNIQUE,
+            timestamp TEXT,
+            name TEXT,
+            data TEXT NOT NULL
+        )
+    """
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=FULL")
+        conn.execute(self._SCHEMA)
+        return conn
+
+    def _open(self):
+        self._conn = self._connect()
+
+    def _close(self):
+        self._conn.close()
+
+    def _write_batch(self, records):
+        with self._conn:
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO orders (id, timestamp, name, data) VALUES (?, ?, ?, ?)",
+                [
+                    (record["id"], record.get("timestamp"), record.get("name"),
+                     json.dumps(record, separators=_SEPARATORS, ensure_ascii=False))
+                    for record in records
+                ],
+            )
+
+    def read_all(self):
+        if not self.path.exists():
+            return
+        conn = self._connect()
+        try:
+            for (data,) in conn.execute("SELECT data FROM orders ORDER BY seq"):
+                yield json.loads(data)
+        finally:
+            conn.close()
+
+    def read_since(self, cursor=None):
+        last_seq = cursor or 0
+        if not self.path.exists():
+            return [], last_seq
+        conn = self._connect()
+        try:
+            rows = conn.execute("SELECT seq, data FROM orders WHERE seq > ? ORDER BY seq", (last_seq,)).fetchall()
+        finally:
+            conn.close()
+        if rows:
+            last_seq = rows[-1][0]
+        return [json.loads(data) for _, data in rows], last_seq
+
+
+BACKENDS = {
+    "jsonl": (JsonlOrderStore, "orders.jsonl"),
+    "sqlite": (SqliteOrderStore, "orders.db"),
+}
+
+
+def open_order_store(backend=None, path=None, **kwargs):
+    """Create the order store configured by ORDER_STORE / ORDER_STORE_PATH"""
+    backend = backend or os.getenv("ORDER_STORE", "jsonl")
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown order store backend {backend!r}, expected one of {sorted(BACKENDS)}")
+    store_cls, filename = BACKENDS[backend]
+    path = path or os.getenv("ORDER_STORE_PATH") or DEFAULT_ORDERS_DIR / filename
+    return store_cls(path, **kwargs)
+
+
+def import_legacy_orders(store, orders_dir=DEFAULT_ORDERS_DIR):
+    """Copy orders saved as orders/order_*.json into the store; returns the number imported
+
+    Each legacy order keeps its file name as its id, so running the import
+    again does not duplicate orders.
+    """
+    existing = store.order_ids()
+    imported = 0
+    for filepath in sorted(Path(orders_dir).glob("order_*.json")):
+        if filepath.stem in existing:
+            continue
+        try:
+            with open(filepath, encoding="utf-8") as f:
+                order = json.load(f)
+        except (OSError, ValueError) as e:
+            logger.warning(f"Skipping unreadable order file {filepath}: {e}")
+            continue
+        store.submit({"id": filepath.stem, **order})
+        imported += 1
+    return imported
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Manage the order store")
+    parser.add_argument("--backend", choices=sorted(BACKENDS), help="order store backend (default: $ORDER_STORE or jsonl)")
+    parser.add_argument("--path", help="order store file (default: $ORDER_STORE_PATH or orders/<backend file>)")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    import_parser = subparsers.add_parser("import", help="import legacy orders/order_*.json files")
+    import_parser.add_argument("orders_dir", nargs="?", default=str(DEFAULT_ORDERS_DIR))
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    store = open_order_store(args.backend, args.path)
+    if args.command == "import":
+        imported = import_legacy_orders(store, args.orders_dir)
+        store.close()
+        print(f"Imported {imported} orders into {store!r}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,222 @@
+"""Deterministic order-slot extraction for plain menu phrases.
+
+Most customer turns are short menu phrases such as "medium cappuccino",
+"almond milk" or "no milk". Those do not need the LLM: the extractor matches
+the final transcript against an Aho-Corasick automaton over the menu aliases and
+maps it straight onto the order slots. The automaton works on words rather
+than characters, so "late" never matches inside "chocolate".
+
+A transcript is only handled here when every word is either part of a menu
+phrase or a filler word ("I'd like a ... please"), no slot gets two
+different values and it is not a question. Anything else, including names,
+negations, questions and small talk, is left to the LLM.
+"""
+
+import os
+import re
+import time
+from collections import deque
+from dataclasses import dataclass
+
+import menu
+
+# Canonical menu names and the phrases customers use for them, per order slot
+SLOT_SYNONYMS = {
+    field: {name: category.aliases(name) for name in category.names}
+    for field, category in menu.FIELD_CATEGORIES.items()
+}
+
+# Words that may surround menu phrases without changing their meaning
+FILLER_WORDS = frozenset({
+    "a", "an", "the", "i", "i'd", "id", "i'll", "ill", "i'm", "im", "we'd", "we'll",
+    "like", "would", "could", "can", "may", "get", "have", "want", "take", "make",
+    "it", "that", "please", "one", "just", "with", "and", "also", "some", "of", "me",
+    "for", "um", "uh", "actually", "instead", "let's", "lets", "go", "oh", "hi", "hey",
+    "thanks", "thank", "you", "size", "milk",
+})
+
+# Opening words of a question about the menu ("would you have almond milk",
+# "do you do oat milk"), which the LLM answers rather than the fast path
+QUESTION_WORDS = frozenset({"do", "does", "is", "are", "what", "which", "how", "why", "whats", "what's"})
+QUESTION_OPENINGS = frozenset({
+    ("would", "you"), ("could", "you"), ("can", "you"), ("will", "you"),
+    ("have", "you"), ("you", "have"), ("you", "got"), ("got", "any"),
+})
+# Skipped before the opening words
+INTERJECTIONS = frozenset({"um", "uh", "oh", "hi", "hey", "so", "and"})
+
+_WORD_RE = re.compile(r"[a-z]+(?:'[a-z]+)?")
+
+
+def slot_fast_path_enabled():
+    """Whether transcripts are matched against the menu before going to the LLM (SLOT_FAST_PATH)"""
+    return os.getenv("SLOT_FAST_PATH", "1").lower() not in ("0", "false", "no")
+
+
+def tokenize(text):
+    """Lowercase words of a transcript, without punctuation"""
+    return _WORD_RE.findall(text.lower())
+
+
+def is_question(words):
+    """Whether a transcript asks something rather than orders it
+
+    Question marks are not enough, since polite orders ("Can I get a small
+    mocha?") are transcribed with one too; the opening words tell them apart.
+    """
+    opening = tuple(word for word in words if word not in INTERJECTIONS)[:2]
+    return bool(opening) and (opening[0] in QUESTION_WORDS or opening in QUESTION_OPENINGS)
+
+
+class PhraseAutomaton:
+    """Word-level Aho-Corasick automaton returning the leftmost-longest phrase matches"""
+
+    def __init__(self, phrases):
+        # Node 0 is the root; each node has goto edges, a failure link and its outputs
+        self._goto = [{}]
+        self._fail = [0]
+        self._out = [[]]
+        for phrase, value in phrases:
+            self._add(tokenize(phrase), value)
+        self._build_failure_links()
+
+    def _add(self, words, value):
+        node = 0
+        for word in words:
+            nxt = self._goto[node].get(word)
+            if nxt is None:
+                nxt = len(self._goto)
+                self._goto[node][word] = nxt
+                self._goto.append({})
+                self._fail.append(0)
+                self._out.append([])
+            node = nxt
+        self._out[node].append((len(words), value))
+
+    def _build_failure_links(self):
+        pending = deque(self._goto[0].values())
+        while pending:
+            node = pending.popleft()
+            for word, child in self._goto[node].items():
+                pending.append(child)
+                fail = self._fail[node]
+                while fail and word not in self._goto[fail]:
+                    fail = self._fail[fail]
+                self._fail[child] = self._goto[fail].get(word, 0)
+                self._out[child] = self._out[child] + self._out[self._fail[child]]
+
+    def find_all(self, words):
+        """Yield (start, end, value) for every phrase occurrence in a word list"""
+        node = 0
+        for i, word in enumerate(words):
+            while node and word not in self._goto[node]:
+                node = self._fail[node]
+            node = self._goto[node].get(word, 0)
+            for length, value in self._out[node]:
+                yield i + 1 - length, i + 1, value
+
+    def match(self, words):
+        """Non-overlapping matches, preferring the leftmost and then the longest phrase"""
+        matches = sorted(self.find_all(words), key=lambda m: (m[0], m[0] - m[1]))
+        selected = []
+        covered_to = 0
+        for start, end, value in matches:
+            if start >= covered_to:
+                selected.append((start, end, value))
+                covered_to = end
+        return selected
+
+
+class SlotExtractor:
+    """Maps plain menu phrases onto order slots, or returns None when the LLM is needed"""
+
+    def __init__(self, slot_synonyms=SLOT_SYNONYMS, filler_words=FILLER_WORDS):
+        self.filler_words = filler_words
+        self.automaton = PhraseAutomaton(
+            (phrase, (slot, canonical))
+            for slot, synonyms in slot_synonyms.items()
+            for canonical, phrases in synonyms.items()
+            for phrase in phrases
+        )
+
+    def extract(self, text):
+        """Return {slot: value} (extras as a list) for a fully understood transcript, else None"""
+        words = tokenize(text)
+        if not words or is_question(words):
+            return None
+
+        slots = {}
+        covered = [False] * len(words)
+        for start, end, (slot, value) in self.automaton.match(words):
+            covered[start:end] = [True] * (end - start)
+            if slot == "extras":
+                extras = slots.setdefault("extras", [])
+                if value not in extras:
+                    extras.append(value)
+            elif slots.setdefault(slot, value) != value:
+                # "a small large latte": let the LLM sort it out
+                return None
+
+        if not slots:
+            return None
+        for word, is_covered in zip(words, covered):
+            if not is_covered and word not in self.filler_words:
+                return None
+        return slots
+
+
+# LLM calls a slot-filling turn normally costs: one to call the tool, one for the reply
+LLM_CALLS_PER_SLOT_TURN = 2
+
+
+@dataclass
+class FastPathStats:
+    """Hit rate of the slot fast path and the LLM time it saved"""
+
+    turns: int = 0
+    hits: int = 0
+    extract_time_total: float = 0.0
+    llm_requests: int = 0
+    llm_latency_total: float = 0.0
+    time_saved_total: float = 0.0
+
+    @property
+    def hit_rate(self):
+        return self.hits / self.turns if self.turns else 0.0
+
+    @property
+    def avg_llm_latency(self):
+        return self.llm_latency_total / self.llm_requests if self.llm_requests else 0.0
+
+    def record_llm_latency(self, duration):
+        self.llm_requests += 1
+        self.llm_latency_total += duration
+
+    def record_turn(self, hit, elapsed):
+        """Record one user turn; returns the estimated LLM time saved by a hit (seconds)"""
+        self.turns += 1
+        self.extract_time_total += elapsed
+        if not hit:
+            return 0.0
+        self.hits += 1
+        saved = max(LLM_CALLS_PER_SLOT_TURN * self.avg_llm_latency - elapsed, 0.0)
+        self.time_saved_total += saved
+        return saved
+
+    def summary(self):
+        avg_extract = self.extract_time_total / self.turns if self.turns else 0.0
+        return {
+            "turns": self.turns,
+            "hits": self.hits,
+            "hit_rate": round(self.hit_rate, 3),
+            "extract_avg_us": round(avg_extract * 1e6, 1),
+            "llm_latency_avg_ms": round(self.avg_llm_latency * 1000, 1),
+            "time_saved_s": round(self.time_saved_total, 2),
+        }
+
+
+def timed_extract(extractor, text):
+    """Run the extractor and return (slots, elapsed seconds)"""
+    start = time.perf_counter()
+    slots = extractor.extract(text)
+    return slots, time.perf_counter() - start
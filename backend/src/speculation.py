@@ -0,0 +1,157 @@
+"""Speculative turns: order changes held back until the turn is confirmed.
+
+With preemptive generation the session starts the LLM (and speech synthesis)
+on the final transcript, before the end of the customer's turn is confirmed,
+which saves the LLM's time to first token on every turn. The speech it
+prepares is dropped if the customer keeps talking.
+
+Tool calls only run once their speech is played, but the customer can still
+talk over the agent while they run, which interrupts the speech and may
+cancel its tools wherever they are. So every tool call works on a shadow
+copy of the order state belonging to its speech, and its side effects
+(publishing the cup, persisting the order, sending the receipt) are buffered
+there. What happens to them follows what the LLM is told:
+
+- once the tool calls of a step have returned, the session emits
+  function_tools_executed and adds their outputs to the chat context, even
+  if the speech was interrupted while they ran in the background; the shadow
+  state then becomes the order state and the side effects run, so an order
+  the LLM was told is saved is saved
+- if the tool calls were cancelled, no outputs reach the chat context and no
+  event is emitted; the shadow state and side effects are discarded when the
+  speech is done, so the frontend never shows a cup the LLM was not told
+  about and a half-finished order is never saved
+
+Outside a tool call (the slot fast path, snapshots, benchmarks calling tools
+directly) changes apply and side effects run immediately.
+"""
+
+import contextvars
+import functools
+import logging
+import os
+from dataclasses import dataclass
+
+logger = logging.getLogger("agent")
+
+_CURRENT_TURN = contextvars.ContextVar("speculative_turn", default=None)
+
+
+def preemptive_generation_enabled():
+    """Whether the LLM starts before the end of turn is confirmed (PREEMPTIVE_GENERATION)"""
+    return os.getenv("PREEMPTIVE_GENERATION", "1").lower() not in ("0", "false", "no")
+
+
+def current_turn():
+    """The speculative turn of the tool call running in this task, or None"""
+    return _CURRENT_TURN.get()
+
+
+def run_or_defer(key, effect):
+    """Run effect now, or hold it back until the current speculative turn is committed
+
+    Effects deferred under the same key replace each other, keeping only the
+    position of the first.
+    """
+    turn = _CURRENT_TURN.get()
+    if turn is None:
+        effect()
+    else:
+        turn.effects[key] = effect
+
+
+class SpeculativeTurn:
+    """Shadow order state and buffered side effects of one speech's tool calls"""
+
+    def __init__(self, speech_handle, state):
+        self.speech_handle = speech_handle
+        self.state = state
+        self.effects = {}
+        self.call_ids = set()
+
+    def __repr__(self):
+        return f"SpeculativeTurn({self.speech_handle.id!r}, effects={list(self.effects)})"
+
+
+@dataclass
+class SpeculationStats:
+    """How many speculative turns were committed and discarded"""
+
+    committed: int = 0
+    discarded: int = 0
+    discarded_effects: int = 0
+
+    def summary(self):
+        return {
+            "committed": self.committed,
+            "discarded": self.discarded,
+            "discarded_effects": self.discarded_effects,
+        }
+
+
+class TurnBuffer:
+    """The open speculative turns of one session, keyed by speech id
+
+    commit(turn) is called with each turn whose tool outputs reached the chat
+    context.
+    """
+
+    def __init__(self, commit):
+        self._commit = commit
+        self._turns = {}
+        self.stats = SpeculationStats()
+
+    def begin(self, context, state):
+        """The open turn of the tool call's speech, starting from a copy of state if there is none"""
+        speech_handle = getattr(context, "speech_handle", None)
+        if speech_handle is None:
+            return None
+        turn = self._turns.get(speech_handle.id)
+        if turn is None:
+            turn = self._turns[speech_handle.id] = SpeculativeTurn(speech_handle, state.copy())
+            speech_handle.add_done_callback(lambda handle: self._discard(handle.id, turn))
+        turn.call_ids.add(context.function_call.call_id)
+        return turn
+
+    def on_tools_executed(self, ev):
+        """Session function_tools_executed handler: commit the turns whose tool outputs reach the chat context
+
+        The outputs are added to the chat context whether or not the speech was
+        interrupted meanwhile, so its interruption does not matter here.
+        """
+        call_ids = {
+            call.call_id for call, output in zip(ev.function_calls, ev.function_call_outputs) if output is not None
+        }
+        for speech_id, turn in list(self._turns.items()):
+            if not turn.call_ids & call_ids:
+                continue
+            # A later tool step of the same speech starts from the committed state
+            del self._turns[speech_id]
+            self.stats.committed += 1
+            self._commit(turn)
+
+    def _discard(self, speech_id, turn):
+        if self._turns.get(speech_id) is not turn:
+            return
+        del self._turns[speech_id]
+        self.stats.discarded += 1
+        self.stats.discarded_effects += len(turn.effects)
+        logger.info(f"Discarded speculative turn {turn!r}: the speech ended without its tool outputs")
+
+
+def speculative(tool):
+    """Run a tool method against its speech's shadow order state (see TurnBuffer)"""
+
+    @functools.wraps(tool)
+    async def wrapper(self, *args, **kwargs):
+        context = kwargs.get("context", args[0] if args else None)
+        turn = self.turns.begin(context, self.committed_state)
+        if turn is None:
+            return await tool(self, *args, **kwargs)
+        token = _CURRENT_TURN.set(turn)
+        try:
+            return await tool(self, *args, **kwargs)
+        finally:
+            _CURRENT_TURN.reset(token)
+
+    return wrapper
@@ -0,0 +1,426 @@
+"""On-disk cache of synthesized speech for the agent's recurring phrases.
+
+A lot of what the agent says comes from a small, predictable set: the fast
+path confirmations and follow-up questions, the tool confirmations the LLM
+tends to repeat, and so on. CachedTTS wraps the session's TTS and keeps the
+raw PCM of such sentences in a directory shared by all job processes,
+bounded by total size with least-recently-used eviction. A cached sentence
+is played straight from disk with no network round trip; anything else
+falls through to the wrapped TTS.
+
+CachedTTS streams like the wrapped TTS. The session's text is split into
+sentences as it arrives: cached sentences are pushed from disk, and each run
+of consecutive uncached sentences goes to one stream of the wrapped TTS (for
+Murf, over its pooled websocket), so a reply with nothing cached costs what
+it did without the cache. A run of a single sentence is cached for next time.
+Known phrases can be rendered ahead of time, at deploy time with:
+
+    uv run python src/tts_cache.py prewarm
+
+or in the background during the first session of a new deployment (see
+TTS_CACHE_FILL). TTS_CACHE_DIR and TTS_CACHE_MAX_MB configure the cache.
+
+Cache files are read and written on worker threads, so a slow disk never
+stalls the event loop; newly synthesized sentences are written in the
+background while the reply goes on.
+"""
+
+import argparse
+import asyncio
+import hashlib
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from pathlib import Path
+
+from livekit.agents import (
+    DEFAULT_API_CONNECT_OPTIONS,
+    APIConnectOptions,
+    tokenize,
+    tts,
+    utils,
+)
+
+logger = logging.getLogger("agent")
+
+DEFAULT_CACHE_DIR = Path("tts_cache")
+DEFAULT_MAX_MB = 64
+
+# Request ids of streams whose first audio was cached start with this
+CACHE_REQUEST_PREFIX = "ttscache-"
+
+
+def tts_cache_fill_enabled():
+    """Whether sessions synthesize missing phrases in the background (TTS_CACHE_FILL)"""
+    return os.getenv("TTS_CACHE_FILL", "1").lower() not in ("0", "false", "no")
+
+
+class PhraseCache:
+    """Raw PCM files keyed by voice and text, with a total size bound and LRU eviction"""
+
+    def __init__(self, cache_dir, max_bytes):
+        self.cache_dir = Path(cache_dir)
+        self.max_bytes = max_bytes
+        self.total_bytes = 0
+        self.evicted = 0
+        self._entries = OrderedDict()
+        # get() and put() run on worker threads; the lock guards the index, not the files
+        self._lock = threading.Lock()
+        self._load_index()
+
+    def __repr__(self):
+        return f"PhraseCache({str(self.cache_dir)!r}, {len(self._entries)} phrases, {self.total_bytes} bytes)"
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        return key in self._entries or self._path(key).exists()
+
+    def _load_index(self):
+        if not self.cache_dir.is_dir():
+            return
+        files = []
+        for path in self.cache_dir.glob("*.pcm"):
+            try:
+                stat = path.stat()
+            except OSError:
+                continue
+            files.append((stat.st_mtime, path.stem, stat.st_size))
+        # Oldest first, so the least recently used entries are evicted first
+        for _, key, size in sorted(files):
+            self._entries[key] = size
+            self.total_bytes += size
+
+    @staticmethod
+    def key(voice, sample_rate, num_channels, text):
+        """Cache key for one sentence in one voice and audio format"""
+        normalized = " ".join(text.split())
+        return hashlib.sha1(f"{voice}|{sample_rate}|{num_channels}|{normalized}".encode()).hexdigest()
+
+    def _path(self, key):
+        return self.cache_dir / f"{key}.pcm"
+
+    def get(self, key):
+        """The cached PCM for a key, or None"""
+        path = self._path(key)
+        try:
+            data = path.read_bytes()
+            os.utime(path)
+        except OSError:
+            # Never cached, or evicted by another job process sharing the directory
+            with self._lock:
+                self._forget(key)
+            return None
+        with self._lock:
+            # Cached by another job process since the index was loaded, or rewritten since
+            self._forget(key)
+            self._entries[key] = len(data)
+            self.total_bytes += len(data)
+        return data
+
+    def put(self, key, data):
+        """Store PCM for a key, evicting the least recently used phrases beyond the size bound"""
+        if not data or len(data) > self.max_bytes:
+            return
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        path = self._path(key)
+        tmp_path = path.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+        tmp_path.write_bytes(data)
+        os.replace(tmp_path, path)
+        evicted = []
+        with self._lock:
+            self._forget(key)
+            self._entries[key] = len(data)
+            self.total_bytes += len(data)
+            while self.total_bytes > self.max_bytes:
+                oldest = next(iter(self._entries))
+                self._forget(oldest)
+                evicted.append(oldest)
+            self.evicted += len(evicted)
+        for oldest in evicted:
+            self._path(oldest).unlink(missing_ok=True)
+
+    def _forget(self, key):
+        size = self._entries.pop(key, None)
+        if size is not None:
+            self.total_bytes -= size
+
+
+def open_phrase_cache(cache_dir=None, max_mb=None):
+    """Open the phrase cache configured by TTS_CACHE_DIR / TTS_CACHE_MAX_MB"""
+    cache_dir = cache_dir or os.getenv("TTS_CACHE_DIR") or DEFAULT_CACHE_DIR
+    max_mb = max_mb or float(os.getenv("TTS_CACHE_MAX_MB") or DEFAULT_MAX_MB)
+    return PhraseCache(cache_dir, int(max_mb * 1024 * 1024))
+
+
+@dataclass
+class TTSCacheStats:
+    """Sentences served from the phrase cache or synthesized, and time to first audio either way
+
+    Hits and misses are counted per sentence as they are routed; the time to
+    first audio comes from the TTS metrics, per stream, split on whether the
+    stream's first sentence was cached.
+    """
+
+    hits: int = 0
+    misses: int = 0
+    hit_streams: int = 0
+    miss_streams: int = 0
+    hit_ttfb_total: float = 0.0
+    miss_ttfb_total: float = 0.0
+
+    def count(self, hit):
+        """Count one sentence"""
+        if hit:
+            self.hits += 1
+        else:
+            self.misses += 1
+
+    def record(self, tts_metrics):
+        """Record the time to first audio of one TTSMetrics event from the cached TTS"""
+        if tts_metrics.request_id.startswith(CACHE_REQUEST_PREFIX):
+            self.hit_streams += 1
+            self.hit_ttfb_total += max(tts_metrics.ttfb, 0.0)
+        else:
+            self.miss_streams += 1
+            self.miss_ttfb_total += max(tts_metrics.ttfb, 0.0)
+
+    def summary(self):
+        sentences = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / sentences, 3) if sentences else 0.0,
+            "hit_ttfb_avg_ms": round(self.hit_ttfb_total / self.hit_streams * 1000, 1) if self.hit_streams else 0.0,
+            "miss_ttfb_avg_ms": round(self.miss_ttfb_total / self.miss_streams * 1000, 1) if self.miss_streams else 0.0,
+        }
+
+
+class CachedTTS(tts.TTS):
+    """Serves sentences from the phrase cache and synthesizes the rest with the wrapped TTS"""
+
+    def __init__(self, wrapped, *, voice, cache):
+        super().__init__(
+            capabilities=tts.TTSCapabilities(streaming=True),
+            sample_rate=wrapped.sample_rate,
+            num_channels=wrapped.num_channels,
+        )
+        self.wrapped = wrapped
+        self.voice = voice
+        self.cache = cache
+        # Short sentences are kept apart, so "Got it, latte." can be served before an uncached question
+        self.sentence_tokenizer = tokenize.blingfire.SentenceTokenizer(min_sentence_len=1)
+        self._wrapped_stream_tts = (
+            wrapped if wrapped.capabilities.streaming
+            else tts.StreamAdapter(tts=wrapped, sentence_tokenizer=self.sentence_tokenizer)
+        )
+        # Counted as sentences are routed, and fed from the session's metrics_collected handler
+        self.stats = TTSCacheStats()
+        # Keeps the background writes referenced until they are done
+        self._store_tasks = set()
+
+    def cache_key(self, text):
+        return self.cache.key(self.voice, self.sample_rate, self.num_channels, text)
+
+    async def lookup(self, text):
+        """The cached PCM of a sentence, or None, read on a worker thread and counted as a hit or miss"""
+        data = await asyncio.to_thread(self.cache.get, self.cache_key(text))
+        self.stats.count(data is not None)
+        return data
+
+    def store(self, text, data):
+        """Cache the PCM of a sentence in the background"""
+        task = asyncio.create_task(asyncio.to_thread(self.cache.put, self.cache_key(text), data))
+        self._store_tasks.add(task)
+        task.add_done_callback(self._store_tasks.discard)
+
+    def synthesize(self, text, *, conn_options: APIConnectOptions = DEFAULT_API_CONNECT_OPTIONS):
+        return _CachedChunkedStream(tts=self, input_text=text, conn_options=conn_options)
+
+    def stream(self, *, conn_options: APIConnectOptions = DEFAULT_API_CONNECT_OPTIONS):
+        return _CachedSynthesizeStream(tts=self, conn_options=conn_options)
+
+    def wrapped_stream(self, conn_options):
+        """A stream of the wrapped TTS, adapted sentence by sentence if it cannot stream"""
+        return self._wrapped_stream_tts.stream(conn_options=conn_options)
+
+    async def render(self, text, conn_options=DEFAULT_API_CONNECT_OPTIONS):
+        """Synthesize text with the wrapped TTS and cache it; returns the PCM"""
+        chunks = []
+        async with self.wrapped.synthesize(text, conn_options=conn_options) as stream:
+            async for audio in stream:
+                chunks.append(bytes(audio.frame.data))
+        data = b"".join(chunks)
+        await asyncio.to_thread(self.cache.put, self.cache_key(text), data)
+        return data
+
+    async def fill(self, phrases):
+        """Render the phrases that are not cached yet, one at a time; returns how many were rendered"""
+        rendered = 0
+        for phrase in phrases:
+            if await asyncio.to_thread(self.cache.__contains__, self.cache_key(phrase)):
+                continue
+            try:
+                await self.render(phrase)
+            except Exception as e:
+                logger.warning(f"Failed to pre-render {phrase!r}: {e}")
+                continue
+            rendered += 1
+        return rendered
+
+    def prewarm(self):
+        # Opens the wrapped TTS's pooled connection, used for every uncached run
+        self.wrapped.prewarm()
+
+    async def aclose(self):
+        await self.wrapped.aclose()
+
+
+class _CachedChunkedStream(tts.ChunkedStream):
+    async def _run(self, output_emitter):
+        cached_tts = self._tts
+        data = await cached_tts.lookup(self._input_text)
+        hit = data is not None
+        output_emitter.initialize(
+            request_id=f"{CACHE_REQUEST_PREFIX}{utils.shortuuid()}" if hit else utils.shortuuid(),
+            sample_rate=cached_tts.sample_rate,
+            num_channels=cached_tts.num_channels,
+            mime_type="audio/pcm",
+        )
+        if hit:
+            output_emitter.push(data)
+            output_emitter.flush()
+            return
+
+        chunks = []
+        async with cached_tts.wrapped.synthesize(self._input_text, conn_options=self._conn_options) as stream:
+            async for audio in stream:
+                chunk = bytes(audio.frame.data)
+                chunks.append(chunk)
+                output_emitter.push(chunk)
+        output_emitter.flush()
+        cached_tts.store(self._input_text, b"".join(chunks))
+
+
+class _CachedSynthesizeStream(tts.SynthesizeStream):
+    async def _run(self, output_emitter):
+        cached_tts = self._tts
+        sentences = cached_tts.sentence_tokenizer.stream()
+        # In speaking order: cached PCM, or a run of uncached sentences as (wrapped stream, texts); None ends it
+        parts = asyncio.Queue()
+        wrapped_streams = []
+        started = False
+
+        def start(hit):
+            nonlocal started
+            if started:
+                return
+            started = True
+            output_emitter.initialize(
+                request_id=f"{CACHE_REQUEST_PREFIX}{utils.shortuuid()}" if hit else utils.shortuuid(),
+                sample_rate=cached_tts.sample_rate,
+                num_channels=cached_tts.num_channels,
+                mime_type="audio/pcm",
+                stream=True,
+            )
+            output_emitter.start_segment(segment_id=utils.shortuuid())
+
+        async def input_task():
+            async for data in self._input_ch:
+                if isinstance(data, self._FlushSentinel):
+                    sentences.flush()
+                else:
+                    sentences.push_text(data)
+            sentences.end_input()
+
+        async def route_task():
+            run = None
+            async for ev in sentences:
+                self._mark_started()
+                data = await cached_tts.lookup(ev.token)
+                if data is not None:
+                    if run is not None:
+                        run[0].end_input()
+                        run = None
+                    parts.put_nowait(data)
+                    continue
+                if run is None:
+                    run = (cached_tts.wrapped_stream(self._conn_options), [])
+                    wrapped_streams.append(run[0])
+                    parts.put_nowait(run)
+                run[0].push_text(f"{ev.token} ")
+                run[1].append(ev.token)
+            if run is not None:
+                run[0].end_input()
+            parts.put_nowait(None)
+
+        async def output_task():
+            while (part := await parts.get()) is not None:
+                if isinstance(part, bytes):
+                    start(hit=True)
+                    output_emitter.push(part)
+                    continue
+                stream, texts = part
+                chunks = []
+                async for audio in stream:
+                    start(hit=False)
+                    chunk = bytes(audio.frame.data)
+                    chunks.append(chunk)
+                    output_emitter.push(chunk)
+                if len(texts) == 1:
+                    cached_tts.store(texts[0], b"".join(chunks))
+            # Nothing to say still needs an initialized emitter
+            start(hit=False)
+
+        tasks = [asyncio.create_task(input_task()), asyncio.create_task(route_task()), asyncio.create_task(output_task())]
+        try:
+            await asyncio.gather(*tasks)
+        finally:
+            await utils.aio.gracefully_cancel(*tasks)
+            await sentences.aclose()
+            for stream in wrapped_streams:
+                await stream.aclose()
+
+
+async def _prewarm(cache):
+    # The provider plugins need the HTTP session a job would normally provide
+    from livekit.agents.utils import http_context
+
+    from agent import create_tts, spoken_phrases
+
+    http_context._new_session_ctx()
+    try:
+        cached_tts = create_tts(cache)
+        phrases = spoken_phrases()
+        start = time.perf_counter()
+        rendered = await cached_tts.fill(phrases)
+        await cached_tts.aclose()
+    finally:
+        await http_context._close_http_ctx()
+    return len(phrases), rendered, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Manage the TTS phrase cache")
+    parser.add_argument("--dir", help="cache directory (default: $TTS_CACHE_DIR or tts_cache)")
+    parser.add_argument("--max-mb", type=float, help="cache size bound in MB (default: $TTS_CACHE_MAX_MB or 64)")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    subparsers.add_parser("prewarm", help="render the agent's known phrases that are not cached yet")
+    subparsers.add_parser("info", help="show the cache size")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    cache = open_phrase_cache(args.dir, args.max_mb)
+    if args.command == "prewarm":
+        total, rendered, elapsed = asyncio.run(_prewarm(cache))
+        print(f"Rendered {rendered} of {total} phrases in {elapsed:.1f}s into {cache!r}")
+    elif args.command == "info":
+        print(cache)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,172 @@
+"""Regular customers' usual orders, looked up by name.
+
+Regulars order the same drink most days. The index here maps a normalized
+customer name ("Zoë " -> "zoe") to the drinks of their last USUAL_HISTORY
+orders, so the get_usual_order tool can fill in a whole order in one call
+instead of asking for every detail again. Their usual is the drink they
+ordered most often among those, and the most recent one on a tie.
+
+The index is built from the order store when a job process is prewarmed,
+once per process, and every order the process saves is added to it. Orders
+saved by other processes in the meantime are picked up by the next process.
+
+Memory stays bounded however many customers the store holds. Only the
+USUAL_ORDERS_MAX_CUSTOMERS most recently seen customers are kept, in LRU
+order. Each keeps at most USUAL_HISTORY drinks, and the drinks themselves
+(drink, size, milk, extras) are shared between all customers who order
+them. Lookups and updates are a dict access and a move to the end of the
+LRU order, whatever the index size.
+
+Drinks are looked up in the menu as they are recorded, so orders stored
+before the menu lookup existed ("Cold Brew", "oatmilk") count as their
+canonical drink. Orders whose drink, size or milk is no longer on the menu
+are skipped, and extras no longer on the menu are left out of the drink;
+both are counted in summary().
+"""
+
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import menu
+
+logger = logging.getLogger("agent")
+
+DEFAULT_MAX_CUSTOMERS = 100_000
+# Orders per customer the usual is chosen from
+USUAL_HISTORY = 5
+
+
+def usual_orders_max_customers():
+    """Customers kept in the index (USUAL_ORDERS_MAX_CUSTOMERS)"""
+    return int(os.getenv("USUAL_ORDERS_MAX_CUSTOMERS") or DEFAULT_MAX_CUSTOMERS)
+
+
+def normalize_name(name):
+    return menu.normalize(name or "")
+
+
+class UsualOrderIndex:
+    """LRU index of customers' recent drinks, keyed by normalized name"""
+
+    def __init__(self, max_customers=None, history=USUAL_HISTORY):
+        self.max_customers = max_customers or usual_orders_max_customers()
+        self.history = history
+        self.evictions = 0
+        self.skipped_orders = 0
+        self.dropped_extras = 0
+        self.lookups = 0
+        self.hits = 0
+        # normalized name -> (name as last given, *drinks of the last orders, oldest first)
+        self._customers = OrderedDict()
+        # Every distinct drink, so customers ordering the same one share it
+        self._drinks = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._customers)
+
+    def record(self, order):
+        """Add a saved order to its customer's history"""
+        key = normalize_name(order.get("name"))
+        with self._lock:
+            self._record(key, order)
+
+    def _record(self, key, order):
+        if not key:
+            return
+        drink_type = menu.DRINKS.lookup(order.get("drinkType"))
+        size = menu.SIZES.lookup(order.get("size"))
+        milk = menu.MILKS.lookup(order.get("milk"))
+        if not (drink_type and size and milk):
+            self.skipped_orders += 1
+            return
+        extras = ()
+        if order.get("extras"):
+            canonical = {menu.EXTRAS.lookup(extra) for extra in order["extras"]}
+            if None in canonical:
+                canonical.discard(None)
+                self.dropped_extras += 1
+            extras = tuple(sorted(canonical))
+        drink = (drink_type, size, milk, extras)
+        drink = self._drinks.setdefault(drink, drink)
+        drinks = self._customers.pop(key, (None,))[1:]
+        self._customers[key] = (order["name"].strip(), *(*drinks, drink)[-self.history:])
+        if len(self._customers) > self.max_customers:
+            self._customers.popitem(last=False)
+            self.evictions += 1
+
+    def lookup(self, name):
+        """The customer's usual as an order state, how many of their recent orders it was, and of how many
+
+        Returns (None, 0, 0) for customers not in the index.
+        """
+        key = normalize_name(name)
+        with self._lock:
+            self.lookups += 1
+            entry = self._customers.get(key)
+            if entry is None:
+                return None, 0, 0
+            self._customers.move_to_end(key)
+            self.hits += 1
+        customer, drinks = entry[0], entry[1:]
+        # Most often ordered, the latest first on a tie
+        usual = max(reversed(drinks), key=drinks.count)
+        drink_type, size, milk, extras = usual
+        order = {"drinkType": drink_type, "size": size, "milk": milk, "extras": list(extras), "name": customer}
+        return order, drinks.count(usual), len(drinks)
+
+    def build(self, orders):
+        """Add stored orders, oldest first; returns how many were added"""
+        # A customer's orders repeat their name, so each name is normalized once
+        keys = {}
+        added = 0
+        with self._lock:
+            for order in orders:
+                name = order.get("name")
+                key = keys.get(name)
+                if key is None:
+                    if len(keys) > self.max_customers:
+                        keys.clear()
+                    key = keys[name] = normalize_name(name)
+                self._record(key, order)
+                added += 1
+        return added
+
+    def summary(self):
+        return {
+            "customers": len(self._customers),
+            "distinct_drinks": len(self._drinks),
+            "lookups": self.lookups,
+            "hit_rate": round(self.hits / self.lookups, 3) if self.lookups else 0.0,
+            "evictions": self.evictions,
+            "skipped_orders": self.skipped_orders,
+            "dropped_extras": self.dropped_extras,
+        }
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def load_usual_orders(order_store):
+    """The process's index, built from the order store on first use (from prewarm)"""
+    global _index
+    with _index_lock:
+        if _index is None:
+            start = time.perf_counter()
+            index = UsualOrderIndex()
+            orders = index.build(order_store.read_all())
+            logger.info(
+                f"Indexed usual orders of {len(index)} customers from {orders} orders "
+                f"in {(time.perf_counter() - start) * 1000:.0f}ms"
+            )
+            if index.skipped_orders or index.dropped_extras:
+                logger.warning(
+                    f"Usual orders: skipped {index.skipped_orders} orders and dropped extras from "
+                    f"{index.dropped_extras} orders with items no longer on the menu"
+                )
+            _index = index
+        return _index
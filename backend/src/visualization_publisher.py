@@ -0,0 +1,140 @@
+"""Per-session background publisher for frontend data messages.
+
+Tools queue updates here and return straight away instead of awaiting the
+network publish. A single task per session drains the queue in order, after
+waiting a short coalescing window so that a burst of tool calls in one LLM
+turn only produces one frame. Frames queued with the same coalesce key replace
+each other while they sit at the tail of the queue (latest value wins);
+frames without a key, such as receipts, are always sent and keep their place
+relative to the state updates around them.
+
+Each frame is built lazily by a callable returning (payload, topic) pairs, so
+encoding happens once per published frame rather than once per update.
+"""
+
+import asyncio
+import logging
+import time
+from collections import deque
+from dataclasses import dataclass
+
+logger = logging.getLogger("agent")
+
+# How long the publisher waits after the first queued update before sending
+DEFAULT_COALESCE_WINDOW = 0.02
+
+# Upper bound on queued frames; the oldest coalescable frame is dropped beyond it
+DEFAULT_MAX_PENDING = 64
+
+
+@dataclass
+class PublisherStats:
+    """Counters and publish latency for one session's publisher"""
+
+    submitted: int = 0
+    published: int = 0
+    coalesced: int = 0
+    dropped: int = 0
+    failed: int = 0
+    latency_total: float = 0.0
+    latency_max: float = 0.0
+
+    def record_latency(self, latency):
+        self.latency_total += latency
+        self.latency_max = max(self.latency_max, latency)
+
+    def summary(self):
+        avg = self.latency_total / self.published if self.published else 0.0
+        return {
+            "submitted": self.submitted,
+            "published": self.published,
+            "coalesced": self.coalesced,
+            "dropped": self.dropped,
+            "failed": self.failed,
+            "publish_latency_avg_ms": round(avg * 1000, 2),
+            "publish_latency_max_ms": round(self.latency_max * 1000, 2),
+        }
+
+
+@dataclass
+class _Frame:
+    build: object
+    coalesce_key: object
+    submitted_at: float
+
+
+class VisualizationPublisher:
+    """Sends queued frames from one background task, coalescing bursts of updates"""
+
+    def __init__(self, publish, *, coalesce_window=DEFAULT_COALESCE_WINDOW, max_pending=DEFAULT_MAX_PENDING):
+        self._publish = publish
+        self._coalesce_window = coalesce_window
+        self._max_pending = max_pending
+        self._pending = deque()
+        self._wakeup = None
+        self._task = None
+        self._closed = False
+        self.stats = PublisherStats()
+
+    def submit(self, build, *, coalesce_key=None):
+        """Queue a frame; build() is called when the frame is sent and returns (payload, topic) pairs"""
+        self.stats.submitted += 1
+        if self._closed:
+            self.stats.dropped += 1
+            return
+
+        tail = self._pending[-1] if self._pending else None
+        if coalesce_key is not None and tail is not None and tail.coalesce_key == coalesce_key:
+            # Latest value wins; keep the original submit time so latency covers the whole wait
+            tail.build = build
+            self.stats.coalesced += 1
+        else:
+            if len(self._pending) >= self._max_pending:
+                self._drop_oldest()
+            self._pending.append(_Frame(build, coalesce_key, time.perf_counter()))
+
+        self._ensure_started()
+        self._wakeup.set()
+
+    def _drop_oldest(self):
+        for frame in self._pending:
+            if frame.coalesce_key is not None:
+                self._pending.remove(frame)
+                self.stats.dropped += 1
+                return
+
+    def _ensure_started(self):
+        if self._task is None:
+            self._wakeup = asyncio.Event()
+            self._task = asyncio.create_task(self._run())
+
+    async def _run(self):
+        while not self._closed:
+            await self._wakeup.wait()
+            if self._coalesce_window > 0 and not self._closed:
+                await asyncio.sleep(self._coalesce_window)
+            self._wakeup.clear()
+            await self._drain()
+        await self._drain()
+
+    async def _drain(self):
+        while self._pending:
+            await self._send(self._pending.popleft())
+
+    async def _send(self, frame):
+        try:
+            for payload, topic in frame.build():
+                await self._publish(payload, topic)
+        except Exception as e:
+            self.stats.failed += 1
+            logger.error(f"Failed to publish frame: {e}")
+            return
+        self.stats.published += 1
+        self.stats.record_latency(time.perf_counter() - frame.submitted_at)
+
+    async def aclose(self):
+        """Stop the background task after sending whatever is still queued"""
+        self._closed = True
+        if self._task is not None:
+            self._wakeup.set()
+            await self._task
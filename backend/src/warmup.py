@@ -0,0 +1,96 @@
+"""Startup timing for job processes and connection warm-up for sessions.
+
+Everything a session needs that does not depend on the room (the VAD model,
+noise cancellation options and the STT/LLM/TTS clients) is created in the job
+process's prewarm, before a job is assigned to it, so the first customer of a
+fresh process does not pay for it. The turn detector model is loaded by the
+worker's inference process; its handle needs the job context, so it is
+created by the job. The HTTP session the provider plugins use only exists
+once the job is running, so connections are opened at the very start of the
+job, while the agent is still joining the room, instead of when the voice
+pipeline starts.
+"""
+
+import logging
+import time
+
+import psutil
+from livekit.agents import metrics
+
+logger = logging.getLogger("agent")
+
+
+def elapsed_ms(start):
+    return round((time.perf_counter() - start) * 1000, 1)
+
+
+def process_age_ms():
+    """Time since this process was spawned"""
+    return round((time.time() - psutil.Process().create_time()) * 1000, 1)
+
+
+class StartupTimings:
+    """Wall-clock time of each prewarm step"""
+
+    def __init__(self):
+        self.steps = {}
+        self.started = time.perf_counter()
+
+    def run(self, name, fn, *args):
+        """Call fn(*args) and record how long it took under name"""
+        start = time.perf_counter()
+        result = fn(*args)
+        self.steps[name] = elapsed_ms(start)
+        return result
+
+    def summary(self):
+        return {
+            "process_ready_ms": process_age_ms(),
+            "prewarm_ms": elapsed_ms(self.started),
+            "steps_ms": dict(self.steps),
+        }
+
+
+def warm_connections(*providers):
+    """Ask each STT/LLM/TTS to open its connections now rather than at session start"""
+    for provider in providers:
+        try:
+            provider.prewarm()
+        except Exception as e:
+            logger.warning(f"Failed to prewarm {type(provider).__name__}: {e}")
+
+
+class FirstResponseTimer:
+    """Logs the latency of the first response of a job, where cold connections show up"""
+
+    def __init__(self):
+        self.job_started = time.perf_counter()
+        self.setup_ms = None
+        self.llm_ttft_ms = None
+        self.tts_ttfb_ms = None
+        self.eou_delay_ms = None
+        self._logged = False
+
+    def setup_done(self):
+        """Mark the session as started"""
+        self.setup_ms = elapsed_ms(self.job_started)
+
+    def record(self, collected):
+        """Take the first EOU, LLM and TTS metrics of the job"""
+        if isinstance(collected, metrics.EOUMetrics) and self.eou_delay_ms is None:
+            self.eou_delay_ms = round(collected.end_of_utterance_delay * 1000, 1)
+        elif isinstance(collected, metrics.LLMMetrics) and self.llm_ttft_ms is None:
+            self.llm_ttft_ms = round(collected.ttft * 1000, 1)
+        elif isinstance(collected, metrics.TTSMetrics) and self.tts_ttfb_ms is None:
+            self.tts_ttfb_ms = round(collected.ttfb * 1000, 1)
+        if not self._logged and self.tts_ttfb_ms is not None and self.llm_ttft_ms is not None:
+            self._logged = True
+            logger.info(f"First response: {self.summary()}")
+
+    def summary(self):
+        return {
+            "setup_ms": self.setup_ms,
+            "eou_delay_ms": self.eou_delay_ms,
+            "llm_ttft_ms": self.llm_ttft_ms,
+            "tts_ttfb_ms": self.tts_ttfb_ms,
+        }
@@ -0,0 +1,61 @@
+import json
+import os
+import time
+
+import pytest
+
+from admission import CPU_SMOOTHING, AdmissionController
+
+
+def write_heartbeat(load_dir, cpu, sessions=1, at=None):
+    heartbeat = {"time": time.time() if at is None else at, "sessions": sessions, "cpu": cpu,
+                 "loop_lag_p99": 0.001, "loop_lag_max": 0.002}
+    (load_dir / f"{os.getpid()}.json").write_text(json.dumps(heartbeat), encoding="utf-8")
+
+
+@pytest.fixture
+def controller(tmp_path):
+    return AdmissionController(tmp_path, threshold=0.75, max_lag=0.05, session_cpu=0.1, cores=4)
+
+
+def test_each_heartbeat_is_sampled_once(tmp_path, controller):
+    write_heartbeat(tmp_path, cpu=0.6, sessions=2)
+    for _ in range(3):
+        controller.measure(0.0)
+    sampled = 0.1 + CPU_SMOOTHING * (0.3 - 0.1)
+    assert controller.session_cpu == pytest.approx(sampled)
+
+    write_heartbeat(tmp_path, cpu=0.6, sessions=2, at=time.time() + 1)
+    controller.measure(0.0)
+    assert controller.session_cpu == pytest.approx(sampled + CPU_SMOOTHING * (0.3 - sampled))
+
+
+def test_admission_check_only_reads_the_session_cpu(tmp_path, controller):
+    write_heartbeat(tmp_path, cpu=0.6, sessions=2)
+    load = controller.measure(0.0, 1, sample=False)
+    assert controller.session_cpu == 0.1
+    assert load.sessions == 3
+    assert load.cpu == pytest.approx(3 * 0.1 / 4)
+
+
+class JobRequest:
+    def __init__(self, job_id):
+        self.job = type("Job", (), {"id": job_id})()
+        self.decision = None
+
+    async def accept(self):
+        self.decision = "accept"
+
+    async def reject(self):
+        self.decision = "reject"
+
+
+async def test_request_fnc_counts_accepted_jobs_until_they_run(tmp_path, controller):
+    write_heartbeat(tmp_path, cpu=0.0, sessions=0)
+    controller.max_sessions = 2
+    requests = [JobRequest(f"job-{i}") for i in range(3)]
+    for request in requests:
+        await controller.request_fnc(request)
+    assert [request.decision for request in requests] == ["accept", "reject", "reject"]
+    assert controller.decisions == {"accept": 1, "reject:session_count": 2}
+    assert controller.session_cpu == 0.1
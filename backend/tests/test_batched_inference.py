@@ -0,0 +1,98 @@
+import json
+
+import numpy as np
+import pytest
+from livekit.agents import JobExecutorType
+
+import batched_inference
+from batched_inference import _EOUBatch, inference_batching_enabled
+
+
+class StubTokenizer:
+    """Word-per-token tokenizer with the chat template calls the runner makes"""
+
+    pad_token_id = 1
+    eos_token_id = 1
+
+    def __init__(self):
+        self.vocab = {}
+
+    def apply_chat_template(self, messages, **kwargs):
+        return "".join(f"<|im_start|>{m['role']} {m['content']}<|im_end|>" for m in messages)
+
+    def __call__(self, text, max_length=None, truncation=False, **kwargs):
+        ids = [self.vocab.setdefault(word, len(self.vocab) + 2) for word in text.split()]
+        if truncation and max_length:
+            ids = ids[-max_length:]
+        return {"input_ids": np.array([ids], dtype=np.int32)}
+
+
+class CausalSession:
+    """Scores every position from the tokens up to it, like the turn detector"""
+
+    def run(self, outputs, inputs):
+        ids = inputs["input_ids"].astype(np.float64)
+        return [(np.cumsum(ids * 0.37, axis=1) % 1.0).astype(np.float32)]
+
+
+class LastPositionSession:
+    """Scores only the last position, from the whole sequence"""
+
+    def run(self, outputs, inputs):
+        ids = inputs["input_ids"].astype(np.float64)
+        return [(ids.sum(axis=1, keepdims=True) * 0.37 % 1.0).astype(np.float32)]
+
+
+def runner(session):
+    class StubEOUBatch(_EOUBatch):
+        def initialize(self):
+            self._session = session
+            self._tokenizer = StubTokenizer()
+
+    batch = StubEOUBatch()
+    batch.load()
+    return batch
+
+
+CHATS = [
+    [{"role": "user", "content": "a latte please"}],
+    [{"role": "assistant", "content": "What size?"}, {"role": "user", "content": "large"}],
+    [{"role": "user", "content": "can I get a cold brew with oat milk and an extra shot"}],
+    [{"role": "user", "content": "um"}],
+    [{"role": "assistant", "content": "Anything else?"}, {"role": "user", "content": "no that's it"}],
+]
+
+
+def copy(chat):
+    return [dict(message) for message in chat]
+
+
+@pytest.mark.parametrize("session", [CausalSession(), LastPositionSession()], ids=["causal", "last-position"])
+def test_batched_turn_detection_matches_unbatched(session):
+    model = runner(session)
+    unbatched = [json.loads(model.run(json.dumps({"chat_ctx": copy(chat)})))["eou_probability"] for chat in CHATS]
+    batched = model([copy(chat) for chat in CHATS])
+    assert batched == pytest.approx(unbatched, abs=1e-6)
+
+
+def test_probe_detects_per_position_scores():
+    assert runner(CausalSession())._per_position
+    assert not runner(LastPositionSession())._per_position
+
+
+@pytest.mark.parametrize(
+    ("executor", "env", "expected"),
+    [
+        (JobExecutorType.PROCESS, None, False),
+        (JobExecutorType.THREAD, None, True),
+        (JobExecutorType.PROCESS, "1", True),
+        (JobExecutorType.THREAD, "0", False),
+    ],
+)
+def test_batching_is_on_by_default_only_for_thread_jobs(monkeypatch, executor, env, expected):
+    monkeypatch.setattr(batched_inference, "job_executor_type", lambda: executor)
+    if env is None:
+        monkeypatch.delenv("INFERENCE_BATCHING", raising=False)
+    else:
+        monkeypatch.setenv("INFERENCE_BATCHING", env)
+    assert inference_batching_enabled() is expected
@@ -0,0 +1,106 @@
+from livekit.agents import llm
+
+from context_compaction import (
+    INSTRUCTIONS_MESSAGE_ID,
+    ORDER_STATE_MESSAGE_ID,
+    SUMMARY_MESSAGE_ID,
+    SUMMARY_ORDERS,
+    ContextCompactor,
+    describe_order,
+    estimate_tokens,
+    order_state_message,
+)
+from order_state import OrderState
+
+
+def order_turns(chat_ctx, drink, turn):
+    """The items of one order: the request, an update_order call and its output, and the reply"""
+    chat_ctx.add_message(role="user", content=f"A large oat {drink} please")
+    call_id = f"call-{turn}"
+    chat_ctx.items.append(llm.FunctionCall(call_id=call_id, name="update_order", arguments=f'{{"drink_type":"{drink}"}}'))
+    chat_ctx.items.append(llm.FunctionCallOutput(call_id=call_id, name="update_order", output="Updated.", is_error=False))
+    chat_ctx.add_message(role="assistant", content=f"A large oat milk {drink}, anything else?")
+
+
+def session_context(orders):
+    chat_ctx = llm.ChatContext.empty()
+    chat_ctx.add_message(role="system", content="You are a barista.", id=INSTRUCTIONS_MESSAGE_ID)
+    for turn, drink in enumerate(orders):
+        order_turns(chat_ctx, drink, turn)
+    return chat_ctx
+
+
+def test_compaction_keeps_instructions_and_summary():
+    compactor = ContextCompactor(token_budget=0)
+    chat_ctx = session_context(["latte", "mocha"])
+    for drink in ("latte", "mocha"):
+        compactor.record_order({"drinkType": drink, "size": "large", "milk": "oat milk", "name": "Sam"})
+
+    compacted, removed = compactor.compact(chat_ctx, keep=0)
+    assert [item.id for item in compacted.items] == [INSTRUCTIONS_MESSAGE_ID, SUMMARY_MESSAGE_ID]
+    assert compacted.items[1].text_content == (
+        "Orders already placed in this session: 2.\n"
+        "- large oat milk latte for Sam\n"
+        "- large oat milk mocha for Sam"
+    )
+    assert removed == estimate_tokens(chat_ctx) - estimate_tokens(compacted) > 0
+    # The context given is left alone
+    assert len(chat_ctx.items) == 9
+
+
+def test_compaction_keeps_recent_turns_whole():
+    compactor = ContextCompactor()
+    chat_ctx = session_context(["latte", "mocha"])
+    # Keeping 3 items would start at a tool output; the tail starts at the next message
+    compacted, _ = compactor.compact(chat_ctx, keep=3)
+    assert [item.type for item in compacted.items] == ["message", "message"]
+    assert compacted.items[-1].text_content == "A large oat milk mocha, anything else?"
+
+    compacted, _ = compactor.compact(chat_ctx, keep=4)
+    assert [item.type for item in compacted.items[1:]] == ["message", "function_call", "function_call_output", "message"]
+    # No orders placed yet, so no summary
+    assert SUMMARY_MESSAGE_ID not in [item.id for item in compacted.items]
+
+
+def test_compaction_replaces_stale_summary_and_order_state():
+    compactor = ContextCompactor()
+    chat_ctx = session_context(["latte"])
+    compactor.record_order({"drinkType": "latte", "size": "large", "milk": "oat milk"})
+    chat_ctx, _ = compactor.compact(chat_ctx, keep=0)
+    order = OrderState()
+    order.update({"drinkType": "mocha", "size": "small"})
+    chat_ctx.items.append(order_state_message(order))
+
+    order_turns(chat_ctx, "cold brew", 1)
+    compactor.record_order({"drinkType": "cold brew", "size": "large", "milk": "no milk"})
+    compacted, _ = compactor.compact(chat_ctx, keep=4)
+    ids = [item.id for item in compacted.items]
+    assert ids.count(SUMMARY_MESSAGE_ID) == 1
+    assert ORDER_STATE_MESSAGE_ID not in ids
+    assert "Orders already placed in this session: 2." in compacted.items[1].text_content
+    # The summary sorts before the turns it replaced
+    assert compacted.items[1].created_at < compacted.items[2].created_at
+
+
+def test_current_order_message_describes_the_order():
+    order = OrderState()
+    order.update({"drinkType": "latte", "milk": "oat milk"})
+    message = order_state_message(order)
+    assert (message.id, message.role) == (ORDER_STATE_MESSAGE_ID, "system")
+    assert message.text_content == f"Current order: {order.describe()}."
+
+
+def test_summary_lists_only_the_latest_orders():
+    compactor = ContextCompactor()
+    orders = [{"drinkType": "latte", "size": "small", "name": f"Customer {i}"} for i in range(SUMMARY_ORDERS + 2)]
+    for order in orders:
+        compactor.record_order(order)
+    lines = compactor.summary_message(created_at=0).text_content.splitlines()
+    assert lines[:2] == [f"Orders already placed in this session: {SUMMARY_ORDERS + 2}.", f"The {SUMMARY_ORDERS} most recent:"]
+    assert lines[2:] == [f"- {describe_order(order)}" for order in orders[2:]]
+
+
+def test_describe_order():
+    assert describe_order({"drinkType": "americano", "size": "medium", "milk": "no milk", "extras": ["extra shot"]}) == (
+        "medium americano with no milk with extra shot"
+    )
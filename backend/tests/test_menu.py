@@ -0,0 +1,64 @@
+import pytest
+
+import menu
+
+
+@pytest.mark.parametrize(
+    ("category", "text", "expected"),
+    [
+        # Canonical names, case, punctuation and accents
+        (menu.DRINKS, "Latte", "latte"),
+        (menu.DRINKS, "  Café-Latte ", "latte"),
+        (menu.DRINKS, "COLD BREW", "cold brew"),
+        # Aliases, compact forms and plurals
+        (menu.DRINKS, "coldbrew", "cold brew"),
+        (menu.DRINKS, "mochas", "mocha"),
+        (menu.MILKS, "oatmilk", "oat milk"),
+        (menu.MILKS, "Oat", "oat milk"),
+        (menu.MILKS, "black", "no milk"),
+        (menu.EXTRAS, "sugar free vanilla", "sugar-free vanilla syrup"),
+        (menu.SIZES, "big", "large"),
+        (menu.SIZES, "small size", "small"),
+        (menu.SIZES, "medium size", "medium"),
+        (menu.SIZES, "regular size", "medium"),
+        (menu.SIZES, "large size", "large"),
+        # Misspellings within the edit distance for the word's length
+        (menu.DRINKS, "late", "latte"),
+        (menu.DRINKS, "capucino", "cappuccino"),
+        (menu.DRINKS, "americanno", "americano"),
+        (menu.MILKS, "almnd milk", "almond milk"),
+    ],
+)
+def test_lookup_accepts(category, text, expected):
+    assert category.lookup(text) == expected
+
+
+@pytest.mark.parametrize(
+    ("category", "text"),
+    [
+        (menu.DRINKS, ""),
+        (menu.DRINKS, "tea"),
+        (menu.DRINKS, "hot chocolate"),
+        (menu.DRINKS, "flat white"),
+        # Short words tolerate no typos
+        (menu.SIZES, "bug"),
+        # A customer asking for no dairy wants a plant milk, not black coffee
+        (menu.MILKS, "no dairy"),
+        (menu.MILKS, "goat milk milk"),
+        (menu.EXTRAS, "sprinkles"),
+    ],
+)
+def test_lookup_rejects(category, text):
+    assert category.lookup(text) is None
+
+
+def test_edit_distance_is_capped_at_limit():
+    assert menu.edit_distance("latte", "latte", 2) == 0
+    assert menu.edit_distance("late", "latte", 2) == 1
+    assert menu.edit_distance("espresso", "mocha", 2) == 3
+
+
+def test_cup_style_covers_the_menu():
+    assert set(menu.CUP_STYLE["cupSizes"]) == set(menu.SIZES.names)
+    assert set(menu.CUP_STYLE["drinkColors"]) == set(menu.DRINKS.names)
+    assert menu.CUP_STYLE["defaultSize"] in menu.SIZES
@@ -0,0 +1,106 @@
+import asyncio
+import time
+from datetime import datetime
+
+import pytest
+
+from order_analytics import OrderIndex, to_epoch_seconds
+from order_store import JsonlOrderStore
+
+
+@pytest.fixture
+def new_york(monkeypatch):
+    # UTC-5 in January
+    monkeypatch.setenv("TZ", "America/New_York")
+    time.tzset()
+    yield
+    monkeypatch.undo()
+    time.tzset()
+
+
+@pytest.fixture
+def index(tmp_path):
+    return OrderIndex(tmp_path / "analytics")
+
+
+def order(timestamp, drink="latte", size="large", milk="oat milk", extras=()):
+    return {"timestamp": timestamp, "drinkType": drink, "size": size, "milk": milk, "extras": list(extras)}
+
+
+def test_naive_and_aware_timestamps_share_local_wall_clock(new_york):
+    naive = to_epoch_seconds("2026-01-15T07:30:00")
+    assert to_epoch_seconds("2026-01-15T12:30:00+00:00") == naive
+    assert to_epoch_seconds("2026-01-15T13:30:00+01:00") == naive
+
+
+def test_mixed_timestamps_land_in_the_same_bucket(new_york, index):
+    index.append([order("2026-01-15T23:30:00"), order("2026-01-16T04:45:00+00:00")])
+    assert index.query(bucket="day") == [((datetime(2026, 1, 15),), 2)]
+
+    # Aware and naive bounds select the same local day
+    for since, until in (
+        ("2026-01-15", "2026-01-16"),
+        ("2026-01-15T05:00:00+00:00", "2026-01-16T05:00:00+00:00"),
+    ):
+        assert index.query(since=to_epoch_seconds(since), until=to_epoch_seconds(until)) == [((), 2)]
+
+
+FIXTURE_ORDERS = [
+    order("2026-03-02T08:05:00", extras=["vanilla syrup", "extra shot"]),
+    order("2026-03-02T08:40:00", drink="mocha", size="small", milk="whole milk"),
+    order("2026-03-02T09:10:00", extras=["Vanilla Syrup"]),
+    order("2026-03-03T08:15:00", drink="Mocha", size="small", milk="oat milk", extras=["whipped cream"]),
+    order("2026-03-03T10:30:00", drink="cold brew", size="medium", milk="no milk"),
+]
+
+
+@pytest.fixture
+async def fixture_index(tmp_path, index):
+    store = JsonlOrderStore(tmp_path / "orders.jsonl")
+    for fixture_order in FIXTURE_ORDERS:
+        await asyncio.wait_for(store.save({"id": None, **fixture_order}), 5)
+    store.close()
+    assert index.ingest(store, orders_dir=tmp_path / "legacy") == len(FIXTURE_ORDERS)
+    return index
+
+
+def test_counts_by_column(fixture_index):
+    assert fixture_index.query(group_by=["drinkType"]) == [(("cold brew",), 1), (("latte",), 2), (("mocha",), 2)]
+    assert fixture_index.query(group_by=["drinkType", "milk"]) == [
+        (("cold brew", "no milk"), 1),
+        (("latte", "oat milk"), 2),
+        (("mocha", "oat milk"), 1),
+        (("mocha", "whole milk"), 1),
+    ]
+
+
+def test_counts_by_extra_count_each_extra(fixture_index):
+    assert fixture_index.query(group_by=["extras"]) == [
+        (("extra shot",), 1),
+        (("vanilla syrup",), 2),
+        (("whipped cream",), 1),
+    ]
+    assert fixture_index.query(group_by=["size"], where={"extras": "vanilla syrup"}) == [(("large",), 2)]
+
+
+def test_counts_by_bucket(fixture_index):
+    assert fixture_index.query(bucket="day") == [((datetime(2026, 3, 2),), 3), ((datetime(2026, 3, 3),), 2)]
+    assert fixture_index.query(bucket="hour", group_by=["size"], where={"drinkType": "mocha"}) == [
+        ((datetime(2026, 3, 2, 8), "small"), 1),
+        ((datetime(2026, 3, 3, 8), "small"), 1),
+    ]
+    # Empty buckets are left out
+    assert [key for key, _ in fixture_index.query(bucket="hour", since=to_epoch_seconds("2026-03-03"))] == [
+        (datetime(2026, 3, 3, 8),),
+        (datetime(2026, 3, 3, 10),),
+    ]
+
+
+def test_ingest_only_adds_new_orders(tmp_path, fixture_index):
+    store = JsonlOrderStore(tmp_path / "orders.jsonl")
+    assert fixture_index.ingest(store, orders_dir=tmp_path / "legacy") == 0
+    store.close()
+    reopened = OrderIndex(fixture_index.index_dir)
+    assert reopened.count == len(FIXTURE_ORDERS)
+    assert reopened.query(where={"drinkType": "latte"}) == [((), 2)]
+    assert reopened.query(where={"drinkType": "flat white"}) == []
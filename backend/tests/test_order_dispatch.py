@@ -0,0 +1,108 @@
+import asyncio
+
+import pytest
+
+from order_dispatch import (
+    MAX_DELIVERIES,
+    DispatchConsumer,
+    OrderDispatcher,
+    connect,
+    dispatch_status,
+    trim,
+)
+
+
+@pytest.fixture
+def dispatch_path(tmp_path):
+    return tmp_path / "dispatch.db"
+
+
+async def publish(path, count):
+    dispatcher = OrderDispatcher(path)
+    for _ in range(count):
+        number = await asyncio.wait_for(dispatcher.allocate(), 5)
+        await asyncio.wait_for(dispatcher.publish({"orderNumber": number, "drinkType": "latte"}), 5)
+    dispatcher.close()
+
+
+def consumer(path, name, **kwargs):
+    return DispatchConsumer(path, "kitchen", name, start="earliest", **kwargs)
+
+
+async def test_order_numbers_increase(dispatch_path):
+    dispatcher = OrderDispatcher(dispatch_path)
+    numbers = await asyncio.gather(*(dispatcher.allocate() for _ in range(10)))
+    dispatcher.close()
+    assert sorted(numbers) == list(range(1, 11))
+
+
+async def test_acknowledged_orders_are_not_redelivered(dispatch_path):
+    await publish(dispatch_path, 2)
+    display = consumer(dispatch_path, "display-1", lease=0)
+    batch = display.fetch()
+    assert [delivery.order["orderNumber"] for delivery in batch] == [1, 2]
+    display.ack(batch)
+    assert display.fetch() == []
+    display.close()
+
+
+async def test_expired_lease_is_redelivered_to_another_consumer(dispatch_path):
+    await publish(dispatch_path, 1)
+    crashed = consumer(dispatch_path, "display-1", lease=0)
+    (first,) = crashed.fetch()
+    assert first.deliveries == 1
+    crashed.close()
+
+    display = consumer(dispatch_path, "display-2")
+    (again,) = display.fetch()
+    assert again.seq == first.seq
+    assert again.deliveries == 2
+    assert display.redelivered == 1
+
+    # Leased to display-2 now, so nobody else gets it until it expires
+    other = consumer(dispatch_path, "display-3")
+    assert other.fetch() == []
+    other.close()
+    display.ack([again])
+    assert dispatch_status(dispatch_path)["groups"]["kitchen"]["in_flight"] == 0
+    display.close()
+
+
+async def test_unacknowledged_order_becomes_dead_letter(dispatch_path):
+    await publish(dispatch_path, 1)
+    display = consumer(dispatch_path, "display-1", lease=0)
+    deliveries = [delivery.deliveries for _ in range(MAX_DELIVERIES) for delivery in display.fetch()]
+    assert deliveries == list(range(1, MAX_DELIVERIES + 1))
+
+    # The lease ran out after the last delivery: set aside instead of delivered again
+    assert display.fetch() == []
+    assert display.dead_lettered == 1
+    group = dispatch_status(dispatch_path)["groups"]["kitchen"]
+    assert group["dead_letters"] == 1
+    assert group["in_flight"] == 0
+    display.close()
+
+
+async def test_trim_deletes_dead_letters_of_trimmed_orders(dispatch_path):
+    await publish(dispatch_path, 1)
+    display = consumer(dispatch_path, "display-1", lease=0)
+    for _ in range(MAX_DELIVERIES + 1):
+        display.fetch()
+    assert display.dead_lettered == 1
+    display.close()
+
+    conn = connect(dispatch_path)
+    assert trim(conn, float("inf")) == 1
+    assert conn.execute("SELECT COUNT(*) FROM dead_letters").fetchone() == (0,)
+    conn.close()
+    assert dispatch_status(dispatch_path)["groups"]["kitchen"]["dead_letters"] == 0
+
+
+async def test_groups_see_every_order(dispatch_path):
+    await publish(dispatch_path, 1)
+    kitchen = consumer(dispatch_path, "display-1")
+    bar = DispatchConsumer(dispatch_path, "bar", "display-1", start="earliest")
+    assert len(kitchen.fetch()) == 1
+    assert len(bar.fetch()) == 1
+    kitchen.close()
+    bar.close()
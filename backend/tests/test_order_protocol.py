@@ -0,0 +1,70 @@
+import menu
+from order_protocol import (
+    PROTOCOL_VERSION,
+    OrderStateEncoder,
+    decode_message,
+    encode_message,
+)
+from order_state import OrderState
+
+
+def apply(state, message):
+    """What the frontend does with a message: replace the state or merge the changed fields"""
+    if message["type"] == "snapshot":
+        return dict(message["state"])
+    return {**state, **message["set"]}
+
+
+def test_deltas_rebuild_the_order_state():
+    order = OrderState()
+    encoder = OrderStateEncoder()
+    snapshot = decode_message(encoder.snapshot(order))
+    assert snapshot["seq"] == 0
+    assert snapshot["menu"] == menu.CUP_STYLE
+    frontend = apply(None, snapshot)
+
+    changes = [
+        {"drinkType": "latte"},
+        {"size": "large", "milk": "oat milk"},
+        {"extras": ["vanilla syrup"]},
+        {"size": "small"},
+        {"name": "Sam"},
+    ]
+    for seq, change in enumerate(changes, start=1):
+        order.update({field: value for field, value in change.items() if field != "extras"})
+        for extra in change.get("extras", ()):
+            order.add_extra(extra)
+        message = decode_message(encoder.delta(order))
+        assert (message["type"], message["seq"]) == ("delta", seq)
+        assert message["set"] == change
+        frontend = apply(frontend, message)
+    assert frontend == order.to_dict()
+
+
+def test_delta_carries_only_the_net_change():
+    order = OrderState()
+    encoder = OrderStateEncoder()
+    encoder.snapshot(order)
+    order.size = "large"
+    order.size = "small"
+    order.size = None
+    assert encoder.delta(order) is None
+    # Not a message, so the sequence does not move
+    order.drink_type = "mocha"
+    assert decode_message(encoder.delta(order)) == {"v": PROTOCOL_VERSION, "type": "delta", "seq": 1, "set": {"drinkType": "mocha"}}
+
+
+def test_first_delta_is_a_snapshot():
+    order = OrderState()
+    order.milk = "no milk"
+    message = decode_message(OrderStateEncoder().delta(order))
+    assert message["type"] == "snapshot"
+    assert message["state"]["milk"] == "no milk"
+
+
+def test_decode_rejects_other_versions_and_garbage():
+    assert decode_message(encode_message({"v": PROTOCOL_VERSION, "type": "sync"})) == {"v": PROTOCOL_VERSION, "type": "sync"}
+    assert decode_message(encode_message({"v": PROTOCOL_VERSION + 1, "type": "sync"})) is None
+    assert decode_message(b"[1, 2]") is None
+    assert decode_message(b"\xff") is None
+    assert decode_message(b"{") is None
@@ -0,0 +1,121 @@
+import pytest
+
+from order_state import OrderState
+
+
+def test_name_is_stripped():
+    state = OrderState()
+    state.name = "  Sam "
+    assert state.name == "Sam"
+    assert "name" not in state.missing_fields()
+
+
+@pytest.mark.parametrize("blank", ["", "   ", "\t\n"])
+def test_blank_name_is_rejected(blank):
+    state = OrderState()
+    state.update({"drinkType": "latte", "size": "large", "milk": "oat milk"})
+    with pytest.raises(ValueError):
+        state.name = blank
+    assert state.name is None
+    assert not state.complete
+
+
+def test_blank_stored_name_counts_as_missing():
+    state = OrderState.from_dict({"drinkType": "latte", "size": "large", "milk": "oat milk", "name": "  "})
+    assert state.name is None
+    assert state.missing_fields() == ("name",)
+
+
+def full_order():
+    state = OrderState()
+    state.update({"drinkType": "latte", "size": "large", "milk": "oat milk", "name": "Sam"})
+    return state
+
+
+def test_missing_fields_follow_every_change():
+    state = OrderState()
+    assert state.empty
+    assert state.missing_fields() == ("drink type", "size", "milk preference", "name")
+
+    state.size = "large"
+    state.name = "Sam"
+    assert state.missing_fields() == ("drink type", "milk preference")
+    assert not state.empty
+
+    state.drink_type = "latte"
+    state.milk = "oat milk"
+    assert state.complete
+    assert state.missing_fields() == ()
+
+    # Clearing a field makes it missing again
+    state.size = None
+    assert state.missing_fields() == ("size",)
+    assert not state.complete
+
+
+def test_unknown_menu_values_are_rejected():
+    state = OrderState()
+    for field, value in (("drinkType", "tea"), ("size", "huge"), ("milk", "oat")):
+        with pytest.raises(ValueError):
+            state.update({field: value})
+    with pytest.raises(ValueError):
+        state.add_extra("sprinkles")
+    assert state.empty
+
+
+def test_adding_an_extra_twice_is_a_no_op():
+    state = OrderState()
+    assert state.add_extra("whipped cream")
+    assert not state.add_extra("whipped cream")
+    assert state.add_extra("extra shot")
+    assert state.has_extra("whipped cream")
+    assert not state.has_extra("vanilla syrup")
+    # Listed in menu order, whatever the order they were added in
+    assert state.extras == ("extra shot", "whipped cream")
+    # Extras are optional
+    assert state.missing_fields() == ("drink type", "size", "milk preference", "name")
+
+
+def test_to_dict_round_trips():
+    state = full_order()
+    state.add_extra("vanilla syrup")
+    data = state.to_dict()
+    assert data == {
+        "drinkType": "latte",
+        "size": "large",
+        "milk": "oat milk",
+        "extras": ["vanilla syrup"],
+        "name": "Sam",
+    }
+    assert OrderState.from_dict(data) == state
+    assert OrderState().to_dict() == {"drinkType": None, "size": None, "milk": None, "extras": [], "name": None}
+
+
+def test_from_dict_leaves_out_values_no_longer_on_the_menu():
+    state = OrderState.from_dict({"drinkType": "flat white", "size": "large", "extras": ["sprinkles", "extra shot"]})
+    assert state.drink_type is None
+    assert state.extras == ("extra shot",)
+    assert state.missing_fields() == ("drink type", "milk preference", "name")
+
+
+def test_copy_is_independent():
+    state = full_order()
+    copy = state.copy()
+    copy.size = "small"
+    copy.add_extra("extra shot")
+    assert state.size == "large"
+    assert state.extras == ()
+    assert copy.changes(state) == {"size": "small", "extras": ["extra shot"]}
+    assert state.changes(state.copy()) == {}
+
+
+def test_describe():
+    assert OrderState().describe() == (
+        "drink type: not given yet; size: not given yet; milk: not given yet; extras: none; name: not given yet"
+    )
+    state = full_order()
+    state.add_extra("extra shot")
+    state.add_extra("caramel drizzle")
+    assert state.describe() == (
+        "drink type: latte; size: large; milk: oat milk; extras: extra shot, caramel drizzle; name: Sam"
+    )
@@ -0,0 +1,62 @@
+import asyncio
+
+import pytest
+
+from order_store import JsonlOrderStore, SqliteOrderStore
+
+
+class FailingWriteStore(JsonlOrderStore):
+    def _write_batch(self, records):
+        raise OSError("disk full")
+
+
+def unopenable_path(tmp_path):
+    # The store's directory cannot be created under a regular file
+    blocker = tmp_path / "orders"
+    blocker.write_text("")
+    return blocker / "orders.jsonl"
+
+
+@pytest.mark.parametrize("store_cls", [JsonlOrderStore, SqliteOrderStore])
+async def test_save_assigns_id_and_persists(tmp_path, store_cls):
+    store = store_cls(tmp_path / "orders" / "store")
+    saved = await asyncio.wait_for(store.save({"id": None, "drinkType": "latte"}), 5)
+    store.close()
+    assert saved["id"]
+    assert list(store.read_all()) == [saved]
+
+
+async def test_save_keeps_given_id(tmp_path):
+    store = JsonlOrderStore(tmp_path / "orders.jsonl")
+    saved = await asyncio.wait_for(store.save({"id": "order_1", "drinkType": "latte"}), 5)
+    store.close()
+    assert saved["id"] == "order_1"
+
+
+async def test_save_fails_when_store_cannot_be_opened(tmp_path):
+    store = JsonlOrderStore(unopenable_path(tmp_path))
+    with pytest.raises(OSError):
+        await asyncio.wait_for(store.save({"drinkType": "latte"}), 5)
+    # The writer is gone; later saves fail right away instead of waiting for it
+    with pytest.raises(OSError):
+        await asyncio.wait_for(store.save({"drinkType": "mocha"}), 5)
+    store.close()
+
+
+def test_queued_records_fail_when_store_cannot_be_opened(tmp_path):
+    store = JsonlOrderStore(unopenable_path(tmp_path))
+    errors = []
+    for _ in range(3):
+        store.submit({"drinkType": "latte"}, errors.append)
+    store.close()
+    assert len(errors) == 3
+    assert all(isinstance(error, OSError) for error in errors)
+
+
+async def test_write_failure_fails_save_and_writer_keeps_running(tmp_path):
+    store = FailingWriteStore(tmp_path / "orders.jsonl")
+    for _ in range(2):
+        with pytest.raises(OSError, match="disk full"):
+            await asyncio.wait_for(store.save({"drinkType": "latte"}), 5)
+    store.close()
+    assert store.records_committed == 0
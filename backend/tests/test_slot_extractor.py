@@ -0,0 +1,80 @@
+import pytest
+
+from slot_extractor import FastPathStats, PhraseAutomaton, SlotExtractor, tokenize
+
+
+@pytest.fixture(scope="module")
+def extractor():
+    return SlotExtractor()
+
+
+@pytest.mark.parametrize(
+    ("text", "slots"),
+    [
+        ("medium cappuccino", {"size": "medium", "drinkType": "cappuccino"}),
+        ("Almond milk.", {"milk": "almond milk"}),
+        ("no milk", {"milk": "no milk"}),
+        ("I'd like a large oat latte please", {"size": "large", "milk": "oat milk", "drinkType": "latte"}),
+        ("um, a small cold brew", {"size": "small", "drinkType": "cold brew"}),
+        ("regular size", {"size": "medium"}),
+        ("Can I get a small mocha?", {"size": "small", "drinkType": "mocha"}),
+        ("with whipped cream and an extra shot", {"extras": ["whipped cream", "extra shot"]}),
+        ("caramel, caramel drizzle", {"extras": ["caramel drizzle"]}),
+    ],
+)
+def test_full_matches_fill_slots(extractor, text, slots):
+    assert extractor.extract(text) == slots
+
+
+@pytest.mark.parametrize(
+    "text",
+    [
+        # Words that are neither menu phrases nor fillers
+        "a latte for Sam",
+        "add whipped cream and an extra shot",
+        "not oat milk",
+        "hot chocolate",
+        "how's your day going",
+        # A slot given two different values
+        "a small large latte",
+        # Nothing on the menu
+        "yes please",
+        "",
+    ],
+)
+def test_partial_matches_go_to_the_llm(extractor, text):
+    assert extractor.extract(text) is None
+
+
+@pytest.mark.parametrize(
+    "text",
+    [
+        "would you have almond milk",
+        "do you have oat milk",
+        "can you do a cold brew",
+        "um, is there soy milk",
+        "what sizes do you have",
+    ],
+)
+def test_questions_go_to_the_llm(extractor, text):
+    assert extractor.extract(text) is None
+
+
+def test_matches_whole_words_only(extractor):
+    # The automaton matches words, so no menu phrase is found inside "chocolate"
+    assert tokenize("Chocolate, please!") == ["chocolate", "please"]
+    assert extractor.extract("chocolate") is None
+
+
+def test_automaton_prefers_leftmost_longest():
+    automaton = PhraseAutomaton([("oat", "oat"), ("oat milk", "oat milk"), ("milk", "milk")])
+    assert automaton.match(["oat", "milk"]) == [(0, 2, "oat milk")]
+    assert automaton.match(["milk", "oat"]) == [(0, 1, "milk"), (1, 2, "oat")]
+
+
+def test_stats_count_hits_and_time_saved():
+    stats = FastPathStats()
+    stats.record_llm_latency(0.5)
+    assert stats.record_turn(True, 0.001) == pytest.approx(0.999)
+    assert stats.record_turn(False, 0.001) == 0.0
+    assert stats.summary()["hit_rate"] == 0.5
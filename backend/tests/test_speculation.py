@@ -0,0 +1,131 @@
+import asyncio
+from types import SimpleNamespace
+
+from livekit.agents import llm
+from livekit.agents.voice.events import FunctionToolsExecutedEvent
+
+from order_state import OrderState
+from speculation import TurnBuffer, current_turn, run_or_defer, speculative
+
+
+class FakeSpeechHandle:
+    def __init__(self, speech_id="speech_1"):
+        self.id = speech_id
+        self.interrupted = False
+        self._callbacks = []
+
+    def add_done_callback(self, callback):
+        self._callbacks.append(callback)
+
+    def interrupt(self):
+        self.interrupted = True
+
+    def mark_done(self):
+        for callback in self._callbacks:
+            callback(self)
+
+
+class Session:
+    """Owner of the order state, as the Assistant is"""
+
+    def __init__(self):
+        self.committed_state = OrderState()
+        self.turns = TurnBuffer(self.commit_turn)
+        self.saved = []
+
+    @property
+    def order_state(self):
+        turn = current_turn()
+        return self.committed_state if turn is None else turn.state
+
+    def commit_turn(self, turn):
+        self.committed_state = turn.state
+        for effect in turn.effects.values():
+            effect()
+
+    @speculative
+    async def save_order(self, context, release=None):
+        self.order_state.drink_type = "latte"
+        run_or_defer("save_order", lambda: self.saved.append(self.committed_state.drink_type))
+        if release is not None:
+            await release.wait()
+        return "Order saved successfully!"
+
+
+def tool_context(speech_handle, call_id="call_1"):
+    return SimpleNamespace(speech_handle=speech_handle, function_call=SimpleNamespace(call_id=call_id))
+
+
+def executed(call_id="call_1", output="Order saved successfully!"):
+    call = llm.FunctionCall(call_id=call_id, name="save_order", arguments="{}")
+    call_output = None
+    if output is not None:
+        call_output = llm.FunctionCallOutput(call_id=call_id, name="save_order", output=output, is_error=False)
+    return FunctionToolsExecutedEvent(function_calls=[call], function_call_outputs=[call_output])
+
+
+async def test_commits_turn_when_tool_outputs_are_added():
+    session, speech = Session(), FakeSpeechHandle()
+    await session.save_order(tool_context(speech))
+    assert session.saved == []
+    assert session.committed_state.drink_type is None
+
+    session.turns.on_tools_executed(executed())
+    speech.mark_done()
+    assert session.saved == ["latte"]
+    assert session.committed_state.drink_type == "latte"
+    assert session.turns.stats.committed == 1
+
+
+async def test_interrupt_while_tool_runs_in_background_still_commits():
+    # The speech is interrupted after its playout while the tool is still running;
+    # the session then adds the tool output to the chat context and emits the event
+    session, speech = Session(), FakeSpeechHandle()
+    release = asyncio.Event()
+    tool = asyncio.create_task(session.save_order(tool_context(speech), release=release))
+    await asyncio.sleep(0)
+    speech.interrupt()
+    release.set()
+    assert await tool == "Order saved successfully!"
+
+    session.turns.on_tools_executed(executed())
+    speech.mark_done()
+    assert session.saved == ["latte"]
+    assert session.turns.stats.discarded == 0
+
+
+async def test_cancelled_tool_is_discarded():
+    session, speech = Session(), FakeSpeechHandle()
+    tool = asyncio.create_task(session.save_order(tool_context(speech), release=asyncio.Event()))
+    await asyncio.sleep(0)
+    speech.interrupt()
+    tool.cancel()
+    await asyncio.gather(tool, return_exceptions=True)
+
+    # No function_tools_executed for cancelled calls, only the end of the speech
+    speech.mark_done()
+    assert session.saved == []
+    assert session.committed_state.drink_type is None
+    assert session.turns.stats.discarded == 1
+    assert session.turns.stats.discarded_effects == 1
+
+
+async def test_call_without_output_is_not_committed():
+    session, speech = Session(), FakeSpeechHandle()
+    await session.save_order(tool_context(speech))
+
+    session.turns.on_tools_executed(executed(output=None))
+    assert session.saved == []
+    speech.mark_done()
+    assert session.saved == []
+    assert session.turns.stats.discarded == 1
+
+
+async def test_other_speech_events_leave_turn_open():
+    session, speech = Session(), FakeSpeechHandle()
+    await session.save_order(tool_context(speech, call_id="call_1"))
+
+    session.turns.on_tools_executed(executed(call_id="call_2"))
+    assert session.saved == []
+    session.turns.on_tools_executed(executed(call_id="call_1"))
+    assert session.saved == ["latte"]
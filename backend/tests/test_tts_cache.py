@@ -0,0 +1,63 @@
+from livekit.agents import DEFAULT_API_CONNECT_OPTIONS, tts, utils
+
+from tts_cache import CachedTTS, PhraseCache
+
+SAMPLE_RATE = 16000
+
+
+class ToneTTS(tts.TTS):
+    """Non-streaming TTS returning 10ms of audio per character"""
+
+    def __init__(self):
+        super().__init__(capabilities=tts.TTSCapabilities(streaming=False), sample_rate=SAMPLE_RATE, num_channels=1)
+        self.requests = []
+
+    def synthesize(self, text, *, conn_options=DEFAULT_API_CONNECT_OPTIONS):
+        self.requests.append(text)
+        return _ToneStream(tts=self, input_text=text, conn_options=conn_options)
+
+
+class _ToneStream(tts.ChunkedStream):
+    async def _run(self, output_emitter):
+        output_emitter.initialize(
+            request_id=utils.shortuuid(), sample_rate=SAMPLE_RATE, num_channels=1, mime_type="audio/pcm"
+        )
+        output_emitter.push(b"\x01\x00" * (SAMPLE_RATE // 100) * len(self._input_text))
+        output_emitter.flush()
+
+
+async def speak(cached_tts, text):
+    stream = cached_tts.stream()
+    stream.push_text(text)
+    stream.end_input()
+    frames = [audio async for audio in stream]
+    await stream.aclose()
+    return sum(audio.frame.samples_per_channel for audio in frames)
+
+
+def cached(tmp_path):
+    wrapped = ToneTTS()
+    return wrapped, CachedTTS(wrapped, voice="tone", cache=PhraseCache(tmp_path, 2**20))
+
+
+async def test_hits_and_misses_are_counted_per_sentence(tmp_path):
+    wrapped, cached_tts = cached(tmp_path)
+    await cached_tts.render("Got it, latte.")
+    wrapped.requests.clear()
+
+    samples = await speak(cached_tts, "Got it, latte. What size would you like? And your name?")
+    assert samples >= (SAMPLE_RATE // 100) * (14 + 25 + 14)
+    # Only the uncached sentences are synthesized
+    assert wrapped.requests == ["What size would you like?", "And your name?"]
+    assert (cached_tts.stats.hits, cached_tts.stats.misses) == (1, 2)
+
+
+async def test_single_uncached_sentence_is_cached_for_next_time(tmp_path):
+    wrapped, cached_tts = cached(tmp_path)
+    first = await speak(cached_tts, "Perfect, large size.")
+    for task in list(cached_tts._store_tasks):
+        await task
+    second = await speak(cached_tts, "Perfect, large size.")
+    assert first == second
+    assert wrapped.requests == ["Perfect, large size."]
+    assert (cached_tts.stats.hits, cached_tts.stats.misses) == (1, 1)
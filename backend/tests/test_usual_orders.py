@@ -0,0 +1,58 @@
+import pytest
+
+from agent import Assistant
+from order_dispatch import OrderDispatcher
+from order_store import JsonlOrderStore
+from usual_orders import UsualOrderIndex
+
+SAMS_ORDERS = [
+    {"name": "Sam", "drinkType": "Latte", "size": "large", "milk": "oat", "extras": ["vanilla"]},
+    {"name": "sam", "drinkType": "latte", "size": "large", "milk": "oat milk", "extras": ["vanilla syrup"]},
+    {"name": "Sam", "drinkType": "mocha", "size": "small", "milk": "whole milk", "extras": []},
+]
+
+
+@pytest.fixture
+def assistant(tmp_path):
+    index = UsualOrderIndex()
+    index.build(SAMS_ORDERS)
+    return Assistant(
+        order_store=JsonlOrderStore(tmp_path / "orders.jsonl"),
+        dispatcher=OrderDispatcher(tmp_path / "dispatch.db"),
+        usual_orders=index,
+    )
+
+
+def test_lookup_returns_the_most_frequent_canonical_drink():
+    index = UsualOrderIndex()
+    index.build([*SAMS_ORDERS, {"name": "Sam", "drinkType": "flat white", "size": "large", "milk": "oat milk"}])
+    usual, times, recent = index.lookup("  SAM ")
+    assert usual == {"drinkType": "latte", "size": "large", "milk": "oat milk", "extras": ["vanilla syrup"], "name": "Sam"}
+    assert (times, recent) == (2, 3)
+    assert index.skipped_orders == 1
+    assert index.lookup("Alex") == (None, 0, 0)
+
+
+async def test_usual_fills_an_empty_order(assistant):
+    reply = await assistant.get_usual_order(None, "sam")
+    assert assistant.order_state.to_dict() == {
+        "drinkType": "latte", "size": "large", "milk": "oat milk", "extras": ["vanilla syrup"], "name": "Sam",
+    }
+    assert "large latte with oat milk and vanilla syrup" in reply
+    assert "Kept" not in reply
+
+
+async def test_usual_keeps_details_already_given(assistant):
+    await assistant.update_order(None, size="small", extras=["extra shot"])
+    reply = await assistant.get_usual_order(None, "Sam")
+    assert assistant.order_state.to_dict() == {
+        "drinkType": "latte", "size": "small", "milk": "oat milk", "extras": ["extra shot"], "name": "Sam",
+    }
+    assert "Kept what they already asked for: size small; extras extra shot." in reply
+
+
+async def test_unknown_customer_leaves_the_order_alone(assistant):
+    await assistant.update_order(None, drink_type="mocha")
+    reply = await assistant.get_usual_order(None, "Alex")
+    assert reply.startswith("No previous orders found for Alex")
+    assert assistant.order_state.drink_type == "mocha"
@@ -0,0 +1,82 @@
+import asyncio
+
+from visualization_publisher import VisualizationPublisher
+
+
+class Recorder:
+    def __init__(self, fail_on=None):
+        self.sent = []
+        self.fail_on = fail_on
+
+    async def __call__(self, payload, topic):
+        if payload == self.fail_on:
+            raise ConnectionError("room closed")
+        self.sent.append((payload, topic))
+
+
+def frame(payload, topic="order_state"):
+    return lambda: [(payload, topic)]
+
+
+async def test_burst_is_coalesced_to_the_last_state():
+    recorder = Recorder()
+    publisher = VisualizationPublisher(recorder, coalesce_window=0.01)
+    for size in ("small", "medium", "large"):
+        publisher.submit(frame(size), coalesce_key="state")
+    await publisher.aclose()
+    assert recorder.sent == [("large", "order_state")]
+    assert (publisher.stats.submitted, publisher.stats.published, publisher.stats.coalesced) == (3, 1, 2)
+
+
+async def test_receipts_keep_their_place_between_states():
+    recorder = Recorder()
+    publisher = VisualizationPublisher(recorder, coalesce_window=0.01)
+    publisher.submit(frame("latte"), coalesce_key="state")
+    publisher.submit(frame("mocha"), coalesce_key="state")
+    publisher.submit(frame("receipt", "order_receipt"))
+    publisher.submit(frame("empty"), coalesce_key="state")
+    await publisher.aclose()
+    assert recorder.sent == [("mocha", "order_state"), ("receipt", "order_receipt"), ("empty", "order_state")]
+
+
+async def test_frames_are_built_only_when_sent():
+    built = []
+
+    def build(payload):
+        def frame():
+            built.append(payload)
+            return [(payload, "order_state")]
+
+        return frame
+
+    publisher = VisualizationPublisher(Recorder(), coalesce_window=0.01)
+    for size in ("small", "large"):
+        publisher.submit(build(size), coalesce_key="state")
+    await asyncio.sleep(0.05)
+    assert built == ["large"]
+    await publisher.aclose()
+
+
+async def test_full_queue_drops_the_oldest_state_not_receipts():
+    recorder = Recorder()
+    publisher = VisualizationPublisher(recorder, coalesce_window=0.01, max_pending=2)
+    publisher.submit(frame("receipt", "order_receipt"))
+    publisher.submit(frame("latte"), coalesce_key="state")
+    publisher.submit(frame("receipt 2", "order_receipt"))
+    await publisher.aclose()
+    assert [payload for payload, _ in recorder.sent] == ["receipt", "receipt 2"]
+    assert publisher.stats.dropped == 1
+
+
+async def test_failed_publish_does_not_stop_the_queue():
+    recorder = Recorder(fail_on="latte")
+    publisher = VisualizationPublisher(recorder, coalesce_window=0)
+    publisher.submit(frame("latte"), coalesce_key="state")
+    await asyncio.sleep(0.01)
+    publisher.submit(frame("mocha"), coalesce_key="state")
+    await publisher.aclose()
+    assert recorder.sent == [("mocha", "order_state")]
+    assert (publisher.stats.failed, publisher.stats.published) == (1, 1)
+    # Nothing is queued once closed
+    publisher.submit(frame("late"), coalesce_key="state")
+    assert publisher.stats.dropped == 1
@@ -1,53 +1,301 @@
 'use client';
 
-import React, { useEffect, useState } from 'react';
+import React, { useState } from 'react';
 import { useDataChannel } from '@livekit/components-react';
 import { motion, AnimatePresence } from 'motion/react';
+import { type CupStyle, HTML_TOPIC, type OrderState } from '@/lib/order-protocol';
 
-export function DrinkVisualization() {
-  const [drinkHtml, setDrinkHtml] = useState<string>('');
-  const [isVisible, setIsVisible] = useState(false);
-  const [key, setKey] = useState(0);
+const BRAND_GRADIENT = 'linear-gradient(135deg, #667eea 0%, #764ba2 100%)';
+const CUP_BORDER = '#3e2723';
 
-  // Listen for drink visualization data from the agent
-  useDataChannel('drink_visualization', (message) => {
+function Cup({ order, cupStyle }: { order: OrderState; cupStyle: CupStyle }) {
+  const cupSize =
+    (order.size && cupStyle.cupSizes[order.size]) || cupStyle.cupSizes[cupStyle.defaultSize];
+  const drinkColor =
+    (order.drinkType && cupStyle.drinkColors[order.drinkType]) || cupStyle.defaultDrinkColor;
+  const hasWhippedCream = order.extras.some((extra) =>
+    extra.toLowerCase().includes('whipped cream')
+  );
+
+  return (
+    <div style={{ position: 'relative', display: 'inline-block' }}>
+      <div
+        style={{
+          position: 'relative',
+          width: cupSize.width,
+          height: cupSize.height,
+          background: `linear-gradient(to bottom, ${drinkColor} 0%, ${drinkColor} 85%, ${CUP_BORDER} 100%)`,
+          borderRadius: '0 0 15px 15px',
+          boxShadow:
+            '0 6px 12px rgba(0,0,0,0.2), inset -5px 0 10px rgba(0,0,0,0.1), inset 5px 0 10px rgba(255,255,255,0.1)',
+          border: `3px solid ${CUP_BORDER}`,
+          borderTop: 'none',
+          transition: 'width 0.3s ease, height 0.3s ease, background 0.3s ease',
+        }}
+      >
+        {/* Cup Top/Rim */}
+        <div
+          style={{
+            position: 'absolute',
+            top: -8,
+            left: -3,
+            right: -3,
+            height: 12,
+            background: drinkColor,
+            border: `3px solid ${CUP_BORDER}`,
+            borderRadius: '50%',
+            boxShadow: 'inset 0 -2px 4px rgba(0,0,0,0.3)',
+          }}
+        />
+
+        {/* Whipped Cream */}
+        {hasWhippedCream && (
+          <>
+            <div
+              style={{
+                position: 'absolute',
+                top: -25,
+                left: '50%',
+                transform: 'translateX(-50%)',
+                width: 'calc(100% - 10px)',
+                height: 35,
+                background:
+                  'radial-gradient(ellipse at center, #FFFEF7 0%, #FFF8E7 50%, #F5E6D3 100%)',
+                borderRadius: '50% 50% 40% 40%',
+                boxShadow: '0 2px 6px rgba(0,0,0,0.15)',
+                border: '2px solid #F0E5D8',
+              }}
+            />
+            <div
+              style={{
+                position: 'absolute',
+                top: -30,
+                left: '50%',
+                transform: 'translateX(-50%)',
+                width: '60%',
+                height: 20,
+                background: 'radial-gradient(circle, #FFFFFF 0%, #FFFEF7 100%)',
+                borderRadius: '50%',
+                opacity: 0.9,
+              }}
+            />
+          </>
+        )}
+
+        {/* Cup Handle */}
+        <div
+          style={{
+            position: 'absolute',
+            right: -22,
+            top: '25%',
+            width: 28,
+            height: '40%',
+            border: `4px solid ${CUP_BORDER}`,
+            borderLeft: 'none',
+            borderRadius: '0 50% 50% 0',
+            background: `linear-gradient(to right, transparent 0%, ${drinkColor} 50%)`,
+            opacity: 0.8,
+          }}
+        />
+      </div>
+
+      {/* Size Badge */}
+      <div style={{ textAlign: 'center', marginTop: 12 }}>
+        <span
+          style={{
+            display: 'inline-block',
+            background: BRAND_GRADIENT,
+            color: 'white',
+            padding: '5px 14px',
+            borderRadius: 14,
+            fontWeight: 700,
+            fontSize: 11,
+            letterSpacing: 1.2,
+            boxShadow: '0 2px 6px rgba(0,0,0,0.15)',
+          }}
+        >
+          {order.size ? order.size.toUpperCase() : 'SELECT SIZE'}
+        </span>
+      </div>
+    </div>
+  );
+}
+
+function OrderDetails({ order }: { order: OrderState }) {
+  const rows: Array<[string, React.ReactNode]> = [
+    ['Drink', order.drinkType || 'Not selected'],
+    ['Size', order.size || 'Not selected'],
+    ['Milk', order.milk || 'Not selected'],
+    [
+      'Extras',
+      order.extras.length ? (
+        <div>
+          {order.extras.map((extra) => (
+            <div key={extra} style={{ margin: '2px 0', fontSize: 12 }}>
+              • {extra}
+            </div>
+          ))}
+        </div>
+      ) : (
+        <span style={{ color: '#999', fontSize: 11 }}>None</span>
+      ),
+    ],
+    ['Name', order.name || 'Not provided'],
+  ];
+
+  return (
+    <div
+      style={{
+        marginTop: 10,
+        background: '#f8f9fa',
+        borderRadius: 8,
+        padding: 8,
+        fontSize: 12,
+      }}
+    >
+      <div
+        style={{
+          display: 'grid',
+          gridTemplateColumns: 'auto 1fr',
+          gap: '5px 10px',
+          alignItems: 'start',
+        }}
+      >
+        {rows.map(([label, value]) => (
+          <React.Fragment key={label}>
+            <strong style={{ color: '#667eea' }}>{label}:</strong>
+            <div>{value}</div>
+          </React.Fragment>
+        ))}
+      </div>
+    </div>
+  );
+}
+
+function DrinkPanel({ order, cupStyle }: { order: OrderState; cupStyle: CupStyle }) {
+  return (
+    <div
+      style={{
+        fontFamily: "'Segoe UI', Arial, sans-serif",
+        padding: 12,
+        background: BRAND_GRADIENT,
+        borderRadius: 12,
+        maxWidth: 260,
+        margin: '0 auto',
+        color: 'white',
+        boxShadow: '0 6px 20px rgba(0,0,0,0.3)',
+      }}
+    >
+      <div style={{ textAlign: 'center', marginBottom: 10 }}>
+        <h2
+          style={{
+            margin: 0,
+            fontSize: 17,
+            fontWeight: 600,
+            display: 'inline-flex',
+            alignItems: 'center',
+            gap: 5,
+          }}
+        >
+          <span style={{ fontSize: 20 }}>☕</span>
+          <span>AgentX Coffee</span>
+        </h2>
+      </div>
+
+      <div
+        style={{
+          background: 'white',
+          borderRadius: 10,
+          padding: 12,
+          color: '#333',
+          boxShadow: '0 2px 6px rgba(0,0,0,0.1)',
+        }}
+      >
+        <h3
+          style={{
+            margin: '0 0 10px 0',
+            color: '#667eea',
+            textAlign: 'center',
+            fontSize: 14,
+            fontWeight: 600,
+            borderBottom: '2px solid #e8eaf6',
+            paddingBottom: 6,
+          }}
+        >
+          Your Order
+        </h3>
+
+        {/* Drink Visualization */}
+        <div
+          style={{
+            display: 'flex',
+            justifyContent: 'center',
+            alignItems: 'center',
+            margin: '10px 0',
+            padding: 14,
+            paddingTop: 34,
+            background: 'linear-gradient(to bottom, #f8f9fa 0%, #e9ecef 100%)',
+            borderRadius: 10,
+          }}
+        >
+          <Cup order={order} cupStyle={cupStyle} />
+        </div>
+
+        <OrderDetails order={order} />
+      </div>
+    </div>
+  );
+}
+
+interface DrinkVisualizationProps {
+  // Latest order state from the order state topic, or null until the first snapshot
+  order: OrderState | null;
+  // Cup dimensions and drink colors, sent with the same snapshot
+  cupStyle: CupStyle | null;
+}
+
+export function DrinkVisualization({ order, cupStyle }: DrinkVisualizationProps) {
+  const [fallbackHtml, setFallbackHtml] = useState<string>('');
+
+  // Agents that predate the order state protocol only send server-rendered HTML
+  useDataChannel(HTML_TOPIC, (message) => {
     const decoder = new TextDecoder();
-    const html = decoder.decode(message.payload);
-    setDrinkHtml(html);
-    setIsVisible(true);
-    setKey(prev => prev + 1); // Force re-render with new animation
+    setFallbackHtml(decoder.decode(message.payload));
   });
 
-  if (!isVisible || !drinkHtml) {
+  const state = order && cupStyle ? { order, cupStyle } : null;
+  if (!state && !fallbackHtml) {
     return null;
   }
 
   return (
     <AnimatePresence mode="wait">
       <motion.div
-        key={key}
         initial={{ opacity: 0, scale: 0.9, x: 20 }}
-        animate={{ 
-          opacity: 1, 
-          scale: 1, 
+        animate={{
+          opacity: 1,
+          scale: 1,
           x: 0,
           transition: {
             duration: 0.5,
             ease: [0.34, 1.56, 0.64, 1], // Smooth bounce
-          }
+          },
         }}
-        exit={{ 
-          opacity: 0, 
-          scale: 0.95, 
-          transition: { duration: 0.2 }
+        exit={{
+          opacity: 0,
+          scale: 0.95,
+          transition: { duration: 0.2 },
         }}
         className="fixed top-1/2 right-6 -translate-y-1/2 z-50 max-w-md"
         style={{ pointerEvents: 'none' }}
       >
-        <div
-          dangerouslySetInnerHTML={{ __html: drinkHtml }}
-          style={{ pointerEvents: 'auto' }}
-        />
+        {state ? (
+          <div style={{ pointerEvents: 'auto' }}>
+            <DrinkPanel order={state.order} cupStyle={state.cupStyle} />
+          </div>
+        ) : (
+          <div dangerouslySetInnerHTML={{ __html: fallbackHtml }} style={{ pointerEvents: 'auto' }} />
+        )}
       </motion.div>
     </AnimatePresence>
   );
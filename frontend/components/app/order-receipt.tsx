@@ -1,27 +1,149 @@
 'use client';
 
-import React, { useState } from 'react';
+import React, { useEffect, useState } from 'react';
 import { useDataChannel } from '@livekit/components-react';
 import { motion, AnimatePresence } from 'motion/react';
+import { RECEIPT_HTML_TOPIC, type Receipt } from '@/lib/order-protocol';
 
-export function OrderReceipt() {
+const DASHED_RULE = '2px dashed #d4a574';
+
+function titleCase(value: string | null) {
+  return (value ?? '').replace(/\b\w/g, (char) => char.toUpperCase());
+}
+
+function ReceiptCard({ receipt }: { receipt: Receipt }) {
+  const { order } = receipt;
+  const orderTime = new Date(receipt.orderTime).toLocaleString(undefined, {
+    dateStyle: 'long',
+    timeStyle: 'short',
+  });
+  const line = { margin: '8px 0', fontSize: 14 };
+  const indentedLine = { ...line, paddingLeft: 20 };
+  const headerLine = { margin: '4px 0', fontSize: 13 };
+  const footerLine = { margin: '4px 0', fontSize: 11, color: '#999' };
+
+  return (
+    <div
+      style={{
+        fontFamily: "'Courier New', monospace",
+        padding: 20,
+        background: 'white',
+        borderRadius: 12,
+        maxWidth: 350,
+        margin: '0 auto',
+        color: '#333',
+        boxShadow: '0 10px 40px rgba(0,0,0,0.3)',
+        border: DASHED_RULE,
+      }}
+    >
+      <div
+        style={{
+          textAlign: 'center',
+          borderBottom: DASHED_RULE,
+          paddingBottom: 16,
+          marginBottom: 16,
+        }}
+      >
+        <div style={{ fontSize: 32, marginBottom: 8 }}>☕</div>
+        <h2 style={{ margin: 0, fontSize: 22, fontWeight: 'bold', color: '#8b4513' }}>
+          AGENTX COFFEE SHOP
+        </h2>
+        <p style={{ margin: '4px 0 0 0', fontSize: 12, color: '#666' }}>Order Receipt</p>
+      </div>
+
+      <div style={{ marginBottom: 16 }}>
+        <p style={headerLine}>
+          <strong>Order #:</strong> {receipt.orderNumber}
+        </p>
+        <p style={headerLine}>
+          <strong>Date:</strong> {orderTime}
+        </p>
+        <p style={headerLine}>
+          <strong>Customer:</strong> {order.name}
+        </p>
+      </div>
+
+      <div
+        style={{
+          borderTop: DASHED_RULE,
+          borderBottom: DASHED_RULE,
+          padding: '12px 0',
+          margin: '16px 0',
+        }}
+      >
+        <p style={line}>
+          <strong>ITEM:</strong> {titleCase(order.drinkType)}
+        </p>
+        <p style={indentedLine}>Size: {titleCase(order.size)}</p>
+        <p style={indentedLine}>Milk: {order.milk}</p>
+        <p style={indentedLine}>Extras: {order.extras.length ? order.extras.join(', ') : 'None'}</p>
+      </div>
+
+      <div
+        style={{
+          textAlign: 'center',
+          marginTop: 16,
+          paddingTop: 16,
+          borderTop: DASHED_RULE,
+        }}
+      >
+        <p style={{ margin: '8px 0', fontSize: 18, fontWeight: 'bold', color: '#8b4513' }}>
+          ✓ ORDER CONFIRMED
+        </p>
+        <p style={{ margin: '8px 0', fontSize: 13, color: '#666' }}>
+          Your order will be ready shortly!
+        </p>
+      </div>
+
+      <div
+        style={{
+          textAlign: 'center',
+          marginTop: 16,
+          paddingTop: 12,
+          borderTop: '1px solid #e0e0e0',
+        }}
+      >
+        <p style={footerLine}>Thank you for choosing AgentX Coffee!</p>
+        <p style={footerLine}>Powered by AI Voice Technology ⚡</p>
+      </div>
+    </div>
+  );
+}
+
+interface OrderReceiptProps {
+  // Latest receipt from the order state topic
+  receipt: Receipt | null;
+}
+
+export function OrderReceipt({ receipt }: OrderReceiptProps) {
   const [receiptHtml, setReceiptHtml] = useState<string>('');
   const [isVisible, setIsVisible] = useState(false);
 
-  // Listen for receipt data from the agent
-  useDataChannel('order_receipt', (message) => {
+  // Agents that predate the order state protocol only send server-rendered HTML
+  useDataChannel(RECEIPT_HTML_TOPIC, (message) => {
     const decoder = new TextDecoder();
-    const html = decoder.decode(message.payload);
-    setReceiptHtml(html);
+    setReceiptHtml(decoder.decode(message.payload));
     setIsVisible(true);
-    
-    // Auto-hide after 15 seconds
-    setTimeout(() => {
+  });
+
+  useEffect(() => {
+    if (receipt) {
+      setIsVisible(true);
+    }
+  }, [receipt]);
+
+  // Auto-hide after 15 seconds
+  useEffect(() => {
+    if (!isVisible) {
+      return;
+    }
+    const timeout = setTimeout(() => {
       setIsVisible(false);
     }, 15000);
-  });
+    return () => clearTimeout(timeout);
+  }, [isVisible, receipt, receiptHtml]);
 
-  if (!isVisible || !receiptHtml) {
+  if (!isVisible || (!receipt && !receiptHtml)) {
     return null;
   }
 
@@ -61,10 +183,16 @@ export function OrderReceipt() {
             className="fixed top-1/2 left-1/2 -translate-x-1/2 -translate-y-1/2 z-[60] max-w-md"
             style={{ pointerEvents: 'none' }}
           >
-            <div
-              dangerouslySetInnerHTML={{ __html: receiptHtml }}
-              style={{ pointerEvents: 'auto' }}
-            />
+            {receipt ? (
+              <div style={{ pointerEvents: 'auto' }}>
+                <ReceiptCard receipt={receipt} />
+              </div>
+            ) : (
+              <div
+                dangerouslySetInnerHTML={{ __html: receiptHtml }}
+                style={{ pointerEvents: 'auto' }}
+              />
+            )}
             
             {/* Close button */}
             <button
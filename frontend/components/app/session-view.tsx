@@ -15,6 +15,7 @@ import {
 import { useChatMessages } from '@/hooks/useChatMessages';
 import { useConnectionTimeout } from '@/hooks/useConnectionTimout';
 import { useDebugMode } from '@/hooks/useDebug';
+import { useOrderState } from '@/hooks/useOrderState';
 import { cn } from '@/lib/utils';
 import { ScrollArea } from '../livekit/scroll-area/scroll-area';
 
@@ -72,6 +73,7 @@ export const SessionView = ({
   useDebugMode({ enabled: IN_DEVELOPMENT });
 
   const messages = useChatMessages();
+  const { order, receipt, cupStyle } = useOrderState();
   const [chatOpen, setChatOpen] = useState(false);
   const scrollAreaRef = useRef<HTMLDivElement>(null);
 
@@ -107,10 +109,10 @@ export const SessionView = ({
       </div>
       
       {/* Drink Visualization */}
-      <DrinkVisualization />
+      <DrinkVisualization order={order} cupStyle={cupStyle} />
       
       {/* Order Receipt */}
-      <OrderReceipt />
+      <OrderReceipt receipt={receipt} />
       
       {/* Chat Transcript */}
       <div
@@ -0,0 +1,63 @@
+import { useCallback, useRef, useState } from 'react';
+import { useDataChannel } from '@livekit/components-react';
+import {
+  type CupStyle,
+  type OrderState,
+  type Receipt,
+  STATE_TOPIC,
+  SYNC_TOPIC,
+  decodeOrderMessage,
+  encodeSyncRequest,
+} from '@/lib/order-protocol';
+
+/**
+ * Applies the snapshots and deltas the agent publishes on the order state topic.
+ *
+ * Deltas are only applied on top of the message with the previous sequence number;
+ * if one is missed, the hook asks the agent for a fresh snapshot and ignores deltas
+ * until it arrives. Use it once per session and pass the results down.
+ */
+export function useOrderState() {
+  const [order, setOrder] = useState<OrderState | null>(null);
+  const [receipt, setReceipt] = useState<Receipt | null>(null);
+  const [cupStyle, setCupStyle] = useState<CupStyle | null>(null);
+  const lastSeq = useRef<number | null>(null);
+
+  const { send } = useDataChannel(SYNC_TOPIC);
+
+  const requestSync = useCallback(() => {
+    lastSeq.current = null;
+    send(encodeSyncRequest(), { reliable: true }).catch(() => {});
+  }, [send]);
+
+  useDataChannel(STATE_TOPIC, (message) => {
+    const decoded = decodeOrderMessage(message.payload);
+    if (!decoded) {
+      return;
+    }
+
+    if (decoded.type === 'snapshot') {
+      lastSeq.current = decoded.seq;
+      setOrder(decoded.state);
+      setCupStyle(decoded.menu);
+      return;
+    }
+
+    // Receipts are self-contained, so show them even if an earlier delta was missed
+    if (decoded.type === 'receipt') {
+      setReceipt(decoded.receipt);
+    }
+
+    if (lastSeq.current === null || decoded.seq !== lastSeq.current + 1) {
+      requestSync();
+      return;
+    }
+    lastSeq.current = decoded.seq;
+
+    if (decoded.type === 'delta') {
+      setOrder((prev) => (prev ? { ...prev, ...decoded.set } : prev));
+    }
+  });
+
+  return { order, receipt, cupStyle };
+}
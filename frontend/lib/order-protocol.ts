@@ -0,0 +1,62 @@
+// Wire format for the order state the agent streams on the `order_state` topic.
+// See backend/src/order_protocol.py for the producer side.
+
+export const PROTOCOL_VERSION = 1;
+export const STATE_TOPIC = 'order_state';
+export const SYNC_TOPIC = 'order_state_sync';
+export const HTML_TOPIC = 'drink_visualization';
+export const RECEIPT_HTML_TOPIC = 'order_receipt';
+
+export interface OrderState {
+  drinkType: string | null;
+  size: string | null;
+  milk: string | null;
+  extras: string[];
+  name: string | null;
+}
+
+// Cup dimensions and drink colors from the agent's menu.json, sent with every snapshot
+export interface CupStyle {
+  cupSizes: Record<string, { width: string; height: string }>;
+  drinkColors: Record<string, string>;
+  defaultSize: string;
+  defaultDrinkColor: string;
+}
+
+export interface Receipt {
+  orderNumber: string;
+  orderTime: string;
+  order: OrderState;
+}
+
+export type OrderMessage =
+  | { v: number; type: 'snapshot'; seq: number; state: OrderState; menu: CupStyle }
+  | { v: number; type: 'delta'; seq: number; set: Partial<OrderState> }
+  | { v: number; type: 'receipt'; seq: number; receipt: Receipt };
+
+export const EMPTY_ORDER: OrderState = {
+  drinkType: null,
+  size: null,
+  milk: null,
+  extras: [],
+  name: null,
+};
+
+const decoder = new TextDecoder();
+const encoder = new TextEncoder();
+
+export function decodeOrderMessage(payload: Uint8Array): OrderMessage | null {
+  try {
+    const message = JSON.parse(decoder.decode(payload));
+    if (message?.v !== PROTOCOL_VERSION) {
+      return null;
+    }
+    return message as OrderMessage;
+  } catch {
+    return null;
+  }
+}
+
+export function encodeSyncRequest(): Uint8Array {
+  return encoder.encode(JSON.stringify({ v: PROTOCOL_VERSION, type: 'sync' }));
+}